@@ -0,0 +1,88 @@
+"""Compare the startup time and the step latency of the simulator backends.
+
+The subprocess backend runs the stand-in simulator, the docker backend runs the
+real simulator (only with --docker): its step latency also includes the
+physics, compare the startup times and the overhead of ipc vs tcp.
+
+Usage:
+    python3 benchmarks/bench_backends.py [--docker]
+"""
+import sys
+sys.path.append('..')  # noqa
+sys.path.append('.')  # noqa
+
+import os.path as osp
+import json
+import time
+import click
+import numpy as np
+
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv, DockerBackend, SubprocessBackend
+
+root_dir = osp.dirname(osp.dirname(osp.abspath(sailboat_gym.__file__)))
+
+STAND_IN_COMMAND = [sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in',
+                    '--bind={endpoint}']
+
+
+def get_backends(docker=False):
+    backends = {
+        'subprocess_ipc': lambda: SubprocessBackend(STAND_IN_COMMAND, transport='ipc', cwd=root_dir),
+        'subprocess_tcp': lambda: SubprocessBackend(STAND_IN_COMMAND, transport='tcp', cwd=root_dir),
+    }
+    if docker:
+        backends['docker'] = lambda: DockerBackend()
+    return backends
+
+
+def bench_backend(backend, nb_steps, nb_startups):
+    """Return the startup times (launch until the first reset is done) and step latencies, in seconds."""
+    startups, latencies = [], []
+    rng = np.random.default_rng(0)
+    for i in range(nb_startups):
+        t0 = time.perf_counter()
+        env = SailboatLSAEnv(sim_backend=backend, name=f'bench-backend-{i}')
+        env.reset(seed=0)
+        startups.append(time.perf_counter() - t0)
+        if i == 0:
+            for _ in range(nb_steps):
+                action = {'theta_rudder': rng.uniform(-np.pi / 4, np.pi / 4, 1).astype(np.float32),
+                          'theta_sail': rng.uniform(-np.pi / 2, np.pi / 2, 1).astype(np.float32)}
+                t1 = time.perf_counter()
+                env.step(action)
+                latencies.append(time.perf_counter() - t1)
+        env.close()
+        env.sim.stop()
+    return np.array(startups), np.array(latencies)
+
+
+def bench_backends(nb_steps=1000, nb_startups=3, docker=False):
+    results = {}
+    for name, make_backend in get_backends(docker).items():
+        startups, latencies = bench_backend(make_backend(), nb_steps, nb_startups)
+        results[name] = {
+            'startup_ms': np.median(startups) * 1e3,
+            'step_latency_us.p50': np.median(latencies) * 1e6,
+            'step_latency_us.p95': np.percentile(latencies, 95) * 1e6,
+        }
+    return results
+
+
+@click.command()
+@click.option('--nb-steps', default=1000, help='Number of steps per measure', type=int)
+@click.option('--nb-startups', default=3, help='Number of startups per backend', type=int)
+@click.option('--docker', is_flag=True, help='Also benchmark the docker backend (real simulator)')
+@click.option('--json-output', default=None, help='Write the results to this JSON file', type=str)
+def main(nb_steps, nb_startups, docker, json_output):
+    results = bench_backends(nb_steps, nb_startups, docker)
+    print(f'{"backend":<16}{"startup (ms)":>14}{"step p50 (us)":>16}{"step p95 (us)":>16}')
+    for name, r in results.items():
+        print(f'{name:<16}{r["startup_ms"]:>14.1f}{r["step_latency_us.p50"]:>16.1f}{r["step_latency_us.p95"]:>16.1f}')
+    if json_output:
+        with open(json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import sys
+sys.path.append('..')  # noqa
+sys.path.append('.')  # noqa
+
+import json
+import timeit
+import click
+import msgpack
+import numpy as np
+
+from sailboat_gym.envs.sailboat_lsa import lsa_wire
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInSimulation
+
+WIND = np.array([0., 1.])
+WATER = np.array([.01, 0.])
+ACTION = {'theta_rudder': np.array(.1, dtype=np.float32),
+          'theta_sail': np.array(-1., dtype=np.float32)}
+
+
+def get_sim_obs():
+    sim = StandInSimulation()
+    sim.reset({'x': 0., 'y': 1.}, {'x': .01, 'y': 0.}, 10)
+    obs, *_ = sim.step(lsa_wire.decode_step(
+        lsa_wire.encode_step(WIND, WATER, ACTION)))
+    return obs
+
+
+def msgpack_codec(sim_obs):
+    def encode_request():
+        return msgpack.packb({'action': {
+            'theta_rudder': ACTION['theta_rudder'].item(),
+            'theta_sail': ACTION['theta_sail'].item(),
+            'wind': {'x': WIND[0], 'y': WIND[1]},
+            'water': {'x': WATER[0], 'y': WATER[1]},
+        }}, default=float)
+
+    reply = msgpack.packb({'obs': sim_obs, 'done': False, 'info': {}},
+                          default=float)
+
+    def decode_reply():
+        obs = msgpack.unpackb(reply, raw=False)['obs']
+        # same parsing as LSASim.__parse_sim_obs
+        return {
+            k: np.array([v[c] for c in 'xyz' if c in v] if isinstance(v, dict) else [v],
+                        dtype=np.float32)
+            for k, v in obs.items()
+        }
+    return encode_request, reply, decode_reply
+
+
+def binary_codec(sim_obs):
+    def encode_request():
+        return lsa_wire.encode_step(WIND, WATER, ACTION)
+
+    reply = lsa_wire.encode_step_reply(sim_obs, False)
+
+    def decode_reply():
+        return lsa_wire.decode_step_reply(reply)
+    return encode_request, reply, decode_reply
+
+
+def bench_wire_format(number=20000):
+    """Return the bytes per step and the client side encode/decode time of each wire format."""
+    sim_obs = get_sim_obs()
+    results = {}
+    for name, codec in [('msgpack', msgpack_codec), ('binary', binary_codec)]:
+        encode_request, reply, decode_reply = codec(sim_obs)
+        results[name] = {
+            'request_bytes': len(encode_request()),
+            'reply_bytes': len(reply),
+            'encode_us': timeit.timeit(encode_request, number=number) / number * 1e6,
+            'decode_us': timeit.timeit(decode_reply, number=number) / number * 1e6,
+        }
+    return results
+
+
+@click.command()
+@click.option('--number', default=20000, help='Number of encode/decode per measure', type=int)
+@click.option('--json-output', default=None, help='Write the results to this JSON file', type=str)
+def main(number, json_output):
+    results = bench_wire_format(number)
+    print(f'{"format":<10}{"bytes/step":>12}{"encode (us)":>14}{"decode (us)":>14}')
+    for name, r in results.items():
+        print(f'{name:<10}{r["request_bytes"] + r["reply_bytes"]:>12}{r["encode_us"]:>14.2f}{r["decode_us"]:>14.2f}')
+    if json_output:
+        with open(json_output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+"""Performance benchmarks of sailboat_gym, run against the stand-in simulator.
+
+Usage:
+    python3 benchmarks/run.py                      # run and compare to benchmarks/baseline.json
+    python3 benchmarks/run.py --update-baseline    # run and store the results as the new baseline
+"""
+import sys
+sys.path.append('..')  # noqa
+sys.path.append('.')  # noqa
+
+import os
+import os.path as osp
+import json
+import time
+import timeit
+import socket
+import platform
+import datetime
+import subprocess
+import tempfile
+import contextlib
+import threading
+import click
+import numpy as np
+import gymnasium as gym
+
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv, SailboatLSAVectorEnv, CV2DRenderer, RasterRenderer, DeferredRenderer, get_best_sail, get_vmc
+from sailboat_gym import GymObservation
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import READY_MESSAGE
+from sailboat_gym.envs.sailboat_lsa.lsa_step_log import StepLog, EVENT_STEP
+from sailboat_gym.wrappers.observation_history import HistoryBuffer
+from sailboat_gym.helpers.relabel import save_transitions, relabel, PerTransition
+from tests.check_import_time import measure_import_time
+from bench_wire_format import bench_wire_format
+from bench_backends import bench_backends
+
+current_dir = osp.dirname(osp.abspath(__file__))
+default_baseline = osp.join(current_dir, 'baseline.json')
+
+ENV_NAME = 'SailboatLSAEnv-v0'
+
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def stand_in_servers(n, procs=None):
+    """Launch `n` stand-in simulators in their own processes, yields their endpoints.
+
+    The processes are appended to `procs` if provided.
+    """
+    procs = [] if procs is None else procs
+    endpoints = []
+    try:
+        for _ in range(n):
+            port = get_free_port()
+            proc = subprocess.Popen(
+                [sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in',
+                 f'--port={port}', '--host=127.0.0.1'],
+                stdout=subprocess.PIPE, text=True)
+            procs.append(proc)
+            endpoints.append(f'127.0.0.1:{port}')
+        for proc in procs:
+            assert READY_MESSAGE in proc.stdout.readline(), \
+                'Stand-in simulator failed to start'
+        yield endpoints
+    finally:
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+
+
+def get_rss_mb(pid):
+    """Resident memory of a process in MB, Linux only."""
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError(f'Could not read the memory of process {pid}')
+
+
+def random_action(rng):
+    return {'theta_rudder': rng.uniform(-np.pi / 4, np.pi / 4, 1).astype(np.float32),
+            'theta_sail': rng.uniform(-np.pi / 2, np.pi / 2, 1).astype(np.float32)}
+
+
+def best_rate(fn, nb_iters, repeat):
+    """Return the best rate (iterations/s) of `repeat` runs of `fn(nb_iters)`, like `timeit` the best run is the least disturbed one."""
+    durations = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(nb_iters)
+        durations.append(time.perf_counter() - t0)
+    return nb_iters / min(durations)
+
+
+def bench_env(nb_steps, nb_resets, repeat):
+    rng = np.random.default_rng(0)
+    with stand_in_servers(1) as endpoints:
+        env = SailboatLSAEnv(sim_endpoint=endpoints[0])
+        env.reset(seed=0)
+
+        def run(n):
+            for _ in range(n):
+                env.step(random_action(rng))
+        steps_per_s = best_rate(run, nb_steps, repeat)
+
+        latencies = []
+        for _ in range(nb_resets):
+            t0 = time.perf_counter()
+            env.reset()
+            latencies.append(time.perf_counter() - t0)
+        env.close()
+    return {
+        'env.steps_per_s': steps_per_s,
+        'env.reset_latency_ms.mean': np.mean(latencies) * 1e3,
+        'env.reset_latency_ms.p95': np.percentile(latencies, 95) * 1e3,
+    }
+
+
+def bench_vector_env(nb_steps, nb_envs_list, repeat):
+    results = {}
+    for nb_envs in nb_envs_list:
+        with stand_in_servers(nb_envs) as endpoints:
+            envs = gym.vector.AsyncVectorEnv([
+                lambda endpoint=endpoint: SailboatLSAEnv(sim_endpoint=endpoint)
+                for endpoint in endpoints])
+            envs.action_space.seed(0)
+            envs.reset(seed=0)
+            actions = [envs.action_space.sample() for _ in range(nb_steps)]
+
+            def run(n):
+                for action in actions[:n]:
+                    envs.step(action)
+            results[f'vector_env.n{nb_envs}.steps_per_s'] = nb_envs * \
+                best_rate(run, nb_steps, repeat)
+            envs.close()
+    return results
+
+
+def bench_multi_boat(nb_steps, nb_boats, repeat):
+    """Compare one boat per simulator with all the boats in a single simulator, the memory is the RSS of the simulators."""
+    results = {}
+    for name, boats_per_sim in [('boat_per_sim', 1), ('boats_in_one_sim', nb_boats)]:
+        procs = []
+        with stand_in_servers(nb_boats // boats_per_sim, procs) as endpoints:
+            envs = SailboatLSAVectorEnv(nb_boats,
+                                        boats_per_sim=boats_per_sim,
+                                        sim_endpoint=endpoints)
+            envs.action_space.seed(0)
+            envs.reset(seed=0)
+            actions = [envs.action_space.sample() for _ in range(nb_steps)]
+
+            def run(n):
+                for action in actions[:n]:
+                    envs.step(action)
+            steps_per_s = nb_boats * best_rate(run, nb_steps, repeat)
+            rss_mb = sum(get_rss_mb(proc.pid) for proc in procs)
+            envs.close()
+        prefix = f'multi_boat.n{nb_boats}.{name}'
+        results[f'{prefix}.steps_per_s'] = steps_per_s
+        results[f'{prefix}.sim_rss_mb'] = rss_mb
+        results[f'{prefix}.steps_per_s_per_gb'] = steps_per_s / (rss_mb / 1024)
+    return results
+
+
+def bench_renderer(nb_frames, repeat, batch_size=64):
+    rng = np.random.default_rng(0)
+    map_bounds = np.array([[-50, -50, 0], [50, 50, 1]], dtype=np.float32)
+    observations = [gym.spaces.utils.unflatten(
+        SailboatLSAEnv.observation_space,
+        rng.uniform(-1, 1, gym.spaces.utils.flatdim(SailboatLSAEnv.observation_space)).astype(np.float32))
+        for _ in range(nb_frames)]
+    batch = {k: np.stack([obs[k] for obs in observations[:batch_size]])
+             for k in observations[0]}
+
+    results = {}
+    for name, renderer in [('renderer', CV2DRenderer()), ('renderer.trail', CV2DRenderer(trail=True, trail_fade=.99)), ('raster_renderer', RasterRenderer())]:
+        renderer.setup(map_bounds)
+
+        def run(n, renderer=renderer):
+            for obs in observations[:n]:
+                renderer.render(obs)
+        results[f'{name}.frames_per_s'] = best_rate(run, nb_frames, repeat)
+
+    def run_batch(n):
+        for _ in range(n):
+            renderer.render_batch(batch)
+    results[f'raster_renderer.batch{batch_size}.frames_per_s'] = batch_size * \
+        best_rate(run_batch, max(1, nb_frames // batch_size), repeat)
+    return results
+
+
+def bench_threads(nb_steps, nb_threads_list, repeat, real_time_factor=10):
+    """Envs stepped concurrently, one per thread, against a simulator answering a step every 1 / (10 * real_time_factor) s.
+
+    The threads overlap the latency of the simulator, the speed-up is linear
+    until the client side saturates a core.
+    """
+    results = {}
+    with stand_in_servers(1) as endpoints:
+        for nb_threads in nb_threads_list:
+            envs = [SailboatLSAEnv(sim_endpoint=endpoints[0], name=f'thread-{i}',
+                                   real_time_factor=real_time_factor, step_log=False)
+                    for i in range(nb_threads)]
+            for env in envs:
+                env.reset(seed=0)
+
+            def run(n):
+                def rollout(env, seed):
+                    rng = np.random.default_rng(seed)
+                    for _ in range(n):
+                        env.step(random_action(rng))
+                threads = [threading.Thread(target=rollout, args=(env, i)) for i, env in enumerate(envs)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            results[f'threads.n{nb_threads}.steps_per_s'] = nb_threads * best_rate(run, nb_steps, repeat)
+            for env in envs:
+                env.close()
+    results['threads.speedup'] = results[f'threads.n{nb_threads_list[-1]}.steps_per_s'] \
+        / results[f'threads.n{nb_threads_list[0]}.steps_per_s']
+    return results
+
+
+def bench_render_rollout(nb_steps, repeat):
+    """Rollout rendering a frame per step, drawn in the stepping thread or by a DeferredRenderer."""
+    rng = np.random.default_rng(0)
+    results = {}
+    with stand_in_servers(1) as endpoints:
+        for name, renderer in [('sync', CV2DRenderer()), ('deferred', DeferredRenderer(CV2DRenderer()))]:
+            env = SailboatLSAEnv(sim_endpoint=endpoints[0], renderer=renderer, step_log=False)
+            env.reset(seed=0)
+
+            def run(n):
+                for _ in range(n):
+                    env.step(random_action(rng))
+                    env.render()
+            results[f'render_rollout.{name}.steps_per_s'] = best_rate(run, nb_steps, repeat)
+            if name == 'deferred':
+                renderer.close()
+            env.close()
+    return results
+
+
+def bench_helpers(nb_queries, repeat):
+    results = {}
+    thetas = np.linspace(0, 2 * np.pi, nb_queries)
+    for name, fn in [('get_best_sail', get_best_sail), ('get_vmc', get_vmc)]:
+        fn(ENV_NAME, 0)  # load the polar
+
+        def run(n, fn=fn):
+            for theta in thetas[:n]:
+                fn(ENV_NAME, theta)
+        results[f'helpers.{name}.queries_per_s'] = best_rate(run, nb_queries, repeat)
+    return results
+
+
+def bench_import_time(nb_runs):
+    durations = [measure_import_time(preloaded='sys')[0]
+                 for _ in range(nb_runs)]
+    return {'import.time_ms': np.median(durations) * 1e3}
+
+
+def bench_wire(number):
+    results = {}
+    for name, r in bench_wire_format(number).items():
+        results[f'wire.{name}.bytes_per_step'] = r['request_bytes'] + \
+            r['reply_bytes']
+        results[f'wire.{name}.decode_us'] = r['decode_us']
+    return results
+
+
+def bench_step_log(number):
+    """Cost of recording a step in the step log, against the time of a step (see env.steps_per_s)."""
+    log = StepLog(size=1000)
+    env_id = log.register('bench')
+    rng = np.random.default_rng(0)
+    obs = {key: rng.normal(size=space.shape).astype(np.float32)
+           for key, space in GymObservation.spaces.items()}
+    action, wind = random_action(rng), np.array([0., 1.])
+    duration = min(timeit.repeat(lambda: log.record(env_id, EVENT_STEP, 1, wind, wind, action, obs, 0., False, False),
+                                 number=number, repeat=3))
+    return {'step_log.record_us': duration / number * 1e6}
+
+
+def bench_history(number, nb_envs=8, history_sizes=(4, 256)):
+    """Cost of appending a batch of observations to the history and getting its views, it must not grow with the history size."""
+    rng = np.random.default_rng(0)
+    obs = {key: rng.normal(size=(nb_envs, *space.shape)).astype(np.float32)
+           for key, space in GymObservation.spaces.items()}
+    results = {}
+    for k in history_sizes:
+        history = HistoryBuffer(GymObservation, k, (nb_envs,))
+        history.fill(obs)
+
+        def step():
+            history.push(obs)
+            history.get()
+        duration = min(timeit.repeat(step, number=number, repeat=3))
+        results[f'history.k{k}.step_us'] = duration / number * 1e6
+    return results
+
+
+def vmc_rewards(obs, actions, next_obs):
+    """Velocity made good towards the wind, vectorized."""
+    wind = next_obs['wind'] / np.linalg.norm(next_obs['wind'], axis=-1, keepdims=True)
+    return np.sum(next_obs['dt_p_boat'][:, :2] * wind, axis=-1)
+
+
+def vmc_reward(obs, action, next_obs):
+    return float(vmc_rewards(*({k: v[None] for k, v in o.items()} for o in (obs, action, next_obs)))[0])
+
+
+def bench_relabel(nb_transitions, repeat):
+    """Transitions relabeled per second (in this process, chunks read from and written to the disk), with a vectorized reward and with the per-transition reward of an env."""
+    rng = np.random.default_rng(0)
+    results = {}
+    for name, fn, n in [('vectorized', vmc_rewards, nb_transitions),
+                        ('per_transition', PerTransition(vmc_reward), nb_transitions // 100)]:
+        obs = {key: rng.normal(size=(n, *space.shape)).astype(np.float32)
+               for key, space in GymObservation.spaces.items()}
+        actions = {key: rng.normal(size=(n, 1)).astype(np.float32) for key in ['theta_rudder', 'theta_sail']}
+        with tempfile.TemporaryDirectory() as path:
+            save_transitions(path, obs, actions, obs)
+            duration = min(timeit.repeat(lambda: relabel(path, rewards={name: fn}, num_workers=0),
+                                         number=1, repeat=repeat))
+        results[f'relabel.{name}.transitions_per_s'] = n / duration
+    return results
+
+
+def bench_subprocess_backends(nb_steps, nb_startups):
+    results = {}
+    for name, r in bench_backends(nb_steps, nb_startups).items():
+        for metric, value in r.items():
+            results[f'backend.{name}.{metric}'] = value
+    return results
+
+
+def get_machine_info():
+    return {
+        'date': datetime.datetime.now().isoformat(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'sailboat_gym': sailboat_gym.__version__,
+    }
+
+
+def is_higher_better(metric):
+    return metric.endswith('_per_s') or metric.endswith('.speedup')
+
+
+def compare(results, baseline, threshold):
+    """Return the list of (metric, value, baseline value, relative change) that regressed by more than `threshold`."""
+    regressions = []
+    for metric, value in results.items():
+        if metric not in baseline or metric.endswith('bytes_per_step'):
+            continue
+        ref = baseline[metric]
+        change = (value - ref) / ref if ref else 0
+        worse = -change if is_higher_better(metric) else change
+        if worse > threshold:
+            regressions.append((metric, value, ref, change))
+    return regressions
+
+
+@click.command()
+@click.option('--output', default=None, help='Write the results to this JSON file', type=str)
+@click.option('--baseline', default=default_baseline, help='Baseline to compare against', type=str)
+@click.option('--threshold', default=.2, help='Relative change considered as a regression', type=float)
+@click.option('--update-baseline', is_flag=True, help='Store the results as the new baseline')
+@click.option('--quick', is_flag=True, help='Fewer iterations, noisier results')
+def main(output, baseline, threshold, update_baseline, quick):
+    scale = .1 if quick else 1
+    repeat = 1 if quick else 3
+    results = {}
+    for name, bench in [
+        ('env', lambda: bench_env(int(2000 * scale), int(200 * scale), repeat)),
+        ('vector env', lambda: bench_vector_env(int(500 * scale), [1, 2, 4, 8], repeat)),
+        ('threads', lambda: bench_threads(int(200 * scale), [1, 2, 4, 8], repeat)),
+        ('multi boat', lambda: bench_multi_boat(int(500 * scale), 8, repeat)),
+        ('renderer', lambda: bench_renderer(int(1000 * scale), repeat)),
+        ('render rollout', lambda: bench_render_rollout(int(500 * scale), repeat)),
+        ('helpers', lambda: bench_helpers(int(200 * scale), repeat)),
+        ('import time', lambda: bench_import_time(max(1, int(5 * scale)))),
+        ('wire format', lambda: bench_wire(int(20000 * scale))),
+        ('step log', lambda: bench_step_log(int(20000 * scale))),
+        ('history', lambda: bench_history(int(20000 * scale))),
+        ('relabel', lambda: bench_relabel(int(1_000_000 * scale), repeat)),
+        ('backends', lambda: bench_subprocess_backends(int(1000 * scale), max(1, int(3 * scale)))),
+    ]:
+        print(f'Running {name} benchmark...')
+        results.update(bench())
+
+    report = {'machine': get_machine_info(), 'results': results}
+    for metric, value in results.items():
+        print(f'  {metric:<45}{value:>14.2f}')
+
+    if output:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if update_baseline:
+        with open(baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Saved baseline to {baseline}')
+        return
+
+    if not osp.exists(baseline):
+        print(f'No baseline found at {baseline}, run with --update-baseline to create one.')
+        return
+    with open(baseline) as f:
+        ref = json.load(f)
+    regressions = compare(results, ref['results'], threshold)
+    print(f'\nCompared to baseline from {ref["machine"]["date"]} ({ref["machine"]["processor"]}, {ref["machine"]["cpu_count"]} cpus):')
+    if not regressions:
+        print(f'  no regression above {threshold:.0%}')
+        return
+    for metric, value, ref_value, change in regressions:
+        print(f'  ❌ {metric}: {value:.2f} (baseline: {ref_value:.2f}, {change:+.0%})')
+    exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -16,7 +16,7 @@ def generate_wind(_):
 
 
 env = gym.make('SailboatLSAEnv-v0',
-               renderer=CV2DRenderer(),
+               renderer=CV2DRenderer(trail=True),
                wind_generator_fn=generate_wind,
                video_speed=20,
                map_scale=.25,
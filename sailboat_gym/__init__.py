@@ -1,9 +1,61 @@
+import importlib
 
 from .envs import *
-from .renderers import *
 from .types import *
 from .abstracts import *
-from .helpers import *
 from .utils import *
 
 __version__ = '1.2.0'
+
+# heavy dependencies (cv2, docker, pandas...) are only imported on first use
+_lazy_attrs = {
+    'SailboatLSAEnv': '.envs',
+    'SailboatLSAVectorEnv': '.envs',
+    'RemoteVectorEnv': '.envs',
+    'EnvServer': '.envs',
+    'DockerBackend': '.envs',
+    'SubprocessBackend': '.envs',
+    'CONTAINER_TAGS': '.envs',
+    'StepLog': '.envs',
+    'step_log': '.envs',
+    'env_by_name': '.envs',
+    'close_all': '.envs.sailboat_lsa.lsa_teardown',
+    'CV2DRenderer': '.renderers',
+    'RasterRenderer': '.renderers',
+    'DeferredRenderer': '.renderers',
+    'BatchPixelObservation': '.wrappers',
+    'ObservationHistory': '.wrappers',
+    'BatchObservationHistory': '.wrappers',
+    'get_best_sail': '.helpers',
+    'load_best_sail_dict': '.helpers',
+    'extract_best_sail': '.helpers',
+    'get_vmc': '.helpers',
+    'load_vmc_dict': '.helpers',
+    'extract_vmc': '.helpers',
+    'extract_vmc_from_df': '.helpers',
+    'RolloutCache': '.helpers',
+    'rollout_key': '.helpers',
+    'run_open_loop': '.helpers',
+    'save_transitions': '.helpers',
+    'load_transitions': '.helpers',
+    'rollout_to_transitions': '.helpers',
+    'step_log_to_transitions': '.helpers',
+    'PerTransition': '.helpers',
+    'relabel': '.helpers',
+    'evaluate': '.helpers',
+    'get_scenario_grid': '.helpers',
+    'load_results': '.helpers',
+    'summarize': '.helpers',
+}
+
+
+def __getattr__(name):
+    if name not in _lazy_attrs:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_lazy_attrs[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attrs.keys()))
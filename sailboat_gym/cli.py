@@ -0,0 +1,194 @@
+"""Command line interface of sailboat_gym.
+
+Usage:
+    sailboat_gym <command> [options]  (or python3 -m sailboat_gym <command> [options])
+
+Commands:
+    log       Pretty-print a dump of the step log
+    serve     Host a pool of environments for RemoteVectorEnv clients
+    relabel   Evaluate new rewards/terminations over recorded transitions
+    evaluate  Evaluate a policy over a grid of wind angles and velocities
+    top       Live throughput and health of the simulators of the running processes
+"""
+import argparse
+import importlib
+
+
+def log_command(args):
+    from .envs.sailboat_lsa.lsa_step_log import print_dump
+    print_dump(args.path, args.env, args.last)
+
+
+def load_callable(path):
+    """Return the callable designated by 'module:name'."""
+    module_name, _, name = path.partition(':')
+    assert name, f'Expected module:name, got {path}'
+    return getattr(importlib.import_module(module_name), name)
+
+
+def serve_command(args):
+    import gymnasium as gym
+    from .envs.sailboat_lsa.lsa_env_server import EnvServer
+
+    task = load_callable(args.task) if args.task else None
+
+    def make_env(i):
+        kwargs = task(i) if task else {}
+        return gym.make(args.env_name,
+                        name=f'{args.name}-{i}',
+                        sim_endpoint=args.sim_endpoint,
+                        max_episode_steps=args.max_episode_steps,
+                        **kwargs)
+
+    server = EnvServer(make_env, args.num_envs, args.bind, args.session_timeout)
+    print(f'Serving {args.num_envs} {args.env_name} on {server.endpoint}', flush=True)
+    try:
+        server.serve_forever(args.report_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def parse_named_callables(specs):
+    """Return {name: callable} from a list of 'name=module:function'."""
+    fns = {}
+    for spec in specs:
+        name, _, path = spec.partition('=')
+        assert path, f'Expected name=module:function, got {spec}'
+        fns[name] = load_callable(path)
+    return fns
+
+
+def relabel_command(args):
+    import time
+    from .helpers.relabel import relabel
+
+    t0 = time.time()
+    columns = relabel(args.path,
+                      rewards=parse_named_callables(args.reward),
+                      terminations=parse_named_callables(args.termination),
+                      chunk_size=args.chunk_size,
+                      num_workers=args.workers)
+    print(f'Wrote {", ".join(columns)} in {time.time() - t0:.1f}s', flush=True)
+
+
+def parse_floats(values):
+    return [float(value) for value in values.split(',')]
+
+
+def evaluate_command(args):
+    from .helpers.evaluate import evaluate, get_scenario_grid, summarize, format_summary, format_throughput
+
+    scenarios = get_scenario_grid(parse_floats(args.theta_winds),
+                                  parse_floats(args.wind_velocities),
+                                  range(args.seeds))
+    results = evaluate(load_callable(args.policy), scenarios,
+                       num_sims=args.num_sims,
+                       duration=args.duration,
+                       output=args.output,
+                       course=args.course,
+                       env_name=args.env_name,
+                       name=args.name,
+                       verbose=args.verbose,
+                       sim_endpoint=args.sim_endpoint)
+    print(format_summary(summarize(results['episodes'])))
+    print(format_throughput(results['throughput']), flush=True)
+
+
+def top_command(args):
+    from .envs.sailboat_lsa.lsa_monitor import top, DEFAULT_DIR
+    try:
+        top(args.dir or DEFAULT_DIR, args.interval, args.once)
+    except KeyboardInterrupt:
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='sailboat_gym')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    log_parser = subparsers.add_parser(
+        'log', help='Pretty-print a dump of the step log')
+    log_parser.add_argument('path', help='Dump written by StepLog.dump (.npz)')
+    log_parser.add_argument('--env', default=None,
+                            help='Only print the records of this environment')
+    log_parser.add_argument('--last', type=int, default=None,
+                            help='Only print the last N records')
+    log_parser.set_defaults(fn=log_command)
+
+    serve_parser = subparsers.add_parser(
+        'serve', help='Host a pool of environments for RemoteVectorEnv clients')
+    serve_parser.add_argument('--num-envs', type=int, default=8,
+                              help='Number of environments of the pool, shared by the clients')
+    serve_parser.add_argument('--bind', default='tcp://*:5600',
+                              help='zmq address of the server')
+    serve_parser.add_argument('--env-name', default='SailboatLSAEnv-v0',
+                              help='Name of the environments')
+    serve_parser.add_argument('--name', default='serve',
+                              help='Prefix of the names of the simulations')
+    serve_parser.add_argument('--sim-endpoint', default=None,
+                              help='Address(es) of running simulators, docker containers are launched otherwise')
+    serve_parser.add_argument('--max-episode-steps', type=int, default=None,
+                              help='Truncate the episodes after this number of steps')
+    serve_parser.add_argument('--task', default=None,
+                              help='module:function called with the index of each environment, returning its extra keyword arguments (reward_fn, wind_generator_fn...)')
+    serve_parser.add_argument('--session-timeout', type=float, default=300,
+                              help='Close the sessions of the clients inactive for this time (seconds)')
+    serve_parser.add_argument('--report-interval', type=float, default=10,
+                              help='Print the queue depth and the throughput of the clients every N seconds (0 to disable)')
+    serve_parser.set_defaults(fn=serve_command)
+
+    relabel_parser = subparsers.add_parser(
+        'relabel', help='Evaluate new rewards/terminations over recorded transitions')
+    relabel_parser.add_argument('path', help='Directory of the transitions (see save_transitions)')
+    relabel_parser.add_argument('--reward', action='append', default=[],
+                                help='name=module:function, vectorized reward written to reward.<name>.npy (repeatable)')
+    relabel_parser.add_argument('--termination', action='append', default=[],
+                                help='name=module:function, vectorized termination written to terminated.<name>.npy (repeatable)')
+    relabel_parser.add_argument('--chunk-size', type=int, default=2**16,
+                                help='Number of transitions evaluated at once by a worker')
+    relabel_parser.add_argument('--workers', type=int, default=None,
+                                help='Number of processes, 0 to evaluate in this process (defaults to the number of CPUs)')
+    relabel_parser.set_defaults(fn=relabel_command)
+
+    evaluate_parser = subparsers.add_parser(
+        'evaluate', help='Evaluate a policy over a grid of wind angles and velocities')
+    evaluate_parser.add_argument('--policy', required=True,
+                                 help='module:function returning the action of an observation')
+    evaluate_parser.add_argument('--theta-winds', default='0,45,90,135,180',
+                                 help='Comma-separated wind angles (degrees)')
+    evaluate_parser.add_argument('--wind-velocities', default='1,2',
+                                 help='Comma-separated wind velocities (m/s)')
+    evaluate_parser.add_argument('--seeds', type=int, default=1,
+                                 help='Number of episodes (seeds) per wind angle and velocity')
+    evaluate_parser.add_argument('--num-sims', type=int, default=4,
+                                 help='Number of simulators the episodes are scheduled on')
+    evaluate_parser.add_argument('--duration', type=float, default=60,
+                                 help='Maximum simulated duration of an episode (seconds)')
+    evaluate_parser.add_argument('--course', type=float, default=0,
+                                 help='Direction along which the VMC and the distance made good are measured (degrees)')
+    evaluate_parser.add_argument('--output', default=None,
+                                 help='JSON lines file the metrics of each episode are appended to')
+    evaluate_parser.add_argument('--env-name', default='SailboatLSAEnv-v0',
+                                 help='Name of the environments')
+    evaluate_parser.add_argument('--name', default='evaluate',
+                                 help='Prefix of the names of the simulations')
+    evaluate_parser.add_argument('--sim-endpoint', default=None,
+                                 help='Address(es) of running simulators, docker containers are launched otherwise')
+    evaluate_parser.add_argument('--verbose', action='store_true',
+                                 help='Print the metrics of each episode as it ends')
+    evaluate_parser.set_defaults(fn=evaluate_command)
+
+    top_parser = subparsers.add_parser(
+        'top', help='Live throughput and health of the simulators of the running processes')
+    top_parser.add_argument('--interval', type=float, default=1,
+                            help='Refresh period (seconds)')
+    top_parser.add_argument('--once', action='store_true',
+                            help='Print the table once and exit')
+    top_parser.add_argument('--dir', default=None,
+                            help='Directory of the counters published by the processes (defaults to $SAILBOAT_MONITOR_DIR or /dev/shm/sailboat_gym_monitor)')
+    top_parser.set_defaults(fn=top_command)
+
+    args = parser.parse_args(argv)
+    args.fn(args)
@@ -1,14 +1,43 @@
 from gymnasium.envs.registration import register
 
-from .sailboat_lsa import SailboatLSAEnv
 from .env import *
 
-env_by_name = {
-    'SailboatLSAEnv-v0': SailboatLSAEnv,
+# environments are registered by entry point so that their dependencies
+# (docker, zmq, msgpack...) are only imported when the environment is created
+env_entry_points = {
+    'SailboatLSAEnv-v0': 'sailboat_gym.envs.sailboat_lsa:SailboatLSAEnv',
 }
 
-for name, env in env_by_name.items():
+env_names = list(env_entry_points.keys())
+
+for name, entry_point in env_entry_points.items():
     register(
         id=name,
-        entry_point=f'sailboat_gym.envs:{env.__name__}',
+        entry_point=entry_point,
     )
+
+
+def __getattr__(name):
+    if name == 'SailboatLSAEnv':
+        from .sailboat_lsa import SailboatLSAEnv
+        return SailboatLSAEnv
+    if name == 'SailboatLSAVectorEnv':
+        from .sailboat_lsa import SailboatLSAVectorEnv
+        return SailboatLSAVectorEnv
+    if name == 'RemoteVectorEnv':
+        from .sailboat_lsa import RemoteVectorEnv
+        return RemoteVectorEnv
+    if name == 'EnvServer':
+        from .sailboat_lsa import EnvServer
+        return EnvServer
+    if name in ['DockerBackend', 'SubprocessBackend', 'CONTAINER_TAGS']:
+        from .sailboat_lsa import lsa_backends
+        return getattr(lsa_backends, name)
+    if name in ['StepLog', 'step_log']:
+        from .sailboat_lsa import lsa_step_log
+        return getattr(lsa_step_log, name)
+    if name == 'env_by_name':
+        from gymnasium.envs.registration import load_env_creator
+        return {env_name: load_env_creator(entry_point)
+                for env_name, entry_point in env_entry_points.items()}
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -1 +1,6 @@
-from .lsa_env import SailboatLSAEnv
\ No newline at end of file
+from .lsa_env import SailboatLSAEnv
+from .lsa_vector_env import SailboatLSAVectorEnv
+from .lsa_remote_vector_env import RemoteVectorEnv
+from .lsa_backends import AbcSimBackend, DockerBackend, SubprocessBackend, CONTAINER_TAGS
+from .lsa_step_log import StepLog, step_log
+from .lsa_env_server import EnvServer
@@ -0,0 +1,416 @@
+"""Management of the simulator processes launched by `LSASim`.
+
+A backend launches (or reuses) the simulator of a `LSASim`, waits until it is
+ready, pauses it while it is inactive and stops it. `DockerBackend` runs the
+simulator in a docker container, `SubprocessBackend` runs a command in a local
+process (e.g. the `roslaunch` bridge on hosts where the simulation stack is
+installed natively, or the stand-in simulator).
+"""
+import collections
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import docker
+import zmq
+from abc import abstractmethod
+from typing import Dict, List, Union
+
+from ...abstracts import ABCProfilingMeta
+from ...utils import is_debugging, is_debugging_all, DurationProgress
+from .lsa_placement import CONTAINER_PREFIX, placement_lock, allocate_cpus, get_used_cpus, get_container_stats, format_cpulist, parse_cpulist
+
+READY_MESSAGE = 'INTENTIFIED CONTROL!'
+
+DOCKER_IMAGE_REPOSITORY = 'lucasmrdt/sailboat-sim-lsa-gym'
+# images built by docker/build-docker.sh: '<max step size>-<physics engine>'
+MAX_STEP_SIZES = {'mss1': 0.001, 'mss2': 0.002, 'mss4': 0.004}  # seconds
+PHYSICS_ENGINES = ['ode', 'bullet', 'simbody', 'dart']
+CONTAINER_TAGS = [f'{mss}-{engine}' for engine in PHYSICS_ENGINES for mss in MAX_STEP_SIZES]
+DEFAULT_CONTAINER_TAG = 'mss1-ode'
+
+
+def get_image_name(container_tag: str) -> str:
+    """Docker image of a container tag, e.g. 'mss4-ode' (or 'mss4', ode by default). Full image names (with a ':') are kept as is."""
+    if ':' in container_tag:
+        return container_tag
+    if container_tag in MAX_STEP_SIZES:
+        container_tag = f'{container_tag}-ode'
+    if container_tag not in CONTAINER_TAGS:
+        raise ValueError(
+            f'Unknown container tag: {container_tag}, available: {", ".join(CONTAINER_TAGS)}')
+    return f'{DOCKER_IMAGE_REPOSITORY}:{container_tag}'
+
+
+def parse_container_tag(container_tag: str):
+    """Return the maximum step size (in seconds) and the physics engine of a container tag."""
+    mss, engine = get_image_name(container_tag).rsplit(':', 1)[1].split('-')
+    return MAX_STEP_SIZES[mss], engine
+
+
+class AbcSimBackend(metaclass=ABCProfilingMeta):
+    @abstractmethod
+    def launch(self, name: str) -> str:
+        """Launch the simulator named `name` (or reuse a running one), returns the endpoint to connect to."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait_until_ready(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def stop(self) -> None:
+        """Kill the simulator, it must not fail if the simulator is already gone."""
+        raise NotImplementedError
+
+    def wait_stopped(self) -> None:
+        """Wait until the simulator is gone, before launching it again."""
+
+    def pause(self) -> None:
+        """Pause the simulator while it is inactive."""
+
+    def resume(self) -> None:
+        pass
+
+    def resource_stats(self) -> Union[dict, None]:
+        return None
+
+    def get_image(self) -> str:
+        """Identifier of the simulator version (e.g. the docker image), rollouts of different images are cached separately."""
+        return type(self).__name__
+
+
+class DockerBackend(AbcSimBackend):
+    DEFAULT_PORT = 5555  # set in Dockerfile
+    DOCKER_IMAGE_NAME = f'{DOCKER_IMAGE_REPOSITORY}:{DEFAULT_CONTAINER_TAG}'
+
+    def __init__(self, cpus: Union[int, None] = None, mem_limit: Union[str, None] = None, reserved_cpus: Union[str, List[int], None] = None, container_tag: str = DEFAULT_CONTAINER_TAG) -> None:
+        """
+        Args:
+            cpus (int, optional): Number of cores the container is pinned on, picked among the least used cores of the least used NUMA node. Defaults to None (not pinned).
+            mem_limit (str, optional): Memory limit of the container (e.g. '2g'). Defaults to None (no limit).
+            reserved_cpus (Union[str, List[int]], optional): Cores never assigned to the container (e.g. '0-3' for the trainer). Defaults to None.
+            container_tag (str, optional): Physics step size and engine of the image (e.g. 'mss4-ode', see CONTAINER_TAGS), or a full image name. Defaults to 'mss1-ode'.
+        """
+        self.image = get_image_name(container_tag)
+        self.cpus = cpus
+        self.mem_limit = mem_limit
+        self.reserved_cpus = parse_cpulist(reserved_cpus)
+        self.name = None
+        self.container = None
+        self.port = None
+
+    def launch(self, name: str) -> str:
+        self.name = name
+        self.__pull_image_if_needed()
+        self.container, self.port = self.__launch_or_get_container(name)  # noqa
+        return f'tcp://localhost:{self.port}'
+
+    def wait_until_ready(self) -> None:
+        with DurationProgress(total=17, desc='Waiting for docker container to be ready'):
+            while True:
+                logs = self.container.logs().decode('utf-8')
+                if READY_MESSAGE in logs:
+                    break
+                time.sleep(1)
+
+    def stop(self) -> None:
+        if self.container is None:
+            return
+        try:
+            self.container.kill()
+        except docker.errors.NotFound:
+            pass  # already removed
+        except docker.errors.APIError:
+            # older docker versions refuse to kill a paused container
+            self.container.unpause()
+            self.container.kill()
+
+    def wait_stopped(self) -> None:
+        try:
+            self.container.wait(condition='removed')
+        except docker.errors.APIError:
+            pass  # the container is already gone
+
+    def pause(self) -> None:
+        try:
+            self.container.pause()
+        except docker.errors.APIError as e:
+            if is_debugging_all():
+                raise e
+
+    def resume(self) -> None:
+        try:
+            self.container.unpause()
+        except docker.errors.APIError as e:
+            if is_debugging_all():
+                raise e
+
+    def resource_stats(self) -> Union[dict, None]:
+        """CPU usage (in % of one core), throttling and memory usage of the container."""
+        return get_container_stats(self.container)
+
+    def get_image(self) -> str:
+        return self.image
+
+    def __get_available_port(self):
+        def get_random_port():
+            # https://stackoverflow.com/a/46023565
+            random_int = int.from_bytes(os.urandom(2), byteorder='big')
+            return random_int % (65535 - 49152) + 49152
+
+        port = get_random_port()
+        while True:
+            try:
+                context = zmq.Context()
+                socket = context.socket(zmq.REQ)
+                socket.bind(f'tcp://*:{port}')
+                socket.close()
+                return port
+            except zmq.error.ZMQError:
+                port = get_random_port()
+
+    def __pull_image_if_needed(self):
+        client = docker.from_env()
+
+        # Check if image is already pulled
+        images = [img.tags for img in client.images.list()]
+        if any(self.image in tags for tags in images):
+            return
+
+        for progress_dict in client.api.pull(self.image, stream=True, decode=True):
+            status = progress_dict.get('status')
+            progress = progress_dict.get('progress')
+
+            if progress:
+                sys.stdout.write(f'\r{status}: {progress}')
+                sys.stdout.flush()
+
+        print()
+
+    def __launch_or_get_container(self, name):
+        with DurationProgress(total=7, desc='Launching docker container'):
+            try:
+                client = docker.from_env()
+            except docker.errors.DockerException as e:
+                if is_debugging():
+                    raise e
+                raise RuntimeError(
+                    'Docker socket is not detected. Please start docker and try again or make sure that you have correctly installed docker (MacOS: refer to this instruction https://stackoverflow.com/a/76125150).') from e
+
+            name = f'{CONTAINER_PREFIX}{name}'
+
+            # try to find an existing container with the given name
+            try:
+                container = client.containers.get(name)
+            except docker.errors.NotFound:
+                container = None
+            if container:
+                image = container.attrs['Config']['Image']
+                if image != self.image:
+                    raise RuntimeError(
+                        f'The docker container {name} runs {image} instead of {self.image}. '
+                        'Please use another name for the environment or stop the container.')
+                port = container.attrs['NetworkSettings']['Ports'][
+                    f'{self.DEFAULT_PORT}/tcp'][0]['HostPort']
+                if is_debugging():
+                    print(
+                        f'\n[DockerBackend] Found existing docker container {name} running on port {port}')
+                return container, port
+
+            # find an available port
+            port = self.__get_available_port()
+
+            # launch a new container if none found or the existing container is not running
+            try:
+                with placement_lock:
+                    container = client.containers.run(
+                        self.image,
+                        name=name,
+                        detach=True,
+                        auto_remove=True,
+                        ports={
+                            f'{self.DEFAULT_PORT}/tcp': port,
+                            '22/tcp': None,
+                        },
+                        **self.__get_placement(client),
+                    )
+            except docker.errors.NotFound as e:
+                raise RuntimeError(
+                    f'Could not find docker image {self.image}. '
+                    'Please make sure the image exists and try again.'
+                ) from e
+            except docker.errors.APIError as e:
+                raise RuntimeError(
+                    f'Error communicating with Docker API: {str(e)}. '
+                    'Please check that the Docker daemon is running and try again.'
+                ) from e
+            except docker.errors.ContainerError as e:
+                raise RuntimeError(
+                    f'Container exited with non-zero exit code: {str(e)}. '
+                    'Please check the container logs for more information.'
+                ) from e
+            except docker.errors.ImageNotFound as e:
+                raise RuntimeError(
+                    f'Image not found: {str(e)}. '
+                    'Please check that the image exists on the Docker registry and try again.'
+                ) from e
+
+        return container, port
+
+    def __get_placement(self, client):
+        placement = {}
+        if self.cpus:
+            cpus, nodes = allocate_cpus(self.cpus, get_used_cpus(client),
+                                        reserved=self.reserved_cpus)
+            placement['cpuset_cpus'] = format_cpulist(cpus)
+            placement['cpuset_mems'] = format_cpulist(nodes)
+        if self.mem_limit:
+            placement['mem_limit'] = self.mem_limit
+        if is_debugging() and placement:
+            print(f'[DockerBackend] Placing container of {self.name}: {placement}')
+        return placement
+
+
+class SubprocessBackend(AbcSimBackend):
+    """Run the simulator as a local process, without docker.
+
+    The command is formatted with the endpoint the simulator must bind to
+    (`{endpoint}`, e.g. 'ipc:///tmp/sailboat-sim-lsa-gym-0.ipc') and the name of the
+    simulation (`{name}`). The simulator is ready once `ready_message` is printed
+    on its standard output, it runs in its own process group which is killed
+    on stop (e.g. the nodes started by `roslaunch`).
+    """
+
+    def __init__(self, command: List[str], transport: str = 'ipc', ready_message: str = READY_MESSAGE, startup_timeout: float = 60, env: Union[Dict[str, str], None] = None, cwd: Union[str, None] = None) -> None:
+        """
+        Args:
+            command (List[str]): Command launching the simulator, e.g. [sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in', '--bind={endpoint}'].
+            transport (str, optional): 'ipc' (unix domain socket, local only) or 'tcp' (free port on 127.0.0.1). Defaults to 'ipc'.
+            ready_message (str, optional): Line printed by the simulator once it accepts requests. Defaults to READY_MESSAGE.
+            startup_timeout (float, optional): Maximum time (in seconds) to wait for the ready message. Defaults to 60.
+            env (Dict[str, str], optional): Environment variables added to the ones of the current process. Defaults to None.
+            cwd (str, optional): Working directory of the simulator. Defaults to None.
+        """
+        assert transport in ['ipc', 'tcp'], f'Unknown transport: {transport}'
+        self.command = command
+        self.transport = transport
+        self.ready_message = ready_message
+        self.startup_timeout = startup_timeout
+        self.env = env
+        self.cwd = cwd
+        self.name = None
+        self.proc = None
+        self.endpoint = None
+        self.ready = None
+        self.logs = None  # last lines printed by the simulator
+        self.last_cpu_sample = None  # (wall clock, cpu time) of the last resource_stats
+
+    def launch(self, name: str) -> str:
+        self.name = name
+        self.endpoint = self.__get_endpoint(name)
+        command = [arg.format(endpoint=self.endpoint, name=name)
+                   for arg in self.command]
+        if is_debugging():
+            print(f'[SubprocessBackend] Launching {" ".join(command)}')
+        # created on launch, the backend is copied by each LSASim
+        self.ready = threading.Event()
+        self.logs = collections.deque(maxlen=100)
+        self.proc = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            env={**os.environ, **self.env} if self.env else None,
+            cwd=self.cwd,
+            start_new_session=True)
+        self.last_cpu_sample = (time.monotonic(), 0.)
+        # the output must be drained, a full pipe would block the simulator
+        threading.Thread(target=self.__read_output,
+                         args=(self.proc, self.ready, self.logs),
+                         daemon=True).start()
+        return self.endpoint
+
+    def wait_until_ready(self) -> None:
+        deadline = time.time() + self.startup_timeout
+        while not self.ready.wait(.05):
+            if self.proc.poll() is not None or time.time() > deadline:
+                logs = '\n'.join(self.logs)
+                self.stop()
+                raise RuntimeError(
+                    f'Simulator {self.name} did not start (exit code: {self.proc.returncode}), last output:\n{logs}')
+
+    def stop(self) -> None:
+        if self.proc is None:
+            return
+        self.__signal(signal.SIGKILL if hasattr(signal, 'SIGKILL') else signal.SIGTERM)
+        self.proc.wait()
+        if self.endpoint.startswith('ipc://'):
+            try:
+                os.remove(self.endpoint[len('ipc://'):])
+            except OSError:
+                pass  # already removed
+
+    def wait_stopped(self) -> None:
+        if self.proc is not None:
+            self.proc.wait()
+
+    def pause(self) -> None:
+        if hasattr(signal, 'SIGSTOP'):
+            self.__signal(signal.SIGSTOP)
+
+    def resume(self) -> None:
+        if hasattr(signal, 'SIGCONT'):
+            self.__signal(signal.SIGCONT)
+
+    def resource_stats(self) -> Union[dict, None]:
+        """CPU usage (in % of one core, since the previous call) and memory usage of the simulator process, None where /proc is not available."""
+        try:
+            with open(f'/proc/{self.proc.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{self.proc.pid}/statm') as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, AttributeError):
+            return None
+        now = time.monotonic()
+        cpu_time = (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime + stime
+        last_time, last_cpu_time = self.last_cpu_sample
+        self.last_cpu_sample = (now, cpu_time)
+        return {
+            'cpu_percent': 100. * (cpu_time - last_cpu_time) / (now - last_time) if now > last_time else 0.,
+            'memory_mb': rss_pages * os.sysconf('SC_PAGE_SIZE') / 2**20,
+        }
+
+    def get_image(self) -> str:
+        return ' '.join(self.command)
+
+    def __signal(self, sig):
+        try:
+            if hasattr(os, 'killpg'):
+                os.killpg(self.proc.pid, sig)
+            else:
+                self.proc.send_signal(sig)
+        except (ProcessLookupError, PermissionError):
+            pass  # already gone
+
+    def __get_endpoint(self, name):
+        if self.transport == 'ipc':
+            path = os.path.join(tempfile.gettempdir(),
+                                f'{CONTAINER_PREFIX}{name}-{os.getpid()}.ipc')
+            return f'ipc://{path}'
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            return f'tcp://127.0.0.1:{s.getsockname()[1]}'
+
+    def __read_output(self, proc, ready, logs):
+        for line in proc.stdout:
+            line = line.rstrip('\n')
+            logs.append(line)
+            if is_debugging_all():
+                print(f'[{self.name}] {line}')
+            if self.ready_message in line:
+                ready.set()
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+import msgpack
+import zmq
+from typing import Dict, Iterable, List, Union
+
+from ...utils import is_debugging
+
+
+def normalize_endpoint(endpoint: str) -> str:
+    endpoint = endpoint.strip()
+    return endpoint if '://' in endpoint else f'tcp://{endpoint}'
+
+
+def load_registry(filepath: str) -> List[str]:
+    """Read a registry file listing one `host:port` per line (`#` starts a comment)."""
+    with open(filepath) as f:
+        lines = [line.split('#')[0].strip() for line in f]
+    return [normalize_endpoint(line) for line in lines if line]
+
+
+def parse_endpoints(endpoints: Union[str, Iterable[str]]) -> List[str]:
+    """Return the list of endpoints described by an address, a list of addresses or a registry file."""
+    if isinstance(endpoints, str):
+        if os.path.isfile(endpoints):
+            return load_registry(endpoints)
+        endpoints = endpoints.split(',')
+    endpoints = [normalize_endpoint(e) for e in endpoints if e.strip()]
+    assert endpoints, 'At least one endpoint is required'
+    return endpoints
+
+
+def ping(endpoint: str, timeout: float = 1.):
+    """Return the round trip time (in seconds) and the number of sessions of a simulator, or None if it did not reply in time."""
+    context = zmq.Context.instance()
+    socket = context.socket(zmq.REQ)
+    socket.setsockopt(zmq.LINGER, 0)
+    try:
+        socket.connect(endpoint)
+        t0 = time.time()
+        socket.send(msgpack.packb({'ping': True}))
+        if not socket.poll(int(timeout * 1e3)):
+            return None
+        msg = msgpack.unpackb(socket.recv(), raw=False)
+        return time.time() - t0, msg.get('load', 0)
+    finally:
+        socket.close()
+
+
+class EndpointScheduler:
+    """Spread the simulations of the process across several simulator endpoints.
+
+    Endpoints are scored by their measured round trip time and their load,
+    the number of sessions they report or the number of simulations of this
+    process using them (whichever is higher). Round trip times below
+    `rtt_resolution` are considered equal so that the load decides between
+    close endpoints. Endpoints that do not reply are put aside for
+    `retry_after` seconds.
+    """
+
+    def __init__(self, endpoints: List[str], ping_timeout: float = 1., retry_after: float = 30., rtt_resolution: float = 5e-3) -> None:
+        self.endpoints = endpoints
+        self.ping_timeout = ping_timeout
+        self.retry_after = retry_after
+        self.rtt_resolution = rtt_resolution
+        self.lock = threading.Lock()
+        self.nb_users = {endpoint: 0 for endpoint in endpoints}
+        self.dead_since: Dict[str, float] = {}
+
+    def acquire(self, exclude: Iterable[str] = ()) -> str:
+        now = time.time()
+        with self.lock:
+            candidates = [e for e in self.endpoints
+                          if e not in exclude
+                          and now - self.dead_since.get(e, -self.retry_after) >= self.retry_after]
+        scores = {}
+        for endpoint in candidates:
+            res = ping(endpoint, self.ping_timeout)
+            if res is None:
+                self.mark_dead(endpoint)
+                continue
+            rtt, load = res
+            with self.lock:
+                load = max(load, self.nb_users[endpoint])
+            scores[endpoint] = max(rtt, self.rtt_resolution) * (1 + load)
+            if is_debugging():
+                print(
+                    f'[EndpointScheduler] {endpoint}: rtt={rtt * 1e3:.2f}ms load={load}')
+        if not scores:
+            raise RuntimeError(
+                f'No simulator endpoint is reachable among {self.endpoints}')
+        endpoint = min(scores, key=scores.get)
+        with self.lock:
+            self.nb_users[endpoint] += 1
+            self.dead_since.pop(endpoint, None)
+        return endpoint
+
+    def reacquire(self, endpoint: str) -> None:
+        """Use `endpoint` again without pinging it, e.g. a dead endpoint given another chance when no other one is available."""
+        with self.lock:
+            self.nb_users[endpoint] += 1
+            self.dead_since.pop(endpoint, None)  # in use again, the other simulations can acquire it too
+
+    def release(self, endpoint: str) -> None:
+        with self.lock:
+            self.nb_users[endpoint] = max(0, self.nb_users[endpoint] - 1)
+
+    def mark_dead(self, endpoint: str) -> None:
+        if is_debugging():
+            print(f'[EndpointScheduler] {endpoint} is not responding')
+        with self.lock:
+            self.dead_since[endpoint] = time.time()
+
+
+schedulers: Dict[tuple, EndpointScheduler] = {}
+schedulers_lock = threading.Lock()
+
+
+def get_scheduler(endpoints: List[str]) -> EndpointScheduler:
+    """Return the scheduler shared by all the simulations of the process using these endpoints."""
+    key = tuple(sorted(endpoints))
+    with schedulers_lock:
+        if key not in schedulers:
+            schedulers[key] = EndpointScheduler(list(key))
+        return schedulers[key]
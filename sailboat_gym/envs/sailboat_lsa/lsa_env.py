@@ -1,29 +1,62 @@
+import time
 import numpy as np
-from typing import Callable, Union
+from gymnasium import spaces
+from typing import Callable, List, Union
 
 from ...abstracts import AbcRender
-from ...types import Observation, Action
-from ...utils import is_debugging_all
+from ...types import Observation, Action, GymObservation
 from ..env import SailboatEnv
-from .lsa_sim import LSASim
+from .lsa_sim import LSASim, SimulatorUnavailableError
+from .lsa_backends import AbcSimBackend, DEFAULT_CONTAINER_TAG
+from .lsa_teardown import teardown_manager
+from .lsa_step_log import StepLog, get_step_log, EVENT_RESET, EVENT_RESET_DONE, EVENT_STEP
+
+
+def direction_generator(std=1., rng: Union[np.random.Generator, Callable[[], np.random.Generator], None] = None):
+    """Random constant direction, drawn on first use from `rng` (a generator, or a function returning the generator of the env) rather than the global numpy state."""
+    direction = None
+
+    def generate_direction(step_idx):
+        nonlocal direction
+        if direction is None:
+            generator = rng() if callable(rng) else rng
+            direction = (generator or np.random.default_rng()).normal(0, std, 2)
+        return direction
+    return generate_direction
 
 
 class SailboatLSAEnv(SailboatEnv):
     NB_STEPS_PER_SECONDS = 10  # Hz
 
-    def __init__(self, reward_fn: Callable[[Observation, Action, Observation], float] = lambda *_: 0, renderer: Union[AbcRender, None] = None, wind_generator_fn: Union[Callable[[int], np.ndarray], None] = None, water_generator_fn: Union[Callable[[int], np.ndarray], None] = None, video_speed: float = 1, keep_sim_alive: bool = False, name='default', map_scale=1, stop_condition_fn: Callable[[Observation, Action, Observation], bool] = lambda *_: False):
+    def __init__(self, reward_fn: Callable[[Observation, Action, Observation], float] = lambda *_: 0, renderer: Union[AbcRender, None] = None, wind_generator_fn: Union[Callable[[int], np.ndarray], None] = None, water_generator_fn: Union[Callable[[int], np.ndarray], None] = None, video_speed: float = 1, keep_sim_alive: bool = False, name='default', map_scale=1, stop_condition_fn: Callable[[Observation, Action, Observation], bool] = lambda *_: False, sim_endpoint: Union[str, List[str], None] = None, max_snapshots: int = 64, autoreset: bool = False, max_episode_steps: Union[int, None] = None, sim_timeout: Union[float, None] = 30., sim_retries: int = 1, sim_wire_format: str = 'msgpack', pixel_obs: Union[AbcRender, None] = None, sim_cpus: Union[int, None] = None, sim_mem_limit: Union[str, None] = None, sim_reserved_cpus: Union[str, List[int], None] = None, real_time_factor: Union[float, None] = None, sim_backend: Union[AbcSimBackend, None] = None, step_log: Union[StepLog, bool] = True, container_tag: str = DEFAULT_CONTAINER_TAG):
         """Sailboat LSA environment
 
         Args:
             reward_fn (Callable[[Observation, Action], float], optional): Use a custom reward function depending of your task. Defaults to lambda *_: 0.
             renderer (AbcRender, optional): Renderer instance to be used for rendering the environment, look at sailboat_gym/renderers folder for more information. Defaults to None.
-            wind_generator_fn (Callable[[int], np.ndarray], optional): Function that returns a 2D vector representing the global wind during the simulation. Defaults to None.
-            water_generator_fn (Callable[[int], np.ndarray], optional): Function that returns a 2D vector representing the global water current during the simulation. Defaults to None.
+            wind_generator_fn (Callable[[int], np.ndarray], optional): Function that returns a 2D vector representing the global wind during the simulation, called from the thread stepping the env. Defaults to a random constant wind drawn from `self.np_random` (seeded by the first `reset(seed)`).
+            water_generator_fn (Callable[[int], np.ndarray], optional): Function that returns a 2D vector representing the global water current during the simulation. Defaults to a random constant current drawn from `self.np_random`.
             video_speed (float, optional): Speed of the video recording. Defaults to 1.
             keep_sim_alive (bool, optional): Keep the simulation running even after the program exits. Defaults to False.
             name ([type], optional): Name of the simulation, required to run multiples environment on same machine.. Defaults to 'default'.
             map_scale (int, optional): Scale of the map, used to scale the map in the renderer. Defaults to 1.
+            sim_endpoint (Union[str, List[str]], optional): Address of an already running simulator (e.g. 'localhost:5555'), a list of addresses or the path of a registry file listing one address per line. The least loaded endpoint is used and another one is picked if it dies. No docker container is launched if provided. Defaults to None.
+            max_snapshots (int, optional): Maximum number of snapshots kept by `snapshot`, the least recently used ones are evicted first. Defaults to 64.
+            autoreset (bool, optional): Request the next episode as soon as the current one ends, the initial observation of the next episode is returned by the following call to `step` (or `reset`). Defaults to False.
+            max_episode_steps (int, optional): Truncate the episodes after this number of steps, unlike the TimeLimit wrapper it lets the autoreset start the next episode early. Defaults to None.
+            sim_timeout (float, optional): Maximum time (in seconds) to wait for the simulator, None to wait forever. When a step times out, the episode is truncated and `info['sim_failure']` is set. Defaults to 30.
+            sim_retries (int, optional): Number of times the connection is recreated after consecutive timeouts before the simulator is restarted. Defaults to 1.
+            sim_wire_format (str, optional): Encoding of the step messages exchanged with the simulator: 'msgpack', 'binary' (compact float32 structs, the step info is empty) or 'auto' (binary if the simulator supports it). Defaults to 'msgpack'.
+            pixel_obs (AbcRender, optional): Renderer of small images added to the observations under the 'pixels' key, e.g. RasterRenderer(64). Its `observation_space` describes the images. Defaults to None.
+            sim_cpus (int, optional): Number of cores the docker container of the simulator is pinned on, spread across cores and NUMA nodes with the other containers. Defaults to None (not pinned).
+            sim_mem_limit (str, optional): Memory limit of the docker container of the simulator (e.g. '2g'). Defaults to None (no limit).
+            sim_reserved_cpus (Union[str, List[int]], optional): Cores never assigned to the simulators, e.g. '0-3' to keep them for the trainer. Defaults to None.
+            real_time_factor (float, optional): Speed of the simulation relative to the wall clock, e.g. 1 to watch it in real time. The simulated time (clock of the simulator, counted from the steps with the binary wire format) and the elapsed time of the episode are reported in `info['sim_time']` and `info['wall_time']`. Defaults to None (as fast as possible).
+            sim_backend (AbcSimBackend, optional): Launches the simulator when no `sim_endpoint` is given, e.g. SubprocessBackend(command) to run it as a local process without docker. Defaults to None (DockerBackend).
+            step_log (Union[StepLog, bool], optional): Ring buffer recording the resets and steps (wind, water, action, observation, reward...), dumped on error. True for the log shared by all the environments, False to disable it. Defaults to True.
+            container_tag (str, optional): Physics step size and engine of the docker image of the simulator, e.g. 'mss4-ode' for a coarser and faster physics (see CONTAINER_TAGS and `python3 scripts/compare_container_tags.py`). Defaults to 'mss1-ode'.
         """
+        assert real_time_factor is None or real_time_factor > 0, 'real_time_factor must be positive'
         super().__init__()
 
         # IMPORTANT: The following variables are required by the gymnasium API
@@ -33,76 +66,154 @@ class SailboatLSAEnv(SailboatEnv):
             'render_fps': float(video_speed * self.NB_STEPS_PER_SECONDS),
         }
 
-        def direction_generator(std=1.):
-            direction = np.random.normal(0, std, 2)
-
-            def generate_direction(step_idx):
-                return direction
-            return generate_direction
-
         self.name = name
         self.reward_fn = reward_fn
         self.stop_condition_fn = stop_condition_fn
         self.renderer = renderer
         self.obs = None
+        # drawn from the generator of the env (seeded by the first `reset(seed)`), never from the global numpy state
         self.wind_generator_fn = wind_generator_fn if wind_generator_fn \
-            else direction_generator()
+            else direction_generator(rng=lambda: self.np_random)
         self.water_generator_fn = water_generator_fn if water_generator_fn \
-            else direction_generator(0.01)
+            else direction_generator(0.01, rng=lambda: self.np_random)
         self.map_scale = map_scale
+        self.pixel_obs = pixel_obs
+        if pixel_obs:
+            self.observation_space = spaces.Dict({**GymObservation.spaces,
+                                                  'pixels': pixel_obs.observation_space})
         self.keep_sim_alive = keep_sim_alive
+        self.autoreset = autoreset
+        self.max_episode_steps = max_episode_steps
+        self.real_time_factor = real_time_factor
         self.step_idx = 0
-        self.sim = LSASim(self.name)
+        self.episode_start_time = None
+        self.reset_wait_time = 0  # total time spent waiting for the simulator to reset
+        self.step_log = get_step_log(step_log)
+        self.log_id = self.step_log.register(name) if self.step_log else None
+        self.sim = LSASim(self.name,
+                          endpoint=sim_endpoint,
+                          max_snapshots=max_snapshots,
+                          timeout=sim_timeout,
+                          retries=sim_retries,
+                          wire_format=sim_wire_format,
+                          cpus=sim_cpus,
+                          mem_limit=sim_mem_limit,
+                          reserved_cpus=sim_reserved_cpus,
+                          backend=sim_backend,
+                          container_tag=container_tag)
+        if keep_sim_alive:
+            teardown_manager.unregister(self.sim)
 
     def reset(self, seed=None, **kwargs):
-        super().reset(seed=seed, **kwargs)
-        if seed is not None:
-            np.random.seed(seed)
-        self.step_idx = 0
+        super().reset(seed=seed, **kwargs)  # seeds self.np_random, the global numpy state is left untouched
+
+        if self.sim.pending_reset:
+            # the next episode has already been requested by the autoreset
+            if seed is None:
+                return self.__finish_reset()
+            self.sim.reset_wait()  # wind/water must be drawn with the new seed
+
+        self.__start_reset()
+        return self.__finish_reset()
 
+    def __start_reset(self):
+        self.step_idx = 0
         wind = self.wind_generator_fn(self.step_idx)
         water = self.water_generator_fn(self.step_idx)
-
-        self.obs, info = self.sim.reset(wind, water, self.NB_STEPS_PER_SECONDS)
+        self.sim.reset_async(wind, water, self.NB_STEPS_PER_SECONDS,
+                             real_time_factor=self.real_time_factor)
+        if self.step_log:
+            self.step_log.record(self.log_id, EVENT_RESET, self.step_idx, wind, water)
+
+    def __finish_reset(self):
+        t0 = time.time()
+        self.obs, info = self.sim.reset_wait()
+        wait_time = time.time() - t0
+        self.reset_wait_time += wait_time
+        self.episode_start_time = t0 + wait_time
+        info['reset_wait_time'] = wait_time
 
         # setup the renderer, its needed to know the min/max position of the boat
         if self.renderer:
             self.renderer.setup(info['map_bounds'] * self.map_scale)
+        if self.pixel_obs:
+            self.pixel_obs.setup(info['map_bounds'] * self.map_scale)
 
-        if is_debugging_all():
-            print('\nResetting environment:')
-            print(f'  -> Wind: {wind}')
-            print(f'  -> Water: {water}')
-            print(f'  -> frequency: {self.NB_STEPS_PER_SECONDS} Hz')
-            print(f'  <- Obs: {self.obs}')
-            print(f'  <- Info: {info}')
+        if self.step_log:
+            self.step_log.record(self.log_id, EVENT_RESET_DONE, self.step_idx,
+                                 obs=self.obs, duration=wait_time)
 
-        return self.obs, info
+        return self.__get_obs(), info
+
+    def __get_obs(self):
+        if not self.pixel_obs:
+            return self.obs
+        return {**self.obs, 'pixels': self.pixel_obs.render(self.obs)}
 
     def step(self, action: Action):
         assert self.obs is not None, 'Please call reset before step'
 
+        if self.sim.pending_reset:
+            # the previous step ended the episode, the action is ignored
+            obs, info = self.__finish_reset()
+            return obs, 0, False, False, info
+
         self.step_idx += 1
 
         wind = self.wind_generator_fn(self.step_idx)
         water = self.water_generator_fn(self.step_idx)
 
-        next_obs, terminated, info = self.sim.step(wind, water, action)
+        t0 = time.time()
+        try:
+            next_obs, terminated, info = self.sim.step(wind, water, action)
+        except SimulatorUnavailableError:
+            # the state of the simulation is lost, the episode is truncated
+            info = {'sim_failure': True,
+                    'nb_timeouts': self.sim.nb_timeouts,
+                    'nb_restarts': self.sim.nb_restarts}
+            if self.step_log:
+                self.step_log.record(self.log_id, EVENT_STEP, self.step_idx, wind, water, action,
+                                     truncated=True, sim_failure=True, duration=time.time() - t0)
+                self.step_log.dump_on_error(f'Simulator of {self.name} failed')
+            if self.autoreset:
+                self.__start_reset()
+            return self.__get_obs(), 0, False, True, info
+        # clock of the simulator if its reply carries it (not with the binary wire format), counted from the steps otherwise
+        info.setdefault('sim_time', self.step_idx / self.NB_STEPS_PER_SECONDS)
+        now = time.time()
+        info['wall_time'] = now - self.episode_start_time
         reward = self.reward_fn(self.obs, action, next_obs)
-        truncated = self.stop_condition_fn(self.obs, action, next_obs)
+        truncated = self.stop_condition_fn(self.obs, action, next_obs) \
+            or (self.max_episode_steps is not None
+                and self.step_idx >= self.max_episode_steps)
         self.obs = next_obs
+        if self.step_log:
+            self.step_log.record(self.log_id, EVENT_STEP, self.step_idx, wind, water, action,
+                                 self.obs, reward, terminated, truncated, duration=now - t0)
 
-        if is_debugging_all():
-            print('\nStepping environment:')
-            print(f'  -> Wind: {wind}')
-            print(f'  -> Water: {water}')
-            print(f'  -> Action: {action}')
-            print(f'  <- Obs: {self.obs}')
-            print(f'  <- Reward: {reward}')
-            print(f'  <- Terminated: {terminated}')
-            print(f'  <- Info: {info}')
+        if self.autoreset and (terminated or truncated):
+            # the simulator reloads while the agent processes the transition
+            self.__start_reset()
 
-        return self.obs, reward, terminated, truncated, info
+        return self.__get_obs(), reward, terminated, truncated, info
+
+    def snapshot(self) -> int:
+        """Save the current state of the episode, returns a handle to be used with `restore`."""
+        assert self.obs is not None, 'Please call reset before snapshot'
+        if self.sim.pending_reset:
+            self.__finish_reset()
+        return self.sim.snapshot(meta={'step_idx': self.step_idx})
+
+    def restore(self, handle: int) -> Observation:
+        """Restore the state of the episode saved with `snapshot`, returns the observation at that time.
+
+        Restoring the same handle multiple times allows to branch several continuations from the same state.
+        """
+        if self.sim.pending_reset:
+            self.sim.reset_wait()
+        self.obs, meta = self.sim.restore(handle)
+        self.step_idx = meta['step_idx']
+        return self.__get_obs()
 
     def render(self):
         assert self.renderer, 'No renderer'
@@ -110,9 +221,11 @@ class SailboatLSAEnv(SailboatEnv):
         return self.renderer.render(self.obs)
 
     def close(self):
+        if self.sim.pending_reset:
+            self.sim.reset_wait()
         self.sim.close()
         self.obs = None
 
     def __del__(self):
-        if not self.keep_sim_alive:
-            self.sim.stop()
+        if hasattr(self, 'sim') and not self.keep_sim_alive and self.sim.state != 'stopped':
+            teardown_manager.stop_async(self.sim)
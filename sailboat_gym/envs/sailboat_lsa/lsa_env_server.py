@@ -0,0 +1,317 @@
+"""Server hosting a pool of environments for remote learners.
+
+The learners (e.g. on GPU machines) step environments hosted next to the
+simulators (e.g. on CPU machines) through `RemoteVectorEnv`, a drop-in
+`VectorEnv`. The reward, the stop condition and the wind/water generation
+run on the server, only the actions and the stacked observations, rewards
+and end of episode flags are sent over the network.
+
+Each client opens a session owning `num_envs` environments of the pool. The
+requests received while a batch is running make up the next batch: the
+resets/steps of all their environments run concurrently on a thread pool,
+so that the simulators of all the clients are stepped together. Like the
+gymnasium vector envs, an environment is reset as soon as its episode ends.
+
+Protocol (msgpack over a ZMQ ROUTER socket, numpy arrays are encoded by
+`pack_msg`), errors are replied as {'error': message}:
+
+- {'open': {'num_envs': n, 'name': name}} -> {'session': id}
+- {'reset': {'session': id, 'seed': seed}} -> {'obs', 'infos'}
+- {'step': {'session': id, 'actions': actions}} -> {'obs', 'rewards', 'terminated', 'truncated', 'infos'}
+- {'close': {'session': id}} -> {'closed': True}
+- {'stats': True} -> see `EnvServer.get_stats`
+
+Usage:
+    sailboat_gym serve --num-envs=16 --bind=tcp://*:5600 [--sim-endpoint=...] [--task=my_module:make_env_kwargs]
+"""
+import threading
+import time
+import msgpack
+import numpy as np
+import zmq
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Union
+
+DEFAULT_PORT = 5600
+
+
+def encode_value(value):
+    if isinstance(value, np.ndarray):
+        return {'__ndarray__': [value.dtype.str, list(value.shape), value.tobytes()]}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f'Can not encode an object of type {type(value).__name__}')
+
+
+def decode_value(value):
+    if '__ndarray__' in value:
+        dtype, shape, data = value['__ndarray__']
+        return np.frombuffer(data, dtype).reshape(shape).copy()
+    return value
+
+
+def pack_msg(msg) -> bytes:
+    return msgpack.packb(msg, default=encode_value, use_bin_type=True)
+
+
+def check_infos(infos: List[dict], prefix: str = '') -> None:
+    """Raise a TypeError naming the first info key whose value can not be encoded (e.g. an object added by a wrapper)."""
+    for info in infos:
+        for key, value in info.items():
+            if isinstance(value, dict):
+                check_infos([value], prefix=f'{prefix}{key}.')
+                continue
+            try:
+                pack_msg(value)
+            except TypeError as e:
+                raise TypeError(f'The info {prefix}{key!r} can not be sent to the learner: {e}') from e
+
+
+def unpack_msg(payload: bytes):
+    return msgpack.unpackb(payload, raw=False, object_hook=decode_value)
+
+
+def stack(observations):
+    return {key: np.stack([obs[key] for obs in observations])
+            for key in observations[0]}
+
+
+def reset_env(env, seed):
+    return env.reset(seed=seed)
+
+
+def step_env(env, action):
+    """Step the environment, and reset it if the episode ended (the last observation and info are stored in the info)."""
+    obs, reward, terminated, truncated, info = env.step(action)
+    if terminated or truncated:
+        final_obs, final_info = obs, info
+        obs, info = env.reset()
+        info = {**info, 'final_observation': final_obs, 'final_info': final_info}
+    return obs, reward, terminated, truncated, info
+
+
+class Session:
+    def __init__(self, session_id: int, name: str, envs: List[int]) -> None:
+        self.id = session_id
+        self.name = name
+        self.envs = envs  # indices in the pool
+        self.opened_at = time.time()
+        self.last_seen = self.opened_at
+        self.nb_requests = 0
+        self.nb_env_steps = 0
+        self.busy_time = 0  # time spent running the requests of the session
+
+
+class EnvServer:
+    """Serve a pool of `num_envs` environments created by `make_env(index)` to `RemoteVectorEnv` clients."""
+
+    def __init__(self, make_env: Callable[[int], object], num_envs: int, bind: str = f'tcp://*:{DEFAULT_PORT}', session_timeout: Union[float, None] = 300.) -> None:
+        """
+        Args:
+            make_env (Callable[[int], gym.Env]): Create the environment of the given index of the pool, e.g. with the reward and wind of the task.
+            num_envs (int): Number of environments of the pool, shared by the clients.
+            bind (str, optional): ZMQ address of the server, a random port is picked for 'tcp://<host>:0'. Defaults to 'tcp://*:5600'.
+            session_timeout (float, optional): Sessions without requests for this time (in seconds) are closed, their environments are given back to the pool. Defaults to 300.
+        """
+        self.envs = [make_env(i) for i in range(num_envs)]
+        self.free_envs = list(range(num_envs))
+        self.sessions = {}  # session id -> Session
+        self.next_session_id = 0
+        self.session_timeout = session_timeout
+        self.executor = ThreadPoolExecutor(max_workers=num_envs,
+                                           thread_name_prefix='env-server')
+
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        if bind.endswith(':0'):
+            self.socket.bind_to_random_port(bind[:-2])
+        else:
+            self.socket.bind(bind)
+        self.endpoint = self.socket.getsockopt(zmq.LAST_ENDPOINT).decode()
+
+        self.queue_depth = 0  # number of requests of the last batch
+        self.max_queue_depth = 0
+        self.nb_batches = 0
+        self.nb_requests = 0
+        self.lock = threading.Lock()  # protects the statistics read by get_stats
+        self.thread = None
+        self.running = False
+
+    def serve_forever(self, report_interval: Union[float, None] = None) -> None:
+        """Serve until `stop` is called, the statistics are printed every `report_interval` seconds if given."""
+        self.running = True
+        last_report = time.time()
+        while self.running:
+            if report_interval and time.time() - last_report >= report_interval:
+                print(format_stats(self.get_stats()), flush=True)
+                last_report = time.time()
+            self.__close_expired_sessions()
+            if not self.socket.poll(100):
+                continue
+            # the requests received while the previous batch was running
+            requests = []
+            while True:
+                try:
+                    requests.append(self.socket.recv_multipart(zmq.NOBLOCK))
+                except zmq.Again:
+                    break
+            with self.lock:
+                self.queue_depth = len(requests)
+                self.max_queue_depth = max(self.max_queue_depth, len(requests))
+                self.nb_batches += 1
+                self.nb_requests += len(requests)
+            replies = self.handle_batch([payload for *_, payload in requests])
+            for (identity, empty, _), reply in zip(requests, replies):
+                try:
+                    payload = pack_msg(reply)
+                except TypeError as e:
+                    try:
+                        check_infos(reply.get('infos', []))
+                    except TypeError as info_error:
+                        e = info_error
+                    payload = pack_msg({'error': repr(e)})
+                self.socket.send_multipart([identity, empty, payload])
+
+    def handle_batch(self, payloads: List[bytes]) -> List[dict]:
+        """Run the requests of a batch, the resets/steps of all the sessions concurrently."""
+        replies = [None] * len(payloads)
+        jobs = []  # (request index, session, kind, futures, start time)
+        for idx, payload in enumerate(payloads):
+            try:
+                msg = unpack_msg(payload)
+                if 'reset' in msg or 'step' in msg:
+                    kind = 'reset' if 'reset' in msg else 'step'
+                    session = self.__get_session(msg[kind]['session'])
+                    futures = self.__submit(kind, session, msg[kind])
+                    jobs.append((idx, session, kind, futures, time.time()))
+                else:
+                    replies[idx] = self.handle(msg)
+            except Exception as e:
+                replies[idx] = {'error': repr(e)}
+        for idx, session, kind, futures, t0 in jobs:
+            try:
+                results = [future.result() for future in futures]
+                if kind == 'reset':
+                    observations, infos = zip(*results)
+                    replies[idx] = {'obs': stack(observations), 'infos': list(infos)}
+                else:
+                    observations, rewards, terminated, truncated, infos = zip(*results)
+                    replies[idx] = {
+                        'obs': stack(observations),
+                        'rewards': np.array(rewards, dtype=np.float64),
+                        'terminated': np.array(terminated, dtype=np.bool_),
+                        'truncated': np.array(truncated, dtype=np.bool_),
+                        'infos': list(infos),
+                    }
+            except Exception as e:
+                replies[idx] = {'error': repr(e)}
+            with self.lock:
+                session.nb_requests += 1
+                session.busy_time += time.time() - t0
+                if kind == 'step':
+                    session.nb_env_steps += len(futures)
+        return replies
+
+    def handle(self, msg: dict) -> dict:
+        if 'open' in msg:
+            return {'session': self.open_session(msg['open']['num_envs'],
+                                                 msg['open'].get('name', 'default'))}
+        if 'close' in msg:
+            self.close_session(msg['close']['session'])
+            return {'closed': True}
+        if 'stats' in msg:
+            return self.get_stats()
+        raise ValueError(f'Unknown request: {list(msg)}')
+
+    def open_session(self, num_envs: int, name: str = 'default') -> int:
+        with self.lock:
+            if num_envs > len(self.free_envs):
+                raise RuntimeError(
+                    f'Not enough free environments: {num_envs} requested, {len(self.free_envs)}/{len(self.envs)} available')
+            envs, self.free_envs = self.free_envs[:num_envs], self.free_envs[num_envs:]
+            session = Session(self.next_session_id, name, envs)
+            self.next_session_id += 1
+            self.sessions[session.id] = session
+        return session.id
+
+    def close_session(self, session_id: int) -> None:
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.free_envs.extend(session.envs)
+
+    def get_stats(self) -> dict:
+        """Queue depth (number of requests per batch), free environments and throughput (environment steps/s) of each client."""
+        now = time.time()
+        with self.lock:
+            return {
+                'nb_envs': len(self.envs),
+                'nb_free_envs': len(self.free_envs),
+                'queue_depth': self.queue_depth,
+                'max_queue_depth': self.max_queue_depth,
+                'mean_queue_depth': self.nb_requests / self.nb_batches if self.nb_batches else 0.,
+                'clients': [{
+                    'session': session.id,
+                    'name': session.name,
+                    'num_envs': len(session.envs),
+                    'nb_env_steps': session.nb_env_steps,
+                    'steps_per_s': session.nb_env_steps / max(now - session.opened_at, 1e-9),
+                    'mean_request_ms': session.busy_time / session.nb_requests * 1e3 if session.nb_requests else 0.,
+                } for session in self.sessions.values()],
+            }
+
+    def start(self) -> str:
+        """Serve in a background thread, returns the endpoint to connect to."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.endpoint
+
+    def stop(self) -> None:
+        """Stop serving and close the environments."""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.socket.close()
+        self.executor.shutdown()
+        for env in self.envs:
+            env.close()
+
+    def __get_session(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                raise KeyError(f'Session {session_id} does not exist or has expired')
+            session = self.sessions[session_id]
+            session.last_seen = time.time()
+            return session
+
+    def __submit(self, kind, session, msg):
+        if kind == 'reset':
+            seed = msg.get('seed')
+            seeds = seed if isinstance(seed, list) else \
+                [None if seed is None else seed + i for i in range(len(session.envs))]
+            return [self.executor.submit(reset_env, self.envs[env_idx], seed)
+                    for env_idx, seed in zip(session.envs, seeds)]
+        actions = msg['actions']
+        return [self.executor.submit(step_env, self.envs[env_idx],
+                                     {key: value[i] for key, value in actions.items()})
+                for i, env_idx in enumerate(session.envs)]
+
+    def __close_expired_sessions(self):
+        if self.session_timeout is None:
+            return
+        now = time.time()
+        with self.lock:
+            expired = [session.id for session in self.sessions.values()
+                       if now - session.last_seen > self.session_timeout]
+        for session_id in expired:
+            self.close_session(session_id)
+
+
+def format_stats(stats: dict) -> str:
+    lines = [f'[EnvServer] {stats["nb_envs"] - stats["nb_free_envs"]}/{stats["nb_envs"]} envs used, '
+             f'queue depth: {stats["queue_depth"]} (mean {stats["mean_queue_depth"]:.1f}, max {stats["max_queue_depth"]})']
+    for client in stats['clients']:
+        lines.append(f'  {client["name"]} (session {client["session"]}, {client["num_envs"]} envs): '
+                     f'{client["steps_per_s"]:.1f} steps/s, {client["mean_request_ms"]:.2f} ms/request')
+    return '\n'.join(lines)
@@ -0,0 +1,243 @@
+"""Live counters of the simulators of the running processes, displayed by `sailboat_gym top`.
+
+The step path of `LSASim` only updates a few attributes (number of steps,
+latency and time of the last step). A background thread of each process
+publishes them every second, with the rates, the pause state and the CPU and
+memory usage of the simulators (see `AbcSimBackend.resource_stats`), into a
+memory-mapped file of fixed-size records (one file per process, in
+/dev/shm when available), which `sailboat_gym top` reads:
+
+    sailboat_gym top [--interval 1] [--once]
+
+Set SAILBOAT_MONITOR=0 to disable the publication.
+"""
+import atexit
+import os
+import tempfile
+import threading
+import time
+import weakref
+import numpy as np
+from typing import List, Union
+
+STATES = ['starting', 'running', 'restarting', 'stopped']
+
+RECORD_DTYPE = np.dtype([
+    ('active', '?'),
+    ('paused', '?'),
+    ('state', 'u1'),  # index in STATES
+    ('name', 'S64'),
+    ('endpoint', 'S96'),
+    ('nb_steps', 'i8'),
+    ('nb_resets', 'i8'),
+    ('steps_per_s', 'f4'),  # since the previous publication
+    ('last_step_latency', 'f4'),  # seconds
+    ('last_step_time', 'f8'),  # wall clock, 0 before the first step
+    ('nb_timeouts', 'i4'),
+    ('nb_restarts', 'i4'),
+    ('nb_errors', 'i4'),
+    ('cpu_percent', 'f4'),  # NaN if unknown
+    ('memory_mb', 'f4'),
+    ('memory_limit_mb', 'f4'),
+    ('updated', 'f8'),  # wall clock of the publication
+])
+
+DEFAULT_DIR = os.getenv('SAILBOAT_MONITOR_DIR') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'sailboat_gym_monitor')
+DEFAULT_SLOTS = int(os.getenv('SAILBOAT_MONITOR_SLOTS', 1024))
+IDLE_AFTER = 10  # seconds without step before a running simulator is displayed as idle
+
+
+def is_monitoring():
+    return os.getenv('SAILBOAT_MONITOR', '1') != '0'
+
+
+class SimMonitor:
+    """Publish the counters of the registered simulators of this process every `interval` seconds."""
+
+    def __init__(self, monitor_dir: str = DEFAULT_DIR, nb_slots: int = DEFAULT_SLOTS, interval: float = 1., resource_interval: float = 5.) -> None:
+        """
+        Args:
+            monitor_dir (str, optional): Directory of the files read by `sailboat_gym top`. Defaults to $SAILBOAT_MONITOR_DIR or /dev/shm/sailboat_gym_monitor.
+            nb_slots (int, optional): Maximum number of simulators published, ~300 bytes each. Defaults to $SAILBOAT_MONITOR_SLOTS or 1024.
+            interval (float, optional): Time (in seconds) between two publications. Defaults to 1.
+            resource_interval (float, optional): Time (in seconds) between two queries of the CPU and memory usage of a simulator, which can take a while (e.g. docker stats). Defaults to 5.
+        """
+        self.monitor_dir = monitor_dir
+        self.path = os.path.join(monitor_dir, f'sims-{os.getpid()}.npy')
+        self.nb_slots = nb_slots
+        self.interval = interval
+        self.resource_interval = resource_interval
+        self.lock = threading.Lock()
+        self.sims = {}  # slot -> weak reference to the LSASim
+        self.last_counts = {}  # slot -> (time, nb_steps)
+        self.last_resources = {}  # slot -> (time, stats)
+        self.records = None  # allocated on first use
+        self.thread = None
+
+    def register(self, sim) -> Union[int, None]:
+        """Publish the counters of `sim` until it is garbage collected, returns its slot (None if all the slots are used)."""
+        with self.lock:
+            if self.records is None:
+                os.makedirs(self.monitor_dir, exist_ok=True)
+                self.records = np.lib.format.open_memmap(
+                    self.path, mode='w+', dtype=RECORD_DTYPE, shape=(self.nb_slots,))
+                atexit.register(self.close)
+            free = [slot for slot in range(self.nb_slots)
+                    if slot not in self.sims or self.sims[slot]() is None]
+            if not free:
+                return None
+            slot = free[0]
+            self.sims[slot] = weakref.ref(sim)
+            self.last_counts.pop(slot, None)
+            self.last_resources.pop(slot, None)
+            if self.thread is None and self.interval:
+                self.thread = threading.Thread(target=self.__run, name='sim-monitor', daemon=True)
+                self.thread.start()
+        return slot
+
+    def publish(self) -> None:
+        """Write the counters of the registered simulators."""
+        with self.lock:
+            if self.records is None:
+                return
+            sims = list(self.sims.items())
+        now = time.time()
+        for slot, ref in sims:
+            sim = ref()
+            rec = self.records[slot]
+            if sim is None:
+                rec['active'] = False
+                with self.lock:
+                    if self.sims.get(slot) is ref:
+                        del self.sims[slot]
+                continue
+            last_time, last_steps = self.last_counts.get(slot, (now, sim.nb_steps))
+            self.last_counts[slot] = (now, sim.nb_steps)
+            rec['name'] = sim.name.encode()[:64]
+            rec['endpoint'] = (sim.endpoint or '').encode()[:96]
+            rec['state'] = STATES.index(sim.state)
+            rec['paused'] = sim.paused
+            rec['nb_steps'] = sim.nb_steps
+            rec['nb_resets'] = sim.nb_resets
+            rec['steps_per_s'] = (sim.nb_steps - last_steps) / (now - last_time) if now > last_time else 0.
+            rec['last_step_latency'] = sim.last_step_latency
+            rec['last_step_time'] = sim.last_step_time
+            rec['nb_timeouts'] = sim.nb_timeouts
+            rec['nb_restarts'] = sim.nb_restarts
+            rec['nb_errors'] = sim.nb_errors
+            stats = self.__get_resource_stats(slot, sim, now)
+            rec['cpu_percent'] = stats['cpu_percent'] if stats else np.nan
+            rec['memory_mb'] = stats['memory_mb'] if stats else np.nan
+            rec['memory_limit_mb'] = stats.get('memory_limit_mb', 0) if stats else 0
+            rec['updated'] = now
+            rec['active'] = True
+
+    def close(self) -> None:
+        """Remove the file of this process."""
+        with self.lock:
+            self.records = None
+            self.sims.clear()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __get_resource_stats(self, slot, sim, now):
+        last_time, stats = self.last_resources.get(slot, (-np.inf, None))
+        if now - last_time >= self.resource_interval:
+            try:
+                stats = sim.resource_stats()
+            except Exception:
+                stats = None  # e.g. the container is restarting
+            self.last_resources[slot] = (now, stats)
+        return stats
+
+    def __run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.publish()
+            except Exception:
+                pass  # the monitor must never break the environments
+
+
+sim_monitor = SimMonitor()
+
+
+def get_sim_monitor() -> Union[SimMonitor, None]:
+    return sim_monitor if is_monitoring() else None
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # process of another user
+    return True
+
+
+def read_monitors(monitor_dir: str = DEFAULT_DIR) -> List[tuple]:
+    """Return the (pid, record) of the active simulators of the running processes, the files of the dead processes are removed."""
+    rows = []
+    if not os.path.isdir(monitor_dir):
+        return rows
+    for filename in sorted(os.listdir(monitor_dir)):
+        if not (filename.startswith('sims-') and filename.endswith('.npy')):
+            continue
+        path = os.path.join(monitor_dir, filename)
+        pid = int(filename[len('sims-'):-len('.npy')])
+        if not is_process_alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            records = np.load(path, mmap_mode='r')
+        except (OSError, ValueError):
+            continue  # being created
+        rows.extend((pid, rec.copy()) for rec in records[records['active']])
+    return rows
+
+
+def get_status(rec, now: float) -> str:
+    state = STATES[rec['state']]
+    if state != 'running':
+        return state
+    if rec['paused']:
+        return 'paused'
+    if now - max(rec['last_step_time'], 0) > IDLE_AFTER:
+        return 'idle'
+    return 'running'
+
+
+def format_top(rows: List[tuple], now: Union[float, None] = None) -> str:
+    """Table of the simulators, the slowest running ones first."""
+    now = time.time() if now is None else now
+    lines = [f'{len(rows)} simulators, {sum(rec["steps_per_s"] for _, rec in rows):.0f} steps/s',
+             f'{"pid":>7} {"name":<24}{"status":<11}{"steps/s":>9}{"latency":>10}{"steps":>10}'
+             f'{"timeouts":>9}{"restarts":>9}{"errors":>7}{"cpu %":>7}{"mem (MB)":>10}  endpoint']
+    rows = sorted(rows, key=lambda row: (get_status(row[1], now) != 'running', row[1]['steps_per_s']))
+    for pid, rec in rows:
+        latency = f'{rec["last_step_latency"] * 1e3:.2f}ms' if rec['last_step_time'] else '-'
+        cpu = f'{rec["cpu_percent"]:.0f}' if not np.isnan(rec['cpu_percent']) else '-'
+        memory = f'{rec["memory_mb"]:.0f}' if not np.isnan(rec['memory_mb']) else '-'
+        lines.append(f'{pid:>7} {rec["name"].decode()[:23]:<24}{get_status(rec, now):<11}'
+                     f'{rec["steps_per_s"]:>9.1f}{latency:>10}{rec["nb_steps"]:>10}'
+                     f'{rec["nb_timeouts"]:>9}{rec["nb_restarts"]:>9}{rec["nb_errors"]:>7}'
+                     f'{cpu:>7}{memory:>10}  {rec["endpoint"].decode()}')
+    return '\n'.join(lines)
+
+
+def top(monitor_dir: str = DEFAULT_DIR, interval: float = 1., once: bool = False) -> None:
+    """Print the table of the simulators every `interval` seconds (only once with `once`)."""
+    while True:
+        table = format_top(read_monitors(monitor_dir))
+        if once:
+            print(table, flush=True)
+            return
+        print('\033[H\033[J' + table, flush=True)  # clear the terminal
+        time.sleep(interval)
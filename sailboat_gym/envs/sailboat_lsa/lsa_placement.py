@@ -0,0 +1,122 @@
+"""CPU and memory placement of the simulator containers.
+
+Every container gets its own `cpuset` (and the memory of its NUMA node), the
+least used cores of the least used node are picked first so that the
+containers are spread across the nodes, and cores can be reserved for the
+trainer. The usage of the cores is computed from the running containers, so
+that containers launched by other processes are taken into account.
+"""
+import glob
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple, Union
+
+CONTAINER_PREFIX = 'sailboat-sim-lsa-gym-'
+
+# held while the running containers are listed and the new one is launched
+placement_lock = threading.Lock()
+
+
+def parse_cpulist(cpulist: Union[str, Iterable[int], None]) -> List[int]:
+    """Parse a cpu list in the format of cpuset/sysfs (e.g. '0-3,8'), or return the given cpus."""
+    if cpulist is None:
+        return []
+    if not isinstance(cpulist, str):
+        return sorted(set(int(cpu) for cpu in cpulist))
+    cpus = set()
+    for part in cpulist.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.update(range(int(start), int(end) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpulist(cpus: Iterable[int]) -> str:
+    return ','.join(str(cpu) for cpu in sorted(cpus))
+
+
+def get_available_cpus() -> List[int]:
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_numa_nodes() -> Dict[int, List[int]]:
+    """Return the available cpus of each NUMA node, a single node is assumed if the topology is unknown (e.g. not on Linux)."""
+    available = set(get_available_cpus())
+    nodes = {}
+    for path in glob.glob('/sys/devices/system/node/node*/cpulist'):
+        node = int(re.search(r'node(\d+)', path).group(1))
+        with open(path) as f:
+            cpus = [cpu for cpu in parse_cpulist(f.read()) if cpu in available]
+        if cpus:
+            nodes[node] = cpus
+    return nodes or {0: sorted(available)}
+
+
+def allocate_cpus(nb_cpus: int, used: Counter, reserved: Iterable[int] = (), nodes: Union[Dict[int, List[int]], None] = None) -> Tuple[List[int], List[int]]:
+    """Pick `nb_cpus` cores for a new container, returns the cores and their NUMA nodes.
+
+    The container is placed on the node whose cores are the least used (by the
+    containers counted in `used`), on its least used cores. If no node has
+    enough cores, the least used cores of all the nodes are picked.
+    """
+    nodes = nodes if nodes is not None else get_numa_nodes()
+    reserved = set(reserved)
+    candidates = {node: [cpu for cpu in cpus if cpu not in reserved]
+                  for node, cpus in nodes.items()}
+    if sum(len(cpus) for cpus in candidates.values()) < nb_cpus:
+        raise ValueError(
+            f'Can not allocate {nb_cpus} cpus, only {sum(len(cpus) for cpus in candidates.values())} cpus are not reserved')
+
+    def least_used(cpus):
+        return sorted(cpus, key=lambda cpu: (used[cpu], cpu))[:nb_cpus]
+
+    def node_load(node):
+        return sum(used[cpu] for cpu in candidates[node]) / len(candidates[node])
+
+    fitting = [node for node, cpus in candidates.items() if len(cpus) >= nb_cpus]
+    if fitting:
+        node = min(fitting, key=lambda node: (node_load(node), node))
+        return least_used(candidates[node]), [node]
+    cpus = least_used([cpu for cpus in candidates.values() for cpu in cpus])
+    return cpus, sorted(node for node, node_cpus in candidates.items()
+                        if set(node_cpus) & set(cpus))
+
+
+def get_used_cpus(client) -> Counter:
+    """Count the number of simulator containers pinned on each core."""
+    used = Counter()
+    for container in client.containers.list(filters={'name': CONTAINER_PREFIX}):
+        used.update(parse_cpulist(container.attrs['HostConfig'].get('CpusetCpus') or ''))
+    return used
+
+
+def get_container_stats(container) -> dict:
+    """CPU usage (in % of one core), CFS throttling and memory usage of a container."""
+    stats = container.stats(stream=False)
+    cpu, precpu = stats['cpu_stats'], stats.get('precpu_stats', {})
+    cpu_delta = cpu['cpu_usage']['total_usage'] \
+        - precpu.get('cpu_usage', {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) \
+        - precpu.get('system_cpu_usage', 0)
+    online_cpus = cpu.get('online_cpus') \
+        or len(cpu['cpu_usage'].get('percpu_usage') or []) or 1
+    throttling = cpu.get('throttling_data', {})
+    memory = stats.get('memory_stats', {})
+    return {
+        'cpu_percent': 100. * online_cpus * cpu_delta / system_delta if system_delta > 0 else 0.,
+        'cpuset': container.attrs['HostConfig'].get('CpusetCpus') or None,
+        'nb_periods': throttling.get('periods', 0),
+        'nb_throttled_periods': throttling.get('throttled_periods', 0),
+        'throttled_time': throttling.get('throttled_time', 0) / 1e9,  # seconds
+        'memory_mb': memory.get('usage', 0) / 2**20,
+        'memory_limit_mb': memory.get('limit', 0) / 2**20,
+    }
@@ -0,0 +1,115 @@
+import numpy as np
+import zmq
+from gymnasium.vector import VectorEnv
+from typing import Union
+
+from ...types import GymObservation, GymAction
+from ...utils import ProfilingMeta
+from .lsa_env_server import pack_msg, unpack_msg
+
+
+class RemoteVectorEnv(VectorEnv, metaclass=ProfilingMeta):
+    """Vector of environments hosted by an `EnvServer` (see `sailboat_gym serve`), e.g. on the machines running the simulators.
+
+    The reward, the stop condition and the wind/water generation are the ones
+    of the server. Like the gymnasium vector envs, an environment is reset as
+    soon as its episode ends, its last observation and info are stored in
+    `info['final_observation']` and `info['final_info']`.
+    """
+
+    def __init__(self, endpoint: str, num_envs: int, name: str = 'default', timeout: Union[float, None] = 60.):
+        """
+        Args:
+            endpoint (str): Address of the server (e.g. 'tcp://cpu-box:5600').
+            num_envs (int): Number of environments taken from the pool of the server.
+            name (str, optional): Name of the client in the statistics of the server. Defaults to 'default'.
+            timeout (float, optional): Maximum time (in seconds) to wait for a reply, None to wait forever. On timeout, TimeoutError is raised and the connection is recreated, so that the env can be reset. Defaults to 60.
+        """
+        super().__init__(num_envs, GymObservation, GymAction)
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self.context = zmq.Context.instance()
+        self.socket = self.__create_socket()
+        self.pending = False
+        self.session = None  # nothing to close if the server refuses the session
+        self.session = self.__request({'open': {'num_envs': num_envs, 'name': name}})['session']
+
+    def reset_async(self, seed=None, options=None):
+        self.__send({'reset': {'session': self.session, 'seed': seed}})
+
+    def reset_wait(self, seed=None, options=None):
+        reply = self.__recv()
+        return reply['obs'], self.__get_infos(reply['infos'])
+
+    def step_async(self, actions):
+        self.__send({'step': {'session': self.session,
+                              'actions': {key: np.asarray(value) for key, value in actions.items()}}})
+
+    def step_wait(self):
+        reply = self.__recv()
+        return (reply['obs'], reply['rewards'], reply['terminated'],
+                reply['truncated'], self.__get_infos(reply['infos']))
+
+    def get_server_stats(self) -> dict:
+        """Statistics of the server, see `EnvServer.get_stats`."""
+        return self.__request({'stats': True})
+
+    def close_extras(self, **kwargs):
+        try:
+            if self.pending:
+                self.__recv()
+            if self.session is not None:
+                self.__request({'close': {'session': self.session}})
+        except (TimeoutError, RuntimeError):
+            pass  # the session expires on the server
+        self.socket.close()
+
+    def __get_infos(self, env_infos):
+        infos = {}
+        dones = np.array(['final_observation' in info for info in env_infos])
+        if dones.any():
+            final_obs = np.full(self.num_envs, None, dtype=object)
+            final_infos = np.full(self.num_envs, None, dtype=object)
+        for i, info in enumerate(env_infos):
+            if 'final_observation' in info:
+                final_obs[i] = info.pop('final_observation')
+                final_infos[i] = info.pop('final_info')
+            infos = self._add_info(infos, info, i)
+        if dones.any():
+            infos['final_observation'] = final_obs
+            infos['_final_observation'] = dones
+            infos['final_info'] = final_infos
+            infos['_final_info'] = dones
+        return infos
+
+    def __request(self, msg):
+        self.__send(msg)
+        return self.__recv()
+
+    def __create_socket(self):
+        socket = self.context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect(self.endpoint)
+        return socket
+
+    def __send(self, msg):
+        if self.pending:
+            raise RuntimeError('A request is already pending, its reply must be received first')
+        self.socket.send(pack_msg(msg))
+        self.pending = True
+
+    def __recv(self):
+        if not self.pending:
+            raise RuntimeError('No request is pending')
+        if self.timeout is not None and not self.socket.poll(int(self.timeout * 1e3)):
+            # lazy pirate: a REQ socket waiting for a reply can not send anymore, the late reply is dropped with it
+            self.socket.close()
+            self.socket = self.__create_socket()
+            self.pending = False
+            raise TimeoutError(
+                f'The env server {self.endpoint} did not reply in {self.timeout}s')
+        self.pending = False
+        reply = unpack_msg(self.socket.recv())
+        if 'error' in reply:
+            raise RuntimeError(f'Env server error: {reply["error"]}')
+        return reply
@@ -1,16 +1,28 @@
-import docker
+import copy
 import zmq
 import msgpack
 import time
 import threading
 import numpy as np
-import sys
 import re
-import os
-from typing import TypedDict
+from collections import OrderedDict
+from typing import Any, List, TypedDict, Union
 
-from ...utils import ProfilingMeta, is_debugging, is_debugging_all, DurationProgress
+from ...utils import ProfilingMeta, is_debugging
 from ...types import Action, Observation, ResetInfo
+from . import lsa_wire
+from .lsa_endpoints import parse_endpoints, get_scheduler
+from .lsa_teardown import teardown_manager
+from .lsa_backends import AbcSimBackend, DockerBackend, DEFAULT_CONTAINER_TAG
+from .lsa_monitor import get_sim_monitor
+
+
+class SimulatorTimeoutError(RuntimeError):
+    """The simulator did not reply in time."""
+
+
+class SimulatorUnavailableError(RuntimeError):
+    """The simulator did not reply in time, the current episode is lost."""
 
 
 class AutoPauseIfInactive:
@@ -19,9 +31,12 @@ class AutoPauseIfInactive:
         self.resume_fn = resume_fn
         self.lock = threading.Lock()
         self.t = None
+        self.keep_awake = False  # set while a request is in flight
 
     def _on_pause(self):
         with self.lock:
+            if self.keep_awake:
+                return
             self.pause_fn()
 
     def __enter__(self):
@@ -34,8 +49,48 @@ class AutoPauseIfInactive:
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         self.t = threading.Timer(1, self._on_pause)
+        self.t.daemon = True
         self.t.start()
 
+    def cancel(self):
+        with self.lock:
+            if self.t is not None:
+                self.t.cancel()
+
+
+class SnapshotCache:
+    """Bounded LRU cache of simulator states, indexed by opaque integer handles."""
+
+    def __init__(self, max_size: int = 64) -> None:
+        assert max_size > 0, 'max_size must be positive'
+        self.max_size = max_size
+        self.snapshots = OrderedDict()
+        self.next_handle = 0
+
+    def add(self, state: Any, meta: Any = None) -> int:
+        handle = self.next_handle
+        self.next_handle += 1
+        self.snapshots[handle] = (state, meta)
+        while len(self.snapshots) > self.max_size:
+            self.snapshots.popitem(last=False)
+        return handle
+
+    def get(self, handle: int):
+        if handle not in self.snapshots:
+            raise KeyError(
+                f'Snapshot {handle} does not exist or has been evicted (max_size={self.max_size})')
+        self.snapshots.move_to_end(handle)
+        return self.snapshots[handle]
+
+    def discard(self, handle: int) -> None:
+        self.snapshots.pop(handle, None)
+
+    def clear(self) -> None:
+        self.snapshots.clear()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
 
 class Vector3(TypedDict):
     x: float
@@ -66,89 +121,239 @@ class SimResetInfo(TypedDict):
 
 
 class LSASim(metaclass=ProfilingMeta):
-    DEFAULT_PORT = 5555  # set in Dockerfile
-    DOCKER_IMAGE_NAME = 'lucasmrdt/sailboat-sim-lsa-gym:mss1-ode'
-
-    def __init__(self, name='default') -> None:
+    def __init__(self, name='default', endpoint: Union[str, List[str], None] = None, max_snapshots: int = 64, timeout: Union[float, None] = 30., retries: int = 1, wire_format: str = 'msgpack', cpus: Union[int, None] = None, mem_limit: Union[str, None] = None, reserved_cpus: Union[str, List[int], None] = None, backend: Union[AbcSimBackend, None] = None, container_tag: str = DEFAULT_CONTAINER_TAG) -> None:
+        """Client of a LSA simulator.
+
+        Args:
+            name (str, optional): Name of the simulator (docker container) to launch or reuse. Defaults to 'default'.
+            endpoint (Union[str, List[str]], optional): Address of an already running simulator (e.g. 'localhost:5555'), a list of addresses or the path of a registry file listing one address per line. The least loaded endpoint is used and another one is picked if it stops replying. No simulator is launched if provided. Defaults to None.
+            max_snapshots (int, optional): Maximum number of snapshots kept in memory, the least recently used ones are evicted first. Defaults to 64.
+            timeout (float, optional): Maximum time (in seconds) to send a request or wait for its reply, None to wait forever. Defaults to 30.
+            retries (int, optional): Number of times the connection is recreated after consecutive timeouts before restarting the container (or failing over to another endpoint). Defaults to 1.
+            wire_format (str, optional): Encoding of the step messages: 'msgpack', 'binary' (fixed layout float32 structs, the simulator must support it) or 'auto' (binary if the simulator supports it). Defaults to 'msgpack'.
+            cpus (int, optional): Number of cores the docker container is pinned on, picked among the least used cores of the least used NUMA node. Defaults to None (not pinned).
+            mem_limit (str, optional): Memory limit of the docker container (e.g. '2g'). Defaults to None (no limit).
+            reserved_cpus (Union[str, List[int]], optional): Cores never assigned to the container (e.g. '0-3' for the trainer). Defaults to None.
+            backend (AbcSimBackend, optional): Launches the simulator, e.g. SubprocessBackend to run it without docker. It is copied, the same instance can be shared by several simulators. Defaults to DockerBackend(cpus, mem_limit, reserved_cpus, container_tag).
+            container_tag (str, optional): Physics step size and engine of the docker image, e.g. 'mss4-ode' (see CONTAINER_TAGS). Defaults to 'mss1-ode'.
+        """
+        assert wire_format in ['msgpack', 'binary', 'auto'], \
+            f'Unknown wire format: {wire_format}'
         self.name = re.sub(r'[^a-zA-Z0-9]', '-', name)
 
         self.wind = None
         self.sim_rate = None
-        self.container = None
-        self.port = None
+        self.pending_reset = False
+        self.pending_step = False
+        self.launched = False
+        self.endpoints = parse_endpoints(endpoint) if endpoint else None
+        self.scheduler = get_scheduler(self.endpoints) if endpoint else None
+        self.endpoint = None
+        self.timeout = timeout
+        self.retries = retries
+        self.nb_timeouts = 0
+        self.nb_restarts = 0
+        self.consecutive_timeouts = 0
+        # counters published by the monitor (see `sailboat_gym top`)
+        self.state = 'starting'
+        self.paused = False
+        self.nb_steps = 0
+        self.nb_resets = 0
+        self.nb_errors = 0  # simulator errors and lost requests
+        self.last_step_latency = 0.
+        self.last_step_time = 0.
+        self.step_start_time = None
+        self.last_reset_msg = None
+        self.wire_format = wire_format
+        self.use_binary = False
         self.socket = None
+        self.snapshots = SnapshotCache(max_snapshots)
+        self.backend = copy.copy(backend) if backend is not None \
+            else DockerBackend(cpus, mem_limit, reserved_cpus, container_tag)
 
         self.timer = None
 
         self.auto_pause_if_inactive = AutoPauseIfInactive(
             self.__pause_if_needed, self.__resume_if_needed)
 
+        monitor = get_sim_monitor()
+        if monitor is not None:
+            monitor.register(self)
         self.__init_simulation()
 
-    def reset(self, wind: np.ndarray[2], water: np.ndarray[2], sim_rate: int):
+    def reset(self, wind: np.ndarray[2], water: np.ndarray[2], sim_rate: int, boat: int = 0, real_time_factor: Union[float, None] = None):
+        self.reset_async(wind, water, sim_rate, boat, real_time_factor)
+        return self.reset_wait()
+
+    def reset_async(self, wind: np.ndarray[2], water: np.ndarray[2], sim_rate: int, boat: int = 0, real_time_factor: Union[float, None] = None):
+        """Send the reset request without waiting for the simulator, `reset_wait` must be called before any other request.
+
+        Only the given boat is reset (and spawned if needed), the other boats of the simulation are left untouched.
+        The simulation of the boat runs at `real_time_factor` times the wall clock speed, as fast as possible if None.
+        """
+        assert not self.pending_reset, 'A reset is already pending'
+        if real_time_factor is not None and real_time_factor <= 0:
+            raise ValueError(f'real_time_factor must be positive, got {real_time_factor}')
         if is_debugging():
             print(
-                f'[LSASim] Resetting simulation with wind {wind}, water {water} and sim_rate {sim_rate}')
-        self.__send_msg({
+                f'[LSASim] Resetting boat {boat} with wind {wind}, water {water} and sim_rate {sim_rate}')
+        self.last_reset_msg = {
             'reset': {
                 'wind': {'x': wind[0], 'y': wind[1]},
                 'water': {'x': water[0], 'y': water[1]},
                 'freq': sim_rate,
             }
-        })
-        msg = self.__recv_msg()
+        }
+        if boat:
+            self.last_reset_msg['boat'] = boat
+        if real_time_factor is not None:
+            self.last_reset_msg['reset']['real_time_factor'] = real_time_factor
+        self.__send_msg(self.last_reset_msg)
+        self.pending_reset = True
+
+    def reset_wait(self):
+        assert self.pending_reset, 'Please call reset_async before reset_wait'
+        try:
+            # nothing is lost yet, the reset can safely be sent again
+            msg = self.__wait_reply(retry_msg=self.last_reset_msg)
+        finally:
+            self.pending_reset = False
+        self.nb_resets += 1
         obs = self.__parse_sim_obs(msg['obs'])
         info = self.__parse_sim_reset_info(msg['info'])
         return obs, info
 
     def step(self, wind: np.ndarray[2], water: np.ndarray[2], action: Action):
-        if is_debugging():
-            print(f'[LSASim] Sending action {action}')
-        self.__send_msg({
+        # a step can not be sent twice, the episode is lost on timeout
+        t0 = time.perf_counter()
+        if self.use_binary:
+            payload = self.__request(lsa_wire.encode_step(wind, water, action),
+                                     idempotent=False)
+            self.__count_steps(1, t0)
+            obs, done = lsa_wire.decode_step_reply(payload)
+            return obs, done, {}
+        msg = self.__request({
             'action': {
                 'theta_rudder': action['theta_rudder'].item(),
                 'theta_sail': action['theta_sail'].item(),
                 'wind': {'x': wind[0], 'y': wind[1]},
                 'water': {'x': water[0], 'y': water[1]},
             }
-        })
-        msg = self.__recv_msg()
+        }, idempotent=False)
+        self.__count_steps(1, t0)
         obs = self.__parse_sim_obs(msg['obs'])
         done = msg['done']
         return obs, done, msg['info']
 
+    def step_batch(self, winds: List[np.ndarray], waters: List[np.ndarray], actions: List[Action]):
+        self.step_batch_async(winds, waters, actions)
+        return self.step_batch_wait()
+
+    def step_batch_async(self, winds: List[np.ndarray], waters: List[np.ndarray], actions: List[Action]):
+        """Send the actions of the boats 0, 1, ..., len(actions) - 1 in a single message, `step_batch_wait` must be called before any other request."""
+        assert not self.pending_step, 'A step is already pending'
+        self.step_start_time = time.perf_counter()
+        if self.use_binary:
+            self.__send_msg(lsa_wire.encode_step_batch(winds, waters, actions))
+        else:
+            self.__send_msg({
+                'actions': [{
+                    'theta_rudder': np.asarray(action['theta_rudder']).item(),
+                    'theta_sail': np.asarray(action['theta_sail']).item(),
+                    'wind': {'x': wind[0], 'y': wind[1]},
+                    'water': {'x': water[0], 'y': water[1]},
+                } for wind, water, action in zip(winds, waters, actions)]
+            })
+        self.pending_step = True
+
+    def step_batch_wait(self):
+        """Return the stacked observations (arrays of shape (nb_boats, size)), the done flags and the infos of the boats."""
+        assert self.pending_step, 'Please call step_batch_async before step_batch_wait'
+        try:
+            # a step can not be sent twice, the episodes are lost on timeout
+            msg = self.__wait_reply()
+        finally:
+            self.pending_step = False
+        if self.use_binary:
+            obs, dones = lsa_wire.decode_step_batch_reply(msg)
+            self.__count_steps(len(dones), self.step_start_time)
+            return obs, dones, [{} for _ in dones]
+        self.__count_steps(len(msg['obs']), self.step_start_time)
+        observations = [self.__parse_sim_obs(obs) for obs in msg['obs']]
+        obs = {key: np.stack([o[key] for o in observations])
+               for key in observations[0]}
+        return obs, np.array(msg['done'], dtype=bool), msg['info']
+
+    def snapshot(self, meta: Any = None) -> int:
+        """Save the current simulator state and return an opaque handle to restore it later."""
+        if is_debugging():
+            print('[LSASim] Taking snapshot')
+        msg = self.__request({'snapshot': True}, idempotent=False)
+        return self.snapshots.add(msg['state'], meta)
+
+    def restore(self, handle: int):
+        """Restore a state previously saved with `snapshot`, return its observation and meta."""
+        if is_debugging():
+            print(f'[LSASim] Restoring snapshot {handle}')
+        state, meta = self.snapshots.get(handle)
+        msg = self.__request({'restore': {'state': state}})
+        obs = self.__parse_sim_obs(msg['obs'])
+        return obs, meta
+
     def close(self):
         if is_debugging():
             print('[LSASim] Closing simulation')
-        self.__send_msg({'close': True})
-        self.__recv_msg()
+        self.__request({'close': True})
+
+    def resource_stats(self) -> Union[dict, None]:
+        """CPU usage (in % of one core), throttling and memory usage of the simulator, None if unknown (e.g. no simulator was launched)."""
+        if not self.launched:
+            return None
+        return self.backend.resource_stats()
 
     def stop(self):
-        with DurationProgress(total=5, desc='Stopping docker container'):
-            with self.auto_pause_if_inactive:
-                self.container.kill()
+        """Kill the simulator, prefer `teardown_manager.stop_async` to not block."""
+        if self.scheduler is not None:
+            self.scheduler.release(self.endpoint)
+            self.scheduler = None
+        self.state = 'stopped'
+        if not self.launched:
+            return
+        teardown_manager.unregister(self)
+        self.auto_pause_if_inactive.cancel()
+        self.backend.stop()
 
     def __pause_if_needed(self):
-        try:
-            self.container.pause()
-        except docker.errors.APIError as e:
-            if is_debugging_all():
-                raise e
+        if self.launched:
+            self.backend.pause()
+            self.paused = True
 
     def __resume_if_needed(self):
-        try:
-            self.container.unpause()
-        except docker.errors.APIError as e:
-            if is_debugging_all():
-                raise e
+        if self.launched:
+            self.backend.resume()
+            self.paused = False
+
+    def __count_steps(self, nb_steps, t0):
+        self.nb_steps += nb_steps
+        self.last_step_latency = time.perf_counter() - t0
+        self.last_step_time = time.time()
 
     def __init_simulation(self):
+        if self.endpoints is not None:
+            self.endpoint = self.scheduler.acquire()
+            if is_debugging():
+                print(f'[LSASim] Connecting to simulation at {self.endpoint}')
+            self.socket = self.__create_connection()
+            self.state = 'running'
+            return
         if is_debugging():
-            print(f'[LSASim] Launching docker container for {self.name}')
-        self.__pull_image_if_needed()
-        self.container, self.port = self.__launch_or_get_container(self.name)  # noqa
-        self.__wait_until_ready()
+            print(f'[LSASim] Launching simulation for {self.name}')
+        self.endpoint = self.backend.launch(self.name)
+        self.launched = True
+        teardown_manager.register(self)
+        self.backend.wait_until_ready()
         self.socket = self.__create_connection()
+        self.state = 'running'
         self.__pause_if_needed()
 
     def __parse_sim_obs(self, obs: SimObservation) -> Observation:
@@ -177,125 +382,140 @@ class LSASim(metaclass=ProfilingMeta):
             'map_bounds': map_bounds,
         }
 
-    def __get_available_port(self):
-        def get_random_port():
-            # https://stackoverflow.com/a/46023565
-            random_int = int.from_bytes(os.urandom(2), byteorder='big')
-            return random_int % (65535 - 49152) + 49152
+    def __create_connection(self):
+        socket = self.__open_socket()
+        if self.wire_format != 'msgpack':
+            socket = self.__negotiate_wire_format(socket)
+        return socket
 
-        port = get_random_port()
-        while True:
-            try:
-                context = zmq.Context()
-                socket = context.socket(zmq.REQ)
-                socket.bind(f'tcp://*:{port}')
-                socket.close()
-                return port
-            except zmq.error.ZMQError:
-                port = get_random_port()
-
-    def __pull_image_if_needed(self):
-        client = docker.from_env()
-
-        # Check if image is already pulled
-        images = [img.tags for img in client.images.list()]
-        if any(self.DOCKER_IMAGE_NAME in tags for tags in images):
-            return
+    def __open_socket(self):
+        # a context per socket would block in `term` when garbage collected with its socket still open
+        context = zmq.Context.instance()
+        socket = context.socket(zmq.REQ)
+        socket.setsockopt(zmq.LINGER, 0)
+        if self.timeout is not None:
+            socket.setsockopt(zmq.SNDTIMEO, int(self.timeout * 1e3))
+        socket.connect(self.endpoint)
+        return socket
 
-        for progress_dict in client.api.pull(self.DOCKER_IMAGE_NAME, stream=True, decode=True):
-            status = progress_dict.get('status')
-            progress = progress_dict.get('progress')
+    def __negotiate_wire_format(self, socket):
+        socket.send(msgpack.packb(
+            {'hello': {'formats': [lsa_wire.FORMAT_NAME, 'msgpack']}}))
+        if self.timeout is None or socket.poll(int(self.timeout * 1e3)):
+            msg = msgpack.unpackb(socket.recv(), raw=False)
+        else:
+            # the REQ socket is stuck without reply, start from a new one
+            socket.close()
+            socket = self.__open_socket()
+            msg = {}
+        self.use_binary = msg.get('format') == lsa_wire.FORMAT_NAME
+        if self.wire_format == 'binary' and not self.use_binary:
+            raise RuntimeError(
+                f'Simulator {self.name} does not support the {lsa_wire.FORMAT_NAME} wire format')
+        if is_debugging():
+            print(
+                f'[LSASim] Using {"binary" if self.use_binary else "msgpack"} wire format')
+        return socket
 
-            if progress:
-                sys.stdout.write(f'\r{status}: {progress}')
-                sys.stdout.flush()
+    def __reconnect(self):
+        # a REQ socket can not be reused once a reply is lost (lazy pirate pattern)
+        self.socket.close()
+        self.socket = self.__create_connection()
+
+    def __restart(self):
+        self.nb_restarts += 1
+        self.state = 'restarting'
+        if self.endpoints is not None:
+            self.__failover()
+            return
+        if is_debugging():
+            print(f'[LSASim] Restarting simulation of {self.name}')
+        self.socket.close()
+        self.stop()
+        self.state = 'restarting'
+        self.backend.wait_stopped()
+        self.__init_simulation()
 
-        print()
+    def __failover(self):
+        dead_endpoint = self.endpoint
+        self.socket.close()
+        self.scheduler.mark_dead(dead_endpoint)
+        self.scheduler.release(dead_endpoint)
+        try:
+            self.endpoint = self.scheduler.acquire(exclude=[dead_endpoint])
+        except RuntimeError:
+            # no other endpoint is available, give the dead one another chance
+            self.endpoint = dead_endpoint
+            self.scheduler.reacquire(dead_endpoint)
+        if is_debugging():
+            print(
+                f'[LSASim] {dead_endpoint} is not responding, failing over to {self.endpoint}')
+        self.socket = self.__create_connection()
+        self.state = 'running'
 
-    def __launch_or_get_container(self, name):
-        with DurationProgress(total=7, desc='Launching docker container'):
-            try:
-                client = docker.from_env()
-            except docker.errors.DockerException as e:
-                if is_debugging():
-                    raise e
-                raise RuntimeError(
-                    'Docker socket is not detected. Please start docker and try again or make sure that you have correctly installed docker (MacOS: refer to this instruction https://stackoverflow.com/a/76125150).') from e
+    def __request(self, msg, idempotent=True):
+        self.__send_msg(msg)
+        return self.__wait_reply(retry_msg=msg if idempotent else None)
 
-            name = f'sailboat-sim-lsa-gym-{name}'
+    def __wait_reply(self, retry_msg=None):
+        """Wait for the reply of the last request.
 
-            # try to find an existing container with the given name
-            try:
-                container = client.containers.get(name)
-            except docker.errors.NotFound:
-                container = None
-            if container:
-                port = container.attrs['NetworkSettings']['Ports'][
-                    f'{self.DEFAULT_PORT}/tcp'][0]['HostPort']
-                if is_debugging():
-                    print(
-                        f'\n[LSASim] Found existing docker container {name} running on port {port}')
-                return container, port
-
-            # find an available port
-            port = self.__get_available_port()
-
-            # launch a new container if none found or the existing container is not running
+        On timeout, the connection is recreated and `retry_msg` is sent again (if
+        any). After more than `retries` consecutive timeouts, the simulator is
+        restarted instead. Raises SimulatorUnavailableError if the request can
+        not be retried or if the simulator still does not reply after a restart.
+        """
+        has_restarted = False
+        while True:
             try:
-                container = client.containers.run(
-                    self.DOCKER_IMAGE_NAME,
-                    name=name,
-                    detach=True,
-                    auto_remove=True,
-                    ports={
-                        f'{self.DEFAULT_PORT}/tcp': port,
-                        '22/tcp': None,
-                    },
-                )
-            except docker.errors.NotFound as e:
-                raise RuntimeError(
-                    f'Could not find docker image {self.DOCKER_IMAGE_NAME}. '
-                    'Please make sure the image exists and try again.'
-                ) from e
-            except docker.errors.APIError as e:
-                raise RuntimeError(
-                    f'Error communicating with Docker API: {str(e)}. '
-                    'Please check that the Docker daemon is running and try again.'
-                ) from e
-            except docker.errors.ContainerError as e:
-                raise RuntimeError(
-                    f'Container exited with non-zero exit code: {str(e)}. '
-                    'Please check the container logs for more information.'
-                ) from e
-            except docker.errors.ImageNotFound as e:
-                raise RuntimeError(
-                    f'Image not found: {str(e)}. '
-                    'Please check that the image exists on the Docker registry and try again.'
-                ) from e
-
-        return container, port
-
-    def __wait_until_ready(self):
-        with DurationProgress(total=17, desc='Waiting for docker container to be ready'):
-            while True:
-                logs = self.container.logs().decode('utf-8')
-                if 'INTENTIFIED CONTROL!' in logs:
-                    break
-                time.sleep(1)
-
-    def __create_connection(self):
-        context = zmq.Context()
-        socket = context.socket(zmq.REQ)
-        socket.connect(f'tcp://localhost:{self.port}')
-        return socket
+                msg = self.__recv_msg()
+                self.consecutive_timeouts = 0
+                return msg
+            except SimulatorTimeoutError:
+                self.nb_timeouts += 1
+                self.consecutive_timeouts += 1
+            if self.consecutive_timeouts > self.retries:
+                if has_restarted:
+                    self.__reconnect()
+                    self.nb_errors += 1
+                    raise SimulatorUnavailableError(
+                        f'Simulator {self.name} is still not replying after a restart')
+                self.__restart()
+                self.consecutive_timeouts = 0
+                has_restarted = True
+            else:
+                self.__reconnect()
+            if retry_msg is None:
+                self.nb_errors += 1
+                raise SimulatorUnavailableError(
+                    f'Simulator {self.name} did not reply within {self.timeout}s')
+            self.__send_msg(retry_msg)
 
     def __send_msg(self, msg):
         with self.auto_pause_if_inactive:
-            self.socket.send(msgpack.packb(msg))
+            try:
+                self.socket.send(msg if isinstance(msg, bytes)
+                                 else msgpack.packb(msg))
+            except zmq.error.Again as e:
+                raise SimulatorTimeoutError(
+                    f'Could not send request to simulator {self.name}') from e
+            # the container must not be paused while it is processing the request
+            self.auto_pause_if_inactive.keep_awake = True
 
     def __recv_msg(self):
         with self.auto_pause_if_inactive:
-            msg = msgpack.unpackb(self.socket.recv(), raw=False)
+            try:
+                if self.timeout is not None \
+                        and not self.socket.poll(int(self.timeout * 1e3)):
+                    raise SimulatorTimeoutError(
+                        f'Simulator {self.name} did not reply within {self.timeout}s')
+                payload = self.socket.recv()
+            finally:
+                self.auto_pause_if_inactive.keep_awake = False
+            if lsa_wire.is_binary(payload):
+                return payload
+            msg = msgpack.unpackb(payload, raw=False)
             if 'error' in msg:
+                self.nb_errors += 1
                 raise RuntimeError(msg['error'])
             return msg
@@ -0,0 +1,338 @@
+"""Local stand-in for the LSA simulator.
+
+It speaks the same ZMQ/msgpack protocol as the bridge running inside the
+docker container but integrates a small kinematic sailboat model instead of
+running ROS/Gazebo. It is meant for testing and benchmarking the client side
+(`LSASim`, `SailboatLSAEnv`, wrappers...) without docker.
+
+A client can spawn several non-interacting boats in its simulation: the reset
+message takes an optional `boat` index, and an `actions` message (or a binary
+STEP_BATCH) steps the boats 0, 1, ..., n - 1 together.
+
+The reset message may also carry a `real_time_factor`: the replies to the
+steps of the boat are then delayed so that the simulation advances at that
+speed relative to the wall clock, without blocking the other clients.
+
+Like the `max_step_size` of the physics engine of the docker images, a step
+can be integrated in several substeps (`--max-step-size`), to compare the
+accuracy and the speed of the container tags without docker.
+
+Usage:
+    python3 -m sailboat_gym.envs.sailboat_lsa.lsa_stand_in --port=5555
+    python3 -m sailboat_gym.envs.sailboat_lsa.lsa_stand_in --bind=ipc:///tmp/sim.ipc
+    python3 -m sailboat_gym.envs.sailboat_lsa.lsa_stand_in --port=5555 --max-step-size=0.001
+"""
+import argparse
+import heapq
+import math
+import threading
+import time
+import numpy as np
+import msgpack
+import zmq
+
+from . import lsa_wire
+
+READY_MESSAGE = 'INTENTIFIED CONTROL!'  # same marker as the docker container
+
+MAP_MIN = (-50., -50.)
+MAP_MAX = (50., 50.)
+
+SAIL_COEF = .4
+DRAG_COEF = .8
+RUDDER_COEF = .6
+YAW_DAMPING = 2.
+MAX_ACTUATOR_SPEED = np.pi  # rad/s
+
+
+def wrap_angle(angle):
+    return (angle + np.pi) % (2 * np.pi) - np.pi
+
+
+class StandInSimulation:
+    """Deterministic toy model of a sailboat, good enough to exercise the client."""
+
+    STATE_KEYS = ('x', 'y', 'psi', 'u', 'r', 'rudder', 'dt_rudder', 'sail',
+                  'dt_sail', 'wind_x', 'wind_y', 'water_x', 'water_y', 'dt', 'time')
+
+    def __init__(self, max_step_size=None):
+        self.max_step_size = max_step_size  # physics step, a whole env step if None
+        self.state = None
+        self.real_time_factor = None
+        self.deadline = 0.  # wall time at which the last step is over
+
+    def reset(self, wind, water, freq, real_time_factor=None):
+        self.state = {key: 0. for key in self.STATE_KEYS}
+        self.state['dt'] = 1. / freq
+        self.real_time_factor = real_time_factor
+        self.deadline = 0.
+        self._set_env(wind, water)
+        return self.get_obs(), self.get_reset_info()
+
+    def pace(self):
+        """Return the wall time at which the last step is over when running at `real_time_factor`, None if unbounded."""
+        if not self.real_time_factor:
+            return None
+        # a slow client does not make the simulation catch up afterwards
+        self.deadline = max(self.deadline, time.monotonic()) \
+            + self.state['dt'] / self.real_time_factor
+        return self.deadline
+
+    def step(self, action):
+        s = self.state
+        self._set_env(action['wind'], action['water'])
+        nb_substeps = max(1, math.ceil(s['dt'] / self.max_step_size - 1e-9)) \
+            if self.max_step_size else 1
+        start = s['rudder'], s['sail']
+        for _ in range(nb_substeps):
+            self._integrate(action, s['dt'] / nb_substeps)
+        s['dt_rudder'] = (s['rudder'] - start[0]) / s['dt']
+        s['dt_sail'] = (s['sail'] - start[1]) / s['dt']
+        s['time'] += s['dt']
+        return self.get_obs(), False, {'sim_time': s['time']}
+
+    def _integrate(self, action, dt):
+        s = self.state
+        # actuators are rate limited
+        for key, target in (('rudder', action['theta_rudder']), ('sail', action['theta_sail'])):
+            s[key] += np.clip(target - s[key], -MAX_ACTUATOR_SPEED * dt,
+                              MAX_ACTUATOR_SPEED * dt)
+
+        heading = np.array([np.cos(s['psi']), np.sin(s['psi'])])
+        water = np.array([s['water_x'], s['water_y']])
+        v_world = s['u'] * heading + water
+
+        # flat plate sail: normal force driven by the apparent wind
+        apparent_wind = np.array([s['wind_x'], s['wind_y']]) - v_world
+        theta_sail_world = s['psi'] + np.pi + s['sail']
+        attack = np.arctan2(apparent_wind[1], apparent_wind[0]) \
+            - theta_sail_world
+        normal = theta_sail_world + np.pi / 2
+        force = SAIL_COEF * np.dot(apparent_wind, apparent_wind) \
+            * np.sin(attack)
+        thrust = force * np.dot([np.cos(normal), np.sin(normal)], heading)
+
+        s['u'] += (thrust - DRAG_COEF * s['u'] * abs(s['u'])) * dt
+        target_r = -RUDDER_COEF * s['u'] * np.sin(s['rudder'])
+        s['r'] += (target_r - s['r']) * min(1., YAW_DAMPING * dt)
+        s['psi'] = wrap_angle(s['psi'] + s['r'] * dt)
+        s['x'] += v_world[0] * dt
+        s['y'] += v_world[1] * dt
+
+    def get_state(self):
+        return dict(self.state)
+
+    def set_state(self, state):
+        self.state = {key: float(state[key]) for key in self.STATE_KEYS}
+        return self.get_obs(), self.get_reset_info()
+
+    def get_obs(self):
+        s = self.state
+        cos, sin = np.cos(s['psi']), np.sin(s['psi'])
+        water = np.array([s['water_x'], s['water_y']])
+        v_world = s['u'] * np.array([cos, sin]) + water
+        # velocity is expressed in the boat frame
+        v_boat = (cos * v_world[0] + sin * v_world[1],
+                  -sin * v_world[0] + cos * v_world[1])
+        return {
+            'p_boat': {'x': s['x'], 'y': s['y'], 'z': 0.},
+            'dt_p_boat': {'x': v_boat[0], 'y': v_boat[1], 'z': 0.},
+            'theta_boat': {'x': 0., 'y': 0., 'z': s['psi']},
+            'dt_theta_boat': {'x': 0., 'y': 0., 'z': s['r']},
+            'theta_rudder': s['rudder'],
+            'dt_theta_rudder': s['dt_rudder'],
+            'theta_sail': s['sail'],
+            'dt_theta_sail': s['dt_sail'],
+            'wind': {'x': s['wind_x'], 'y': s['wind_y']},
+            'water': {'x': s['water_x'], 'y': s['water_y']},
+        }
+
+    def get_reset_info(self):
+        return {
+            'min_position': {'x': MAP_MIN[0], 'y': MAP_MIN[1]},
+            'max_position': {'x': MAP_MAX[0], 'y': MAP_MAX[1]},
+        }
+
+    def _set_env(self, wind, water):
+        self.state['wind_x'], self.state['wind_y'] = float(wind['x']), float(wind['y'])  # noqa
+        self.state['water_x'], self.state['water_y'] = float(water['x']), float(water['y'])  # noqa
+
+
+class StandInServer:
+    """Serve one `StandInSimulation` per boat of each connected client."""
+
+    def __init__(self, port=0, host='127.0.0.1', bind=None, max_step_size=None):
+        self.max_step_size = max_step_size
+        self.context = zmq.Context.instance()
+        self.socket = self.context.socket(zmq.ROUTER)
+        self.socket.setsockopt(zmq.LINGER, 0)
+        if bind:
+            # any zmq address, e.g. ipc:///tmp/sim.ipc
+            self.socket.bind(bind)
+            self.port = None
+            self.endpoint = bind
+        else:
+            if port:
+                self.socket.bind(f'tcp://{host}:{port}')
+                self.port = port
+            else:
+                self.port = self.socket.bind_to_random_port(f'tcp://{host}')
+            self.endpoint = f'tcp://{host}:{self.port}'
+        self.sessions = {}  # client identity -> boat index -> simulation
+        self.drop_replies = 0  # number of replies to drop, to test fault tolerance
+        self.delayed = []  # heap of (send time, seq, identity, reply) paced by the real time factor
+        self.nb_delayed = 0
+        self.thread = None
+        self.running = False
+
+    def handle(self, msg, sim: StandInSimulation):
+        if 'ping' in msg:
+            return {'load': self.nb_boats}
+        if 'hello' in msg:
+            formats = msg['hello'].get('formats', [])
+            return {'format': lsa_wire.FORMAT_NAME if lsa_wire.FORMAT_NAME in formats else 'msgpack'}
+        if 'reset' in msg:
+            obs, info = sim.reset(msg['reset']['wind'],
+                                  msg['reset']['water'],
+                                  msg['reset']['freq'],
+                                  msg['reset'].get('real_time_factor'))
+            return {'obs': obs, 'info': info}
+        if 'close' in msg:
+            return {'closed': True}
+        if sim.state is None:
+            return {'error': 'Simulation has not been reset'}
+        if 'action' in msg:
+            obs, done, info = sim.step(msg['action'])
+            return {'obs': obs, 'done': done, 'info': info}
+        if 'snapshot' in msg:
+            return {'state': sim.get_state()}
+        if 'restore' in msg:
+            obs, info = sim.set_state(msg['restore']['state'])
+            return {'obs': obs, 'info': info}
+        return {'error': f'Unknown message: {list(msg.keys())}'}
+
+    @property
+    def nb_boats(self):
+        return sum(len(boats) for boats in self.sessions.values())
+
+    def step_boats(self, boats, actions):
+        """Step the boats 0, 1, ..., len(actions) - 1 of a session."""
+        sims = [boats.get(i) for i in range(len(actions))]
+        if any(sim is None or sim.state is None for sim in sims):
+            raise RuntimeError('Simulation has not been reset')
+        observations, dones, infos = zip(*[sim.step(action)
+                                           for sim, action in zip(sims, actions)])
+        return list(observations), list(dones), list(infos)
+
+    def handle_binary(self, payload, boats):
+        boats = boats or {}
+        try:
+            opcode = lsa_wire.get_opcode(payload)
+            if opcode == lsa_wire.OP_STEP:
+                sim = boats.get(0)
+                if sim is None or sim.state is None:
+                    return {'error': 'Simulation has not been reset'}
+                obs, done, _ = sim.step(lsa_wire.decode_step(payload))
+                return lsa_wire.encode_step_reply(obs, done)
+            if opcode == lsa_wire.OP_STEP_BATCH:
+                observations, dones, _ = self.step_boats(
+                    boats, lsa_wire.decode_step_batch(payload))
+                return lsa_wire.encode_step_batch_reply(observations, dones)
+            return {'error': f'Unknown opcode: {opcode}'}
+        except Exception as e:
+            return {'error': repr(e)}
+
+    def get_deadline(self, msg, payload, identity):
+        """Return the wall time at which the reply to a step must be sent, None to send it now."""
+        if msg is None:
+            stepped = range(lsa_wire.get_batch_size(payload)) \
+                if lsa_wire.get_opcode(payload) == lsa_wire.OP_STEP_BATCH else [0]
+        elif 'action' in msg:
+            stepped = [msg.get('boat', 0)]
+        elif 'actions' in msg:
+            stepped = range(len(msg['actions']))
+        else:
+            return None
+        boats = self.sessions.get(identity, {})
+        deadlines = [boats[i].pace() for i in stepped if i in boats]
+        return max([d for d in deadlines if d is not None], default=None)
+
+    def send_due_replies(self):
+        while self.delayed and self.delayed[0][0] <= time.monotonic():
+            _, _, identity, reply = heapq.heappop(self.delayed)
+            self.socket.send_multipart([identity, b'', reply])
+
+    def serve_forever(self):
+        self.running = True
+        poller = zmq.Poller()
+        poller.register(self.socket, zmq.POLLIN)
+        while self.running:
+            self.send_due_replies()
+            timeout = 100
+            if self.delayed:
+                timeout = min(timeout, max(0, (self.delayed[0][0] - time.monotonic()) * 1e3))
+            if not poller.poll(timeout):
+                continue
+            identity, empty, payload = self.socket.recv_multipart()
+            if lsa_wire.is_binary(payload):
+                msg = None
+                reply = self.handle_binary(payload, self.sessions.get(identity))
+            else:
+                msg = msgpack.unpackb(payload, raw=False)
+                try:
+                    if 'ping' in msg:
+                        reply = self.handle(msg, None)
+                    elif 'actions' in msg:
+                        observations, dones, infos = self.step_boats(
+                            self.sessions.get(identity, {}), msg['actions'])
+                        reply = {'obs': observations, 'done': dones, 'info': infos}
+                    else:
+                        boats = self.sessions.setdefault(identity, {})
+                        sim = boats.setdefault(msg.get('boat', 0), StandInSimulation(self.max_step_size))
+                        reply = self.handle(msg, sim)
+                except Exception as e:
+                    reply = {'error': repr(e)}
+                if 'close' in msg:
+                    self.sessions.pop(identity, None)
+            if self.drop_replies > 0 and (msg is None or 'ping' not in msg):
+                self.drop_replies -= 1
+                continue
+            deadline = None if isinstance(reply, dict) and 'error' in reply \
+                else self.get_deadline(msg, payload, identity)
+            if not isinstance(reply, bytes):
+                reply = msgpack.packb(reply, default=float)
+            if deadline is not None and deadline > time.monotonic():
+                self.nb_delayed += 1
+                heapq.heappush(self.delayed, (deadline, self.nb_delayed, identity, reply))
+                continue
+            self.socket.send_multipart([identity, empty, reply])
+
+    def start(self):
+        """Serve in a background thread, returns the endpoint to connect to."""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self.endpoint
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+        self.socket.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=5555)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--bind', default=None,
+                        help='zmq address to bind instead of --host/--port, e.g. ipc:///tmp/sim.ipc')
+    parser.add_argument('--max-step-size', type=float, default=None,
+                        help='physics step (in seconds), each env step is integrated in one step if not given')
+    args = parser.parse_args()
+
+    server = StandInServer(args.port, args.host, args.bind, args.max_step_size)
+    print(READY_MESSAGE, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,235 @@
+"""Structured log of the last resets and steps of the environments.
+
+Every reset and step is recorded as a fixed-size record in a preallocated
+numpy structured array used as a ring buffer, recording copies a few floats
+and never formats strings, so the log is always on. The last records are
+dumped to disk on demand (`step_log.dump()`) and when a simulator fails. The
+process-wide hooks dumping them on an uncaught exception or on SIGUSR1 are
+opt-in (`step_log.install_handlers()` or SAILBOAT_STEP_LOG_HANDLERS=1). The
+dumps can be pretty-printed with:
+
+    sailboat_gym log <dump.npz> [--env NAME] [--last N]
+
+With DEBUG=all, the records are also printed as they are written.
+"""
+import datetime
+import os
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from typing import List, Union
+
+from ...utils import is_debugging_all
+from .lsa_wire import OBS_LAYOUT, OBS_SIZE, OBS_SLICES
+
+EVENT_RESET = 0  # reset requested: wind and water of the first step
+EVENT_RESET_DONE = 1  # reset done: first observation, time spent waiting for the simulator
+EVENT_STEP = 2
+EVENT_NAMES = ['reset', 'reset_done', 'step']
+
+RECORD_DTYPE = np.dtype([
+    ('time', 'f8'),  # wall clock
+    ('env', 'u4'),  # index in the names of the log
+    ('event', 'u1'),
+    ('terminated', '?'),
+    ('truncated', '?'),
+    ('sim_failure', '?'),
+    ('step', 'i8'),
+    ('wind', 'f4', 2),
+    ('water', 'f4', 2),
+    ('action', 'f4', 2),  # theta_rudder, theta_sail
+    ('obs', 'f4', OBS_SIZE),  # see lsa_wire.OBS_LAYOUT
+    ('reward', 'f8'),
+    ('duration', 'f4'),  # time spent waiting for the simulator
+])
+# same layout, records are packed in place without temporary arrays
+RECORD = struct.Struct(f'<dIB???q2f2f2f{OBS_SIZE}fdf')
+assert RECORD.size == RECORD_DTYPE.itemsize
+
+OBS_KEYS = [key for key, _ in OBS_LAYOUT]
+NO_VECTOR = (0, 0)
+NO_OBS = [0] * OBS_SIZE
+
+DEFAULT_SIZE = int(os.getenv('SAILBOAT_STEP_LOG_SIZE', 100_000))
+DEFAULT_DUMP_DIR = os.getenv('SAILBOAT_STEP_LOG_DIR') or tempfile.gettempdir()
+
+
+def is_installing_handlers():
+    return os.getenv('SAILBOAT_STEP_LOG_HANDLERS', '0') != '0'
+
+
+class StepLog:
+    """Ring buffer of the last `size` records of the environments writing to it."""
+
+    def __init__(self, size: int = DEFAULT_SIZE, dump_dir: str = DEFAULT_DUMP_DIR, min_dump_interval: float = 60) -> None:
+        """
+        Args:
+            size (int, optional): Number of records kept, ~150 bytes each. Defaults to $SAILBOAT_STEP_LOG_SIZE or 100000.
+            dump_dir (str, optional): Directory of the dumps written on error or on signal. Defaults to $SAILBOAT_STEP_LOG_DIR or the temporary directory.
+            min_dump_interval (float, optional): Minimum time (in seconds) between two dumps written on simulator failures. Defaults to 60.
+        """
+        assert size > 0, 'size must be positive'
+        self.size = size
+        self.dump_dir = dump_dir
+        self.min_dump_interval = min_dump_interval
+        self.lock = threading.Lock()
+        self.records = None  # allocated on first use
+        self.buffer = None  # bytes of the records
+        self.nb_records = 0  # total number of records written
+        self.names = []
+        self.last_error_dump_time = -np.inf
+        self.handlers_installed = False
+
+    def register(self, name: str) -> int:
+        """Return the id of a new writer (e.g. an environment), used by `record`."""
+        with self.lock:
+            if self.records is None:
+                self.records = np.zeros(self.size, dtype=RECORD_DTYPE)
+                self.buffer = memoryview(self.records).cast('B')
+            self.names.append(name)
+            return len(self.names) - 1
+
+    def record(self, env: int, event: int, step: int, wind=None, water=None, action=None, obs=None, reward: float = 0, terminated: bool = False, truncated: bool = False, sim_failure: bool = False, duration: float = 0) -> None:
+        with self.lock:
+            idx = self.nb_records % self.size
+            self.nb_records += 1
+        # the slot is written outside of the lock, it is only reused after `size` records
+        wind = wind if wind is not None else NO_VECTOR
+        water = water if water is not None else NO_VECTOR
+        rudder, sail = (action['theta_rudder'].item(), action['theta_sail'].item()) \
+            if action is not None else NO_VECTOR
+        flat_obs = [value for key in OBS_KEYS for value in obs[key].tolist()] \
+            if obs is not None else NO_OBS
+        RECORD.pack_into(self.buffer, idx * RECORD.size,
+                         time.time(), env, event, terminated, truncated, sim_failure, step,
+                         wind[0], wind[1], water[0], water[1], rudder, sail,
+                         *flat_obs, reward, duration)
+        if is_debugging_all():
+            print(format_record(self.records[idx], self.names))
+
+    def get_records(self) -> np.ndarray:
+        """Copy of the records kept, oldest first."""
+        with self.lock:
+            if self.records is None:
+                return np.zeros(0, dtype=RECORD_DTYPE)
+            if self.nb_records <= self.size:
+                return self.records[:self.nb_records].copy()
+            start = self.nb_records % self.size
+            return np.concatenate([self.records[start:], self.records[:start]])
+
+    def dump(self, path: Union[str, None] = None) -> str:
+        """Write the records kept to a .npz file, returns its path."""
+        if path is None:
+            date = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            path = os.path.join(self.dump_dir,
+                                f'sailboat-gym-steps-{os.getpid()}-{date}.npz')
+        records = self.get_records()
+        with self.lock:
+            names = list(self.names)
+        np.savez(path, records=records, names=np.array(names, dtype=str))
+        return path
+
+    def dump_on_error(self, reason: str) -> Union[str, None]:
+        """Dump the records unless a dump was written on error less than `min_dump_interval` seconds ago."""
+        with self.lock:
+            now = time.monotonic()
+            if self.records is None or now - self.last_error_dump_time < self.min_dump_interval:
+                return None
+            self.last_error_dump_time = now
+        path = self.dump()
+        print(f'[StepLog] {reason}, last steps dumped to {path}', file=sys.stderr)
+        return path
+
+    def install_handlers(self) -> None:
+        """Dump the records on uncaught exceptions (of any thread) and on SIGUSR1.
+
+        The hooks are process-wide (`sys.excepthook`, `threading.excepthook`,
+        the SIGUSR1 handler), so they are only installed on request.
+        """
+        with self.lock:
+            if self.handlers_installed:
+                return
+            self.handlers_installed = True
+
+        previous_excepthook = sys.excepthook
+        previous_threading_excepthook = getattr(threading, 'excepthook', None)  # Python >= 3.8
+
+        def excepthook(exc_type, exc_value, exc_tb):
+            if not issubclass(exc_type, KeyboardInterrupt):
+                self.dump_on_error(f'Uncaught {exc_type.__name__}')
+            previous_excepthook(exc_type, exc_value, exc_tb)
+
+        def threading_excepthook(args):
+            if not issubclass(args.exc_type, SystemExit):
+                self.dump_on_error(f'Uncaught {args.exc_type.__name__} in thread {args.thread.name}')
+            previous_threading_excepthook(args)
+
+        sys.excepthook = excepthook
+        if previous_threading_excepthook is not None:
+            threading.excepthook = threading_excepthook
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                signal.signal(signal.SIGUSR1, lambda *_: print(
+                    f'[StepLog] Last steps dumped to {self.dump()}', file=sys.stderr))
+            except ValueError:
+                pass  # signal handlers can only be installed from the main thread
+
+
+step_log = StepLog()
+
+
+def get_step_log(log: Union[StepLog, bool]) -> Union[StepLog, None]:
+    """Resolve the `step_log` argument of the environments: True for the shared log, False to disable it."""
+    if log is True:
+        if is_installing_handlers():
+            step_log.install_handlers()
+        return step_log
+    return log or None
+
+
+def decode_obs(rec) -> dict:
+    return {key: rec['obs'][s] for key, s in OBS_SLICES}
+
+
+def format_record(rec, names: List[str]) -> str:
+    date = datetime.datetime.fromtimestamp(rec['time']).strftime('%H:%M:%S.%f')[:-3]
+    name = names[rec['env']] if rec['env'] < len(names) else rec['env']
+    event = EVENT_NAMES[rec['event']]
+    lines = [f'{date} [{name}] {event} {rec["step"]}']
+    if rec['event'] in (EVENT_RESET, EVENT_STEP):
+        lines.append(f'  -> Wind: {rec["wind"]}')
+        lines.append(f'  -> Water: {rec["water"]}')
+    if rec['event'] == EVENT_STEP:
+        lines.append(f'  -> Action: theta_rudder={rec["action"][0]:.4f} theta_sail={rec["action"][1]:.4f}')
+    if rec['event'] == EVENT_STEP and rec['sim_failure']:
+        lines.append('  <- Simulator failure, the episode is truncated')
+    elif rec['event'] in (EVENT_RESET_DONE, EVENT_STEP):
+        for key, value in decode_obs(rec).items():
+            lines.append(f'  <- {key}: {value}')
+    if rec['event'] == EVENT_STEP:
+        lines.append(f'  <- Reward: {rec["reward"]}, terminated: {rec["terminated"]}, truncated: {rec["truncated"]}')
+    if rec['event'] in (EVENT_RESET_DONE, EVENT_STEP):
+        lines.append(f'  <- Waited {rec["duration"] * 1e3:.2f}ms for the simulator')
+    return '\n'.join(lines)
+
+
+def load_dump(path: str):
+    """Return the records and the names of the writers of a dump."""
+    with np.load(path) as dump:
+        return dump['records'], list(dump['names'])
+
+
+def print_dump(path: str, env: Union[str, None] = None, last: Union[int, None] = None) -> None:
+    """Pretty-print the records of a dump, only the ones of the environment named `env` and the `last` ones if given."""
+    records, names = load_dump(path)
+    if env is not None:
+        assert env in names, f'Unknown environment {env}, available: {names}'
+        records = records[np.isin(records['env'], [i for i, name in enumerate(names) if name == env])]
+    if last is not None:
+        records = records[-last:]
+    for rec in records:
+        print(format_record(rec, names))
@@ -0,0 +1,117 @@
+import atexit
+import signal
+import sys
+import threading
+import time
+from typing import List, Tuple, Union
+
+from ...utils import is_debugging
+
+
+class TeardownManager:
+    """Stops the simulations started by the process concurrently, in background threads.
+
+    Every registered simulation is stopped at exit (or on SIGTERM) unless it has
+    been stopped or unregistered before.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.sims = {}  # id -> sim, sims to be reaped at exit
+        self.threads = {}  # id -> (name, thread), stops in progress
+        self.failures = []
+        self.handlers_installed = False
+
+    def register(self, sim) -> None:
+        with self.lock:
+            self.sims[id(sim)] = sim
+            if not self.handlers_installed:
+                self.__install_handlers()
+
+    def unregister(self, sim) -> None:
+        with self.lock:
+            self.sims.pop(id(sim), None)
+
+    def stop_async(self, sim) -> Union[threading.Thread, None]:
+        """Stop the simulation in a background thread, returns immediately.
+
+        During the interpreter shutdown (e.g. from the `__del__` of an env),
+        threads cannot be started anymore: the simulation is stopped in the
+        calling thread if it is still registered, None is returned.
+        """
+        if sys.is_finalizing():
+            with self.lock:
+                registered = self.sims.pop(id(sim), None) is not None
+            if registered:
+                self.__stop(sim)
+            return None
+        with self.lock:
+            self.sims.pop(id(sim), None)
+            if id(sim) in self.threads:
+                return self.threads[id(sim)][1]
+            thread = threading.Thread(target=self.__stop, args=(sim,),
+                                      daemon=True)
+            self.threads[id(sim)] = (sim.name, thread)
+        thread.start()
+        return thread
+
+    def close_all(self, timeout: float = 30) -> List[Tuple[str, Exception]]:
+        """Stop all the registered simulations concurrently and wait at most `timeout` seconds.
+
+        Returns the list of (name, error) of the simulations that could not be stopped.
+        """
+        with self.lock:
+            sims = list(self.sims.values())
+        for sim in sims:
+            self.stop_async(sim)
+
+        deadline = time.time() + timeout
+        with self.lock:
+            threads = dict(self.threads)
+        for name, thread in threads.values():
+            thread.join(max(0, deadline - time.time()))
+
+        with self.lock:
+            failures = self.failures + [
+                (name, TimeoutError(f'Simulation {name} is still stopping after {timeout}s'))
+                for name, thread in self.threads.values() if thread.is_alive()]
+            self.failures = []
+        if failures and is_debugging():
+            for name, e in failures:
+                print(f'[TeardownManager] Failed to stop {name}: {e!r}')
+        return failures
+
+    def __stop(self, sim) -> None:
+        try:
+            sim.stop()
+        except Exception as e:
+            with self.lock:
+                self.failures.append((sim.name, e))
+        finally:
+            with self.lock:
+                self.threads.pop(id(sim), None)
+
+    def __install_handlers(self) -> None:
+        atexit.register(self.close_all)
+        try:
+            previous_handler = signal.getsignal(signal.SIGTERM)
+
+            def on_sigterm(signum, frame):
+                self.close_all()
+                if callable(previous_handler):
+                    previous_handler(signum, frame)
+                elif previous_handler in (signal.SIG_DFL, None):  # None: not installed from Python
+                    sys.exit(128 + signum)
+                # SIG_IGN: the process keeps running
+            signal.signal(signal.SIGTERM, on_sigterm)
+        except ValueError:
+            pass  # signal handlers can only be installed from the main thread
+        self.handlers_installed = True
+
+
+teardown_manager = TeardownManager()
+
+
+def close_all(timeout: float = 30) -> List[Tuple[str, Exception]]:
+    """Stop all the simulations started by the process, see `TeardownManager.close_all`."""
+    return teardown_manager.close_all(timeout)
@@ -0,0 +1,260 @@
+import math
+import time
+import numpy as np
+from gymnasium.vector import VectorEnv
+from typing import Callable, List, Union
+
+from ...types import Observation, Action, GymObservation, GymAction
+from ...utils import ProfilingMeta
+from .lsa_env import SailboatLSAEnv, direction_generator
+from .lsa_sim import LSASim, SimulatorUnavailableError
+from .lsa_backends import AbcSimBackend, DEFAULT_CONTAINER_TAG
+from .lsa_teardown import teardown_manager
+from .lsa_step_log import StepLog, get_step_log, EVENT_RESET, EVENT_RESET_DONE, EVENT_STEP
+
+
+class SailboatLSAVectorEnv(VectorEnv, metaclass=ProfilingMeta):
+    """Vector of sailboat environments sharing simulators, each simulator runs `boats_per_sim` non-interacting boats.
+
+    The environment `i` is the boat `i % boats_per_sim` of the simulator
+    `i // boats_per_sim` (see `boats`). The boats of a simulator are stepped
+    together with a single message, and the simulators are stepped
+    concurrently. Like the gymnasium vector envs, an environment is reset as
+    soon as its episode ends, its last observation and info are stored in
+    `info['final_observation']` and `info['final_info']`.
+    """
+
+    NB_STEPS_PER_SECONDS = SailboatLSAEnv.NB_STEPS_PER_SECONDS
+
+    def __init__(self, num_envs: int, boats_per_sim: int = 4, reward_fn: Callable[[Observation, Action, Observation], float] = lambda *_: 0, wind_generator_fn: Union[Callable[[int], np.ndarray], None] = None, water_generator_fn: Union[Callable[[int], np.ndarray], None] = None, stop_condition_fn: Callable[[Observation, Action, Observation], bool] = lambda *_: False, keep_sim_alive: bool = False, name='default', sim_endpoint: Union[str, List[str], None] = None, max_episode_steps: Union[int, None] = None, sim_timeout: Union[float, None] = 30., sim_retries: int = 1, sim_wire_format: str = 'msgpack', sim_cpus: Union[int, None] = None, sim_mem_limit: Union[str, None] = None, sim_reserved_cpus: Union[str, List[int], None] = None, real_time_factor: Union[float, None] = None, sim_backend: Union[AbcSimBackend, None] = None, step_log: Union[StepLog, bool] = True, container_tag: str = DEFAULT_CONTAINER_TAG):
+        """
+        Args:
+            num_envs (int): Number of environments (boats).
+            boats_per_sim (int, optional): Number of boats spawned in each simulator, ceil(num_envs / boats_per_sim) simulators are used. Defaults to 4.
+            reward_fn (Callable[[Observation, Action, Observation], float], optional): Reward function, called for each boat. Defaults to lambda *_: 0.
+            wind_generator_fn (Callable[[int], np.ndarray], optional): Function of the step index of a boat returning its wind. Defaults to a random constant wind per boat.
+            water_generator_fn (Callable[[int], np.ndarray], optional): Function of the step index of a boat returning its water current. Defaults to a random constant current per boat.
+            stop_condition_fn (Callable[[Observation, Action, Observation], bool], optional): Truncate the episode of a boat when it returns True. Defaults to lambda *_: False.
+            keep_sim_alive (bool, optional): Keep the simulations running after `close`. Defaults to False.
+            name (str, optional): Prefix of the names of the simulations. Defaults to 'default'.
+            sim_endpoint (Union[str, List[str]], optional): Address(es) of already running simulators, see SailboatLSAEnv. Defaults to None.
+            max_episode_steps (int, optional): Truncate the episodes after this number of steps. Defaults to None.
+            sim_timeout (float, optional): Maximum time (in seconds) to wait for a simulator. When a step times out, the episodes of all the boats of the simulator are truncated and `info['sim_failure']` is set. Defaults to 30.
+            sim_retries (int, optional): Number of times the connection is recreated after consecutive timeouts before the simulator is restarted. Defaults to 1.
+            sim_wire_format (str, optional): Encoding of the messages, see SailboatLSAEnv. Defaults to 'msgpack'.
+            sim_cpus (int, optional): Number of cores each docker container is pinned on, see SailboatLSAEnv. Defaults to None.
+            sim_mem_limit (str, optional): Memory limit of each docker container (e.g. '2g'). Defaults to None.
+            sim_reserved_cpus (Union[str, List[int]], optional): Cores never assigned to the simulators. Defaults to None.
+            real_time_factor (float, optional): Speed of the simulations relative to the wall clock, see SailboatLSAEnv. Defaults to None (as fast as possible).
+            sim_backend (AbcSimBackend, optional): Launches the simulators, see SailboatLSAEnv. Defaults to None (DockerBackend).
+            step_log (Union[StepLog, bool], optional): Ring buffer recording the resets and steps of the boats, see SailboatLSAEnv. Defaults to True.
+            container_tag (str, optional): Physics step size and engine of the docker images, see SailboatLSAEnv. Defaults to 'mss1-ode'.
+        """
+        assert boats_per_sim >= 1, 'boats_per_sim must be at least 1'
+        assert real_time_factor is None or real_time_factor > 0, 'real_time_factor must be positive'
+        super().__init__(num_envs, GymObservation, GymAction)
+        self.boats_per_sim = boats_per_sim
+        self.reward_fn = reward_fn
+        self.stop_condition_fn = stop_condition_fn
+        self.rng = np.random.default_rng()  # draws the default winds and currents, reseeded by `reset(seed)`
+        self.wind_generator_fns = [wind_generator_fn or direction_generator(rng=lambda: self.rng)
+                                   for _ in range(num_envs)]
+        self.water_generator_fns = [water_generator_fn or direction_generator(0.01, rng=lambda: self.rng)
+                                    for _ in range(num_envs)]
+        self.keep_sim_alive = keep_sim_alive
+        self.max_episode_steps = max_episode_steps
+        self.real_time_factor = real_time_factor
+
+        nb_sims = math.ceil(num_envs / boats_per_sim)
+        self.sims = [LSASim(f'{name}-{i}',
+                            endpoint=sim_endpoint,
+                            timeout=sim_timeout,
+                            retries=sim_retries,
+                            wire_format=sim_wire_format,
+                            cpus=sim_cpus,
+                            mem_limit=sim_mem_limit,
+                            reserved_cpus=sim_reserved_cpus,
+                            backend=sim_backend,
+                            container_tag=container_tag)
+                     for i in range(nb_sims)]
+        if keep_sim_alive:
+            for sim in self.sims:
+                teardown_manager.unregister(sim)
+        # env index -> (simulator index, boat index)
+        self.boats = [divmod(i, boats_per_sim) for i in range(num_envs)]
+        self.sim_envs = [list(range(i * boats_per_sim, min(num_envs, (i + 1) * boats_per_sim)))
+                         for i in range(nb_sims)]
+        self.step_log = get_step_log(step_log)
+        self.log_ids = [self.step_log.register(f'{self.sims[sim_idx].name}/{boat}')
+                        for sim_idx, boat in self.boats] if self.step_log else None
+
+        self.step_idx = np.zeros(num_envs, dtype=np.int64)
+        self.episode_start_time = np.zeros(num_envs)
+        self.obs = None  # stacked observations of the boats
+        self.actions = None
+        self.winds = None  # inputs of the pending step
+        self.waters = None
+        self.step_start_time = None
+
+    def reset_wait(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed if isinstance(seed, int) else seed[0])
+        observations, infos = [None] * self.num_envs, {}
+        # the boats of a simulator are reset one after the other, the simulators concurrently
+        for boat in range(self.boats_per_sim):
+            env_indices = [envs[boat] for envs in self.sim_envs if boat < len(envs)]
+            for i in env_indices:
+                self.__reset_boat_async(i)
+            for i in env_indices:
+                observations[i], info = self.__reset_boat_wait(i)
+                infos = self._add_info(infos, info, i)
+        self.obs = self.__stack(observations)
+        return self.__copy_obs(), infos
+
+    def __reset_boat_async(self, i):
+        sim_idx, boat = self.boats[i]
+        self.step_idx[i] = 0
+        wind, water = self.wind_generator_fns[i](0), self.water_generator_fns[i](0)
+        self.sims[sim_idx].reset_async(wind, water,
+                                       self.NB_STEPS_PER_SECONDS,
+                                       boat,
+                                       self.real_time_factor)
+        if self.step_log:
+            self.step_log.record(self.log_ids[i], EVENT_RESET, 0, wind, water)
+
+    def __reset_boat_wait(self, i):
+        sim_idx, _ = self.boats[i]
+        t0 = time.time()
+        obs, info = self.sims[sim_idx].reset_wait()
+        self.episode_start_time[i] = time.time()
+        if self.step_log:
+            self.step_log.record(self.log_ids[i], EVENT_RESET_DONE, 0, obs=obs,
+                                 duration=self.episode_start_time[i] - t0)
+        return obs, info
+
+    def step_async(self, actions):
+        assert self.obs is not None, 'Please call reset before step'
+        self.actions = actions
+        self.step_idx += 1
+        self.winds = [self.wind_generator_fns[i](self.step_idx[i]) for i in range(self.num_envs)]
+        self.waters = [self.water_generator_fns[i](self.step_idx[i]) for i in range(self.num_envs)]
+        self.step_start_time = time.time()
+        for sim, env_indices in zip(self.sims, self.sim_envs):
+            sim.step_batch_async(
+                [self.winds[i] for i in env_indices],
+                [self.waters[i] for i in env_indices],
+                [self.__get_item(actions, i) for i in env_indices])
+
+    def step_wait(self):
+        rewards = np.zeros(self.num_envs, dtype=np.float64)
+        terminated = np.zeros(self.num_envs, dtype=np.bool_)
+        truncated = np.zeros(self.num_envs, dtype=np.bool_)
+        infos = {}
+        next_obs = {key: np.empty_like(value) for key, value in self.obs.items()}
+        # the replies of all the simulators are read before raising, a simulator
+        # left with an unread reply could not be stepped anymore
+        replies, errors = [], []
+        for sim in self.sims:
+            try:
+                replies.append(sim.step_batch_wait())
+            except SimulatorUnavailableError as e:
+                replies.append(e)
+            except Exception as e:
+                replies.append(e)
+                errors.append(e)
+        if errors:
+            raise errors[0]
+        for sim, env_indices, reply in zip(self.sims, self.sim_envs, replies):
+            if isinstance(reply, SimulatorUnavailableError):
+                # the state of the simulation is lost, the episodes of its boats are truncated
+                for i in env_indices:
+                    for key in next_obs:
+                        next_obs[key][i] = self.obs[key][i]
+                    truncated[i] = True
+                    infos = self._add_info(infos, {'sim_failure': True,
+                                                   'nb_timeouts': sim.nb_timeouts,
+                                                   'nb_restarts': sim.nb_restarts}, i)
+                    if self.step_log:
+                        self.step_log.record(self.log_ids[i], EVENT_STEP, self.step_idx[i],
+                                             self.winds[i], self.waters[i], self.__get_item(self.actions, i),
+                                             truncated=True, sim_failure=True,
+                                             duration=time.time() - self.step_start_time)
+                if self.step_log:
+                    self.step_log.dump_on_error(f'Simulator {sim.name} failed')
+                continue
+            sim_obs, dones, sim_infos = reply
+            now = time.time()
+            for j, i in enumerate(env_indices):
+                for key in next_obs:
+                    next_obs[key][i] = sim_obs[key][j]
+                obs_i, action_i = self.__get_item(self.obs, i), self.__get_item(self.actions, i)
+                next_obs_i = self.__get_item(next_obs, i)
+                rewards[i] = self.reward_fn(obs_i, action_i, next_obs_i)
+                terminated[i] = dones[j]
+                truncated[i] = self.stop_condition_fn(obs_i, action_i, next_obs_i) \
+                    or (self.max_episode_steps is not None
+                        and self.step_idx[i] >= self.max_episode_steps)
+                infos = self._add_info(infos, {
+                    'sim_time': self.step_idx[i] / self.NB_STEPS_PER_SECONDS,  # unless the simulator reports its clock
+                    **sim_infos[j],
+                    'wall_time': now - self.episode_start_time[i],
+                }, i)
+                if self.step_log:
+                    self.step_log.record(self.log_ids[i], EVENT_STEP, self.step_idx[i],
+                                         self.winds[i], self.waters[i], action_i, next_obs_i,
+                                         rewards[i], terminated[i], truncated[i],
+                                         duration=now - self.step_start_time)
+        self.obs = next_obs
+
+        done_indices = np.flatnonzero(terminated | truncated)
+        if len(done_indices):
+            final_obs = np.full(self.num_envs, None, dtype=object)
+            final_infos = np.full(self.num_envs, None, dtype=object)
+            for i in done_indices:
+                final_obs[i] = {key: value.copy() for key, value in self.__get_item(self.obs, i).items()}
+                final_infos[i] = {key: value[i] for key, value in infos.items()
+                                  if not key.startswith('_') and infos[f'_{key}'][i]}
+            self.__reset_boats(done_indices)
+            infos['final_observation'] = final_obs
+            infos['_final_observation'] = terminated | truncated
+            infos['final_info'] = final_infos
+            infos['_final_info'] = terminated | truncated
+        return self.__copy_obs(), rewards, terminated, truncated, infos
+
+    def __reset_boats(self, env_indices):
+        # at most one pending reset per simulator
+        remaining = list(env_indices)
+        while remaining:
+            batch, used_sims = [], set()
+            for i in remaining:
+                if self.boats[i][0] not in used_sims:
+                    used_sims.add(self.boats[i][0])
+                    batch.append(i)
+            for i in batch:
+                self.__reset_boat_async(i)
+            for i in batch:
+                obs, _ = self.__reset_boat_wait(i)
+                for key, value in obs.items():
+                    self.obs[key][i] = value
+            remaining = [i for i in remaining if i not in batch]
+
+    def __get_item(self, batch, i):
+        return {key: value[i] for key, value in batch.items()}
+
+    def __stack(self, observations):
+        return {key: np.stack([obs[key] for obs in observations])
+                for key in observations[0]}
+
+    def __copy_obs(self):
+        return {key: value.copy() for key, value in self.obs.items()}
+
+    def close_extras(self, **kwargs):
+        for sim in self.sims:
+            if sim.pending_reset:
+                sim.reset_wait()
+            if sim.pending_step:
+                sim.step_batch_wait()
+            sim.close()
+            if not self.keep_sim_alive:
+                teardown_manager.stop_async(sim)
+        self.obs = None
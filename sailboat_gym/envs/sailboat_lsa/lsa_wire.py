@@ -0,0 +1,164 @@
+"""Compact binary wire format of the LSA simulator protocol.
+
+Binary messages start with the byte 0xc1, which is never used by msgpack, so
+that both formats can be told apart on the same socket. The 4 bytes header
+(0xc1, version, opcode, padding) is followed by little-endian float32 values:
+
+- STEP request: theta_rudder, theta_sail, wind (x, y), water (x, y)
+- STEP reply: the observation (see OBS_LAYOUT) followed by done
+- STEP_BATCH request/reply: a uint32 count, padded to 8 bytes, followed by
+  `count` STEP requests/replies
+
+The format is negotiated with a msgpack `hello` message listing the formats
+supported by the client, msgpack stays the fallback. This module only depends
+on struct/numpy and avoids python 3 only syntax so that it can be reused by
+the python 2 bridge running inside the docker container.
+"""
+import struct
+import numpy as np
+
+MAGIC = 0xc1
+VERSION = 1
+FORMAT_NAME = 'binary-v%d' % VERSION
+
+OP_STEP = 1
+OP_STEP_BATCH = 2
+
+HEADER = struct.Struct('<BBBx')
+COUNT = struct.Struct('<I4x')
+
+OBS_LAYOUT = [  # (name, size), in wire order
+    ('p_boat', 3),
+    ('dt_p_boat', 3),
+    ('theta_boat', 3),
+    ('dt_theta_boat', 3),
+    ('theta_rudder', 1),
+    ('dt_theta_rudder', 1),
+    ('theta_sail', 1),
+    ('dt_theta_sail', 1),
+    ('wind', 2),
+    ('water', 2),
+]
+OBS_SIZE = sum(size for _, size in OBS_LAYOUT)
+ACTION_SIZE = 6
+REPLY_SIZE = OBS_SIZE + 1  # + done
+
+OBS_SLICES = []
+_offset = 0
+for _name, _size in OBS_LAYOUT:
+    OBS_SLICES.append((_name, slice(_offset, _offset + _size)))
+    _offset += _size
+
+VECTOR_KEYS = ('x', 'y', 'z')
+
+
+def is_binary(payload):
+    return len(payload) >= HEADER.size and bytearray(payload[:1])[0] == MAGIC
+
+
+def get_opcode(payload):
+    return HEADER.unpack_from(payload)[2]
+
+
+def get_batch_size(payload):
+    return COUNT.unpack_from(payload, HEADER.size)[0]
+
+
+def _pack(opcode, values, count=None):
+    values = np.ascontiguousarray(values, dtype='<f4')
+    header = HEADER.pack(MAGIC, VERSION, opcode)
+    if count is not None:
+        header += COUNT.pack(count)
+    return header + values.tobytes()
+
+
+def _unpack(payload, opcode, row_size):
+    magic, version, op = HEADER.unpack_from(payload)
+    if magic != MAGIC or version != VERSION or op != opcode:
+        raise ValueError('Unexpected binary message (version=%d, opcode=%d)'
+                         % (version, op))
+    offset = HEADER.size
+    if opcode == OP_STEP_BATCH:
+        count, = COUNT.unpack_from(payload, offset)
+        offset += COUNT.size
+        return np.frombuffer(payload, '<f4', count * row_size, offset).reshape(count, row_size)
+    return np.frombuffer(payload, '<f4', row_size, offset)
+
+
+# client side
+
+def action_to_array(wind, water, action):
+    return [float(np.asarray(action['theta_rudder']).item()),
+            float(np.asarray(action['theta_sail']).item()),
+            wind[0], wind[1], water[0], water[1]]
+
+
+def encode_step(wind, water, action):
+    return _pack(OP_STEP, action_to_array(wind, water, action))
+
+
+def encode_step_batch(winds, waters, actions):
+    rows = [action_to_array(wind, water, action)
+            for wind, water, action in zip(winds, waters, actions)]
+    return _pack(OP_STEP_BATCH, np.reshape(rows, (-1, ACTION_SIZE)), len(rows))
+
+
+def array_to_obs(values):
+    return dict((name, values[s]) for name, s in OBS_SLICES)
+
+
+def decode_step_reply(payload):
+    """Return the observation and the done flag, the observation arrays are views of a single buffer."""
+    values = _unpack(payload, OP_STEP, REPLY_SIZE).copy()
+    return array_to_obs(values[:OBS_SIZE]), bool(values[OBS_SIZE])
+
+
+def decode_step_batch_reply(payload):
+    """Return the stacked observations (arrays of shape (count, size)) and the done flags."""
+    values = _unpack(payload, OP_STEP_BATCH, REPLY_SIZE).copy()
+    obs = dict((name, values[:, s]) for name, s in OBS_SLICES)
+    return obs, values[:, OBS_SIZE] != 0
+
+
+# simulator side
+
+def decode_step(payload):
+    """Return the action as a dict, in the same layout as the msgpack protocol."""
+    return _values_to_action(_unpack(payload, OP_STEP, ACTION_SIZE))
+
+
+def decode_step_batch(payload):
+    return [_values_to_action(values)
+            for values in _unpack(payload, OP_STEP_BATCH, ACTION_SIZE)]
+
+
+def _values_to_action(values):
+    values = [float(v) for v in values]
+    return {
+        'theta_rudder': values[0],
+        'theta_sail': values[1],
+        'wind': {'x': values[2], 'y': values[3]},
+        'water': {'x': values[4], 'y': values[5]},
+    }
+
+
+def sim_obs_to_array(obs, done=False):
+    """Flatten a msgpack-style observation (nested dicts of floats) in wire order."""
+    values = []
+    for name, size in OBS_LAYOUT:
+        if size == 1:
+            values.append(obs[name])
+        else:
+            values.extend(obs[name][k] for k in VECTOR_KEYS[:size])
+    values.append(1. if done else 0.)
+    return values
+
+
+def encode_step_reply(obs, done):
+    return _pack(OP_STEP, sim_obs_to_array(obs, done))
+
+
+def encode_step_batch_reply(observations, dones):
+    rows = [sim_obs_to_array(obs, done)
+            for obs, done in zip(observations, dones)]
+    return _pack(OP_STEP_BATCH, np.reshape(rows, (-1, REPLY_SIZE)), len(rows))
@@ -1,2 +1,5 @@
 from .get_best_sail import *
-from .get_vmc import *
\ No newline at end of file
+from .get_vmc import *
+from .rollout_cache import *
+from .relabel import *
+from .evaluate import *
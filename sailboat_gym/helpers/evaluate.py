@@ -0,0 +1,220 @@
+"""Evaluation of a policy over a grid of wind angles and velocities.
+
+The episodes of the grid are scheduled on a fixed pool of environments: each
+one is created once (its simulator is reused between episodes) and pulls the
+next scenario of a shared queue as soon as its episode ends, so that the
+environments stay busy whatever the length of the episodes. The metrics of
+each episode are appended to a JSON lines file as soon as it ends.
+
+Metrics of an episode (the course is the x axis by default, like the polars):
+
+- vmc_mean, vmc_max: velocity made good along the course (m/s),
+- dmg: distance made good along the course (m),
+- sim_time: simulated duration of the episode (s), wall_time: time spent running it (s),
+- reward: sum of the rewards of the env (0 without `reward_fn`).
+
+Usage:
+    sailboat_gym evaluate --policy=my_module:policy --theta-winds=0,45,90,135,180 --wind-velocities=1,2 --num-sims=8 --output=results.jsonl
+"""
+import json
+import queue
+import threading
+import time
+import numpy as np
+import gymnasium as gym
+from typing import Callable, List, Union
+
+from ..types import Observation, Action
+
+
+class ScenarioWind:
+    """Constant wind of the current scenario of an environment."""
+
+    def __init__(self) -> None:
+        self.theta_wind = 0  # degrees
+        self.wind_velocity = 1
+
+    def __call__(self, _):
+        theta = np.deg2rad(self.theta_wind)
+        return np.array([np.cos(theta), np.sin(theta)]) * self.wind_velocity
+
+
+def still_water(_):
+    return np.zeros(2)
+
+
+def get_scenario_grid(theta_winds: List[float], wind_velocities: List[float], seeds: List[int] = (0,)) -> List[dict]:
+    """Scenarios of every wind angle (in degrees), wind velocity (in m/s) and seed."""
+    return [{'theta_wind': float(theta_wind), 'wind_velocity': float(wind_velocity), 'seed': int(seed)}
+            for wind_velocity in wind_velocities
+            for theta_wind in theta_winds
+            for seed in seeds]
+
+
+def run_episode(env, wind: ScenarioWind, policy: Callable[[Observation], Action], scenario: dict, nb_steps: int, course: float = 0) -> dict:
+    """Run an episode of the scenario, returns its metrics."""
+    t0 = time.time()
+    wind.theta_wind, wind.wind_velocity = scenario['theta_wind'], scenario['wind_velocity']
+    obs, _ = env.reset(seed=scenario['seed'])
+    direction = np.array([np.cos(np.deg2rad(course)), np.sin(np.deg2rad(course))])
+    start = obs['p_boat'][:2].copy()
+    vmcs, total_reward = [], 0.
+    terminated = truncated = False
+    for _ in range(nb_steps):
+        obs, reward, terminated, truncated, _ = env.step(policy(obs))
+        vmcs.append(float(np.dot(obs['dt_p_boat'][:2], direction)))
+        total_reward += reward
+        if terminated or truncated:
+            break
+    return {
+        **scenario,
+        'nb_steps': len(vmcs),
+        'sim_time': len(vmcs) / env.unwrapped.NB_STEPS_PER_SECONDS,
+        'wall_time': time.time() - t0,
+        'vmc_mean': float(np.mean(vmcs)) if vmcs else 0.,
+        'vmc_max': float(np.max(vmcs)) if vmcs else 0.,
+        'dmg': float(np.dot(obs['p_boat'][:2] - start, direction)),
+        'reward': float(total_reward),
+        'terminated': bool(terminated),
+        'truncated': bool(truncated),
+    }
+
+
+def evaluate(policy: Callable[[Observation], Action], scenarios: List[dict], num_sims: int = 4, duration: float = 60, output: Union[str, None] = None, course: float = 0, env_name: str = 'SailboatLSAEnv-v0', name: str = 'evaluate', verbose: bool = False, **env_kwargs) -> dict:
+    """Run an episode of `policy` per scenario on a pool of `num_sims` environments.
+
+    Args:
+        policy (Callable[[Observation], Action]): Controller, called concurrently by the environments of the pool (the wind is part of the observation).
+        scenarios (List[dict]): Scenarios to evaluate (theta_wind in degrees, wind_velocity in m/s, seed), e.g. from `get_scenario_grid`.
+        num_sims (int, optional): Number of environments (and simulators) of the pool. Defaults to 4.
+        duration (float, optional): Maximum simulated duration of an episode (in seconds). Defaults to 60.
+        output (str, optional): JSON lines file the metrics of each episode are appended to as soon as it ends. Defaults to None.
+        course (float, optional): Direction (in degrees) along which the VMC and the distance made good are measured. Defaults to 0 (x axis).
+        env_name (str, optional): Name of the environments. Defaults to 'SailboatLSAEnv-v0'.
+        name (str, optional): Prefix of the names of the simulations. Defaults to 'evaluate'.
+        verbose (bool, optional): Print the metrics of each episode as it ends. Defaults to False.
+        **env_kwargs: Other arguments of the environments (e.g. sim_endpoint, reward_fn, water_generator_fn).
+
+    Returns:
+        dict: The metrics of the episodes ('episodes', in the order of the scenarios) and the throughput of the pool ('throughput').
+    """
+    assert scenarios, 'No scenario to evaluate'
+    num_sims = min(num_sims, len(scenarios))
+    env_kwargs.setdefault('water_generator_fn', still_water)
+    pending = queue.Queue()
+    for idx, scenario in enumerate(scenarios):
+        pending.put((idx, scenario))
+    episodes = [None] * len(scenarios)
+    sims = [{'name': f'{name}-{i}', 'nb_episodes': 0, 'nb_steps': 0, 'busy_time': 0.}
+            for i in range(num_sims)]
+    errors = []
+    lock = threading.Lock()  # protects the output file and the statistics
+    results_file = open(output, 'a') if output else None
+
+    def worker(i):
+        env = None
+        try:
+            wind = ScenarioWind()
+            env = gym.make(env_name, wind_generator_fn=wind, name=sims[i]['name'], **env_kwargs)
+            nb_steps = int(duration * env.unwrapped.NB_STEPS_PER_SECONDS)
+            while not errors:
+                try:
+                    idx, scenario = pending.get_nowait()
+                except queue.Empty:
+                    return
+                metrics = run_episode(env, wind, policy, scenario, nb_steps, course)
+                metrics['sim'] = sims[i]['name']
+                with lock:
+                    episodes[idx] = metrics
+                    sims[i]['nb_episodes'] += 1
+                    sims[i]['nb_steps'] += metrics['nb_steps']
+                    sims[i]['busy_time'] += metrics['wall_time']
+                    if results_file:
+                        results_file.write(json.dumps(metrics) + '\n')
+                        results_file.flush()
+                    if verbose:
+                        print(format_episode(metrics), flush=True)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            if env is not None:
+                env.close()
+
+    t0 = time.time()
+    threads = [threading.Thread(target=worker, args=(i,), name=f'evaluate-{i}')
+               for i in range(num_sims)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if results_file:
+            results_file.close()
+    if errors:
+        raise errors[0]
+    elapsed = time.time() - t0
+
+    nb_steps = sum(sim['nb_steps'] for sim in sims)
+    return {
+        'episodes': episodes,
+        'throughput': {
+            'num_sims': num_sims,
+            'nb_episodes': len(episodes),
+            'elapsed': elapsed,
+            'episodes_per_s': len(episodes) / elapsed,
+            'steps_per_s': nb_steps / elapsed,
+            'sim_seconds_per_s': sum(episode['sim_time'] for episode in episodes) / elapsed,
+            'sims': [{
+                'name': sim['name'],
+                'nb_episodes': sim['nb_episodes'],
+                'steps_per_s': sim['nb_steps'] / sim['busy_time'] if sim['busy_time'] else 0.,
+                'utilization': sim['busy_time'] / elapsed,
+            } for sim in sims],
+        },
+    }
+
+
+def load_results(path: str) -> List[dict]:
+    """Metrics of the episodes written to a results file by `evaluate`."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(episodes: List[dict]) -> List[dict]:
+    """Mean metrics of the seeds of each wind velocity and wind angle."""
+    groups = {}
+    for episode in episodes:
+        groups.setdefault((episode['wind_velocity'], episode['theta_wind']), []).append(episode)
+    return [{
+        'wind_velocity': wind_velocity,
+        'theta_wind': theta_wind,
+        'nb_episodes': len(group),
+        **{key: float(np.mean([episode[key] for episode in group]))
+           for key in ['vmc_mean', 'vmc_max', 'dmg', 'sim_time', 'reward']},
+    } for (wind_velocity, theta_wind), group in sorted(groups.items())]
+
+
+def format_episode(metrics: dict) -> str:
+    return (f'[{metrics["sim"]}] wind {metrics["theta_wind"]:.0f}° {metrics["wind_velocity"]:g} m/s, seed {metrics["seed"]}: '
+            f'vmc {metrics["vmc_mean"]:.3f} m/s, dmg {metrics["dmg"]:.2f} m in {metrics["sim_time"]:.1f}s')
+
+
+def format_summary(summary: List[dict]) -> str:
+    lines = [f'{"wind (m/s)":>10}{"angle (°)":>10}{"episodes":>10}{"vmc mean":>10}{"vmc max":>10}'
+             f'{"dmg (m)":>10}{"time (s)":>10}{"reward":>10}']
+    for row in summary:
+        lines.append(f'{row["wind_velocity"]:>10g}{row["theta_wind"]:>10g}{row["nb_episodes"]:>10}'
+                     f'{row["vmc_mean"]:>10.3f}{row["vmc_max"]:>10.3f}{row["dmg"]:>10.2f}'
+                     f'{row["sim_time"]:>10.1f}{row["reward"]:>10.2f}')
+    return '\n'.join(lines)
+
+
+def format_throughput(throughput: dict) -> str:
+    lines = [f'{throughput["nb_episodes"]} episodes in {throughput["elapsed"]:.1f}s on {throughput["num_sims"]} simulator(s): '
+             f'{throughput["episodes_per_s"]:.2f} episodes/s, {throughput["steps_per_s"]:.0f} steps/s, '
+             f'{throughput["sim_seconds_per_s"]:.1f} simulated seconds/s']
+    for sim in throughput['sims']:
+        lines.append(f'  {sim["name"]}: {sim["nb_episodes"]} episodes, {sim["steps_per_s"]:.0f} steps/s, '
+                     f'{sim["utilization"] * 100:.0f}% busy')
+    return '\n'.join(lines)
@@ -6,7 +6,7 @@ import numpy as np
 from glob import glob
 from functools import lru_cache
 
-from ..envs import env_by_name
+from ..envs import env_names
 
 current_dir = osp.dirname(osp.abspath(__file__))
 pkl_dir = osp.join(current_dir, '..', 'pkl')
@@ -58,7 +58,7 @@ def extract_best_sail(df):
 
 @lru_cache()
 def load_best_sail_dict(env_name, wind_velocity=1):
-    assert env_name in list(env_by_name.keys()), f'Env {env_name} not found.'
+    assert env_name in env_names, f'Env {env_name} not found.'
     pathname = osp.join(
         pkl_dir, f'{env_name}_bounds_v_wind_{wind_velocity}.pkl')
     filepaths = sorted(glob(pathname), key=extract_index, reverse=True)
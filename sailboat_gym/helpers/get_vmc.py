@@ -1,14 +1,12 @@
-import click
 import os.path as osp
 import re
 import pickle
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 from functools import lru_cache
 from glob import glob
 
-from ..envs import env_by_name
+from ..envs import env_names
 
 current_dir = osp.dirname(osp.abspath(__file__))
 pkl_dir = osp.join(current_dir, '..', 'pkl')
@@ -43,7 +41,7 @@ def extract_vmc_from_df(df):
 
 
 def load_vmc_dict(env_name, wind_velocity=1):
-    assert env_name in list(env_by_name.keys()), f'Env {env_name} not found.'
+    assert env_name in env_names, f'Env {env_name} not found.'
     pathname = osp.join(
         pkl_dir, f'{env_name}_bounds_v_wind_{wind_velocity}.pkl')
     filepaths = sorted(glob(pathname), key=extract_index, reverse=True)
@@ -0,0 +1,214 @@
+"""Offline relabeling of the rewards and terminations of recorded transitions.
+
+Changing the reward of a task does not require simulating the episodes
+again: the reward and the stop condition are functions of the transitions
+(observation, action, next observation). The transitions are stored as a
+directory of .npy columns, memory-mapped and split into chunks evaluated by a
+pool of processes, so that millions of transitions are relabeled in bounded
+memory. The new columns are written next to the recorded ones:
+
+    transitions/
+        obs.p_boat.npy, obs.dt_p_boat.npy, ...  (n, *shape)
+        action.theta_rudder.npy, ...  (n, 1)
+        next_obs.p_boat.npy, ...  (n, *shape)
+        reward.npy, terminated.npy, truncated.npy  (n,), as recorded
+        reward.<name>.npy, terminated.<name>.npy  (n,), relabeled
+
+The reward and termination functions are vectorized: they are called with
+the observations, actions and next observations of a chunk (dicts of arrays
+whose first axis is the transition) and return an array of shape (n,).
+`PerTransition` turns the `reward_fn`/`stop_condition_fn` of an env into one.
+
+Usage:
+    sailboat_gym relabel <transitions> --reward vmc=my_task:vmc_reward [--termination out=my_task:out_of_map] [--workers N]
+"""
+import os
+import os.path as osp
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Union
+
+from ..envs.sailboat_lsa.lsa_wire import OBS_SLICES
+
+DEFAULT_CHUNK_SIZE = 2**16
+TRANSITION_GROUPS = ('obs', 'action', 'next_obs')
+
+
+def save_transitions(path: str, obs: dict, actions: dict, next_obs: dict, rewards=None, terminated=None, truncated=None) -> int:
+    """Write transitions to the directory `path` (arrays whose first axis is the transition), returns their number.
+
+    The recorded rewards, terminations and truncations are optional, zeros/False are written if missing.
+    """
+    n = len(next(iter(obs.values())))
+    columns = {f'{group}.{key}': value
+               for group, values in zip(TRANSITION_GROUPS, (obs, actions, next_obs))
+               for key, value in values.items()}
+    columns['reward'] = np.zeros(n) if rewards is None else rewards
+    columns['terminated'] = np.zeros(n, dtype=np.bool_) if terminated is None else terminated
+    columns['truncated'] = np.zeros(n, dtype=np.bool_) if truncated is None else truncated
+    for name, value in columns.items():
+        if len(value) != n:
+            raise ValueError(f'{name} has {len(value)} transitions, expected {n}')
+    os.makedirs(path, exist_ok=True)
+    for name, value in columns.items():
+        np.save(osp.join(path, f'{name}.npy'), np.asarray(value))
+    return n
+
+
+def load_transitions(path: str, mmap: bool = True) -> dict:
+    """Read the transitions of the directory `path`: {'obs': {...}, 'action': {...}, 'next_obs': {...}, 'reward': ..., ...}.
+
+    The relabeled columns are under their full name (e.g. 'reward.vmc'). With `mmap`, the arrays are memory-mapped.
+    """
+    data = {group: {} for group in TRANSITION_GROUPS}
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith('.npy'):
+            continue
+        name = filename[:-len('.npy')]
+        value = np.load(osp.join(path, filename), mmap_mode='r' if mmap else None)
+        group, _, key = name.partition('.')
+        if group in TRANSITION_GROUPS:
+            data[group][key] = value
+        else:
+            data[name] = value
+    if not data['obs']:
+        raise FileNotFoundError(f'No transitions in {path}')
+    return data
+
+
+def rollout_to_transitions(rollout: dict, actions: list) -> dict:
+    """Transitions of a rollout returned by `run_open_loop`, to be passed to `save_transitions(path, **transitions)`."""
+    n = len(rollout['rewards'])
+    terminated = np.zeros(n, dtype=np.bool_)
+    truncated = np.zeros(n, dtype=np.bool_)
+    if n:
+        terminated[-1], truncated[-1] = rollout['terminated'], rollout['truncated']
+    return {
+        'obs': {key: value[:n] for key, value in rollout['obs'].items()},
+        'actions': {key: np.stack([np.asarray(action[key]) for action in actions[:n]]).reshape(n, -1)
+                    for key in actions[0]},
+        'next_obs': {key: value[1:n + 1] for key, value in rollout['obs'].items()},
+        'rewards': rollout['rewards'],
+        'terminated': terminated,
+        'truncated': truncated,
+    }
+
+
+def step_log_to_transitions(records: np.ndarray) -> dict:
+    """Transitions of records of the step log (see `StepLog.get_records` and `load_dump`), to be passed to `save_transitions(path, **transitions)`.
+
+    The steps whose previous observation is not in the records (e.g. the
+    first ones of the ring buffer) and the simulator failures are skipped.
+    """
+    from ..envs.sailboat_lsa.lsa_step_log import EVENT_RESET_DONE, EVENT_STEP
+
+    last_obs = {}  # env -> index of the record of its last observation
+    prev_idx, next_idx = [], []
+    for idx, (env, event, sim_failure) in enumerate(zip(records['env'], records['event'], records['sim_failure'])):
+        if event == EVENT_RESET_DONE:
+            last_obs[env] = idx
+        elif event == EVENT_STEP:
+            if sim_failure:
+                last_obs.pop(env, None)
+                continue
+            if env in last_obs:
+                prev_idx.append(last_obs[env])
+                next_idx.append(idx)
+            last_obs[env] = idx
+    prev, steps = records[prev_idx], records[next_idx]
+    return {
+        'obs': {key: prev['obs'][:, s] for key, s in OBS_SLICES},
+        'actions': {'theta_rudder': steps['action'][:, :1], 'theta_sail': steps['action'][:, 1:]},
+        'next_obs': {key: steps['obs'][:, s] for key, s in OBS_SLICES},
+        'rewards': steps['reward'],
+        'terminated': steps['terminated'],
+        'truncated': steps['truncated'],
+    }
+
+
+class PerTransition:
+    """Vectorize a per-transition function (e.g. the `reward_fn` or `stop_condition_fn` of an env) by calling it on each transition of a chunk.
+
+    It is much slower than a function written with array operations, but lets
+    the existing functions be reused. It is picklable if `fn` is (e.g. defined
+    at the top level of a module).
+    """
+
+    def __init__(self, fn: Callable[[dict, dict, dict], float], dtype=np.float64) -> None:
+        self.fn = fn
+        self.dtype = dtype
+
+    def __call__(self, obs: dict, actions: dict, next_obs: dict) -> np.ndarray:
+        n = len(next(iter(obs.values())))
+        return np.array([self.fn({key: value[i] for key, value in obs.items()},
+                                 {key: value[i] for key, value in actions.items()},
+                                 {key: value[i] for key, value in next_obs.items()})
+                         for i in range(n)], dtype=self.dtype)
+
+
+def get_column_path(path: str, kind: str, name: str) -> str:
+    return osp.join(path, f'{kind}.{name}.npy')
+
+
+def relabel_chunk(path: str, start: int, stop: int, fns: list) -> int:
+    """Evaluate the functions on the transitions [start, stop) and write their results into the (preallocated) columns `fns` = [(column path, fn)]."""
+    data = load_transitions(path)
+    obs, actions, next_obs = ({key: np.asarray(value[start:stop]) for key, value in data[group].items()}
+                              for group in TRANSITION_GROUPS)
+    for column_path, fn in fns:
+        value = np.asarray(fn(obs, actions, next_obs))
+        if value.shape != (stop - start,):
+            raise ValueError(
+                f'{fn} returned an array of shape {value.shape} for {stop - start} transitions, expected ({stop - start},)')
+        column = np.load(column_path, mmap_mode='r+')
+        column[start:stop] = value
+        column.flush()
+        del column
+    return stop - start
+
+
+def relabel(path: str, rewards: Union[Dict[str, Callable], None] = None, terminations: Union[Dict[str, Callable], None] = None, chunk_size: int = DEFAULT_CHUNK_SIZE, num_workers: Union[int, None] = None) -> List[str]:
+    """Evaluate vectorized reward and termination functions over the transitions of `path`, and write them as new columns.
+
+    Args:
+        path (str): Directory of the transitions, see `save_transitions`.
+        rewards (dict, optional): Name -> reward function `fn(obs, actions, next_obs) -> (n,) array`, written to reward.<name>.npy.
+        terminations (dict, optional): Name -> termination function `fn(obs, actions, next_obs) -> (n,) bool array`, written to terminated.<name>.npy.
+        chunk_size (int, optional): Number of transitions evaluated at once, each worker holds one chunk in memory. Defaults to 65536.
+        num_workers (int, optional): Number of processes (the functions must be picklable), 0 to evaluate the chunks in this process. Defaults to the number of CPUs.
+
+    Returns:
+        List[str]: The names of the columns written (e.g. ['reward.vmc', 'terminated.out']).
+    """
+    assert chunk_size > 0, 'chunk_size must be positive'
+    n = len(np.load(osp.join(path, 'reward.npy'), mmap_mode='r'))
+    outputs = [('reward', name, fn, np.float64) for name, fn in (rewards or {}).items()] + \
+        [('terminated', name, fn, np.bool_) for name, fn in (terminations or {}).items()]
+    for kind, name, _, _ in outputs:
+        if not name or '.' in name or os.sep in name:
+            raise ValueError(f'Invalid column name: {name}')
+
+    # written to temporary files first, a failed relabeling leaves the previous columns untouched
+    fns = []
+    for kind, name, fn, dtype in outputs:
+        tmp_path = get_column_path(path, kind, name) + '.tmp'
+        np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(n,)).flush()
+        fns.append((tmp_path, fn))
+    chunks = [(start, min(start + chunk_size, n)) for start in range(0, n, chunk_size)]
+    try:
+        if num_workers == 0 or len(chunks) <= 1:
+            for start, stop in chunks:
+                relabel_chunk(path, start, stop, fns)
+        else:
+            with ProcessPoolExecutor(max_workers=min(num_workers or os.cpu_count(), len(chunks))) as executor:
+                futures = [executor.submit(relabel_chunk, path, start, stop, fns)
+                           for start, stop in chunks]
+                for future in futures:
+                    future.result()
+    except BaseException:
+        for tmp_path, _ in fns:
+            os.remove(tmp_path)
+        raise
+    for (kind, name, _, _), (tmp_path, _) in zip(outputs, fns):
+        os.replace(tmp_path, get_column_path(path, kind, name))
+    return [f'{kind}.{name}' for kind, name, _, _ in outputs]
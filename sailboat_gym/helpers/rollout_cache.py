@@ -0,0 +1,210 @@
+"""On-disk cache of deterministic open-loop rollouts.
+
+An open-loop episode (the actions do not depend on the observations) is a
+deterministic function of the simulator, its rate, the seed and the input
+sequences (wind, water current and actions). Its result (trajectory or
+statistics) is stored in a file named after a hash of these inputs, so that
+it is only simulated once, even across runs and processes. The least recently
+used entries are evicted once the cache exceeds its maximum size.
+"""
+import hashlib
+import os
+import os.path as osp
+import pickle
+import tempfile
+import threading
+import numpy as np
+from typing import Any, Callable, List
+
+from ..types import Action
+
+default_cache_dir = osp.join(os.getenv('XDG_CACHE_HOME') or osp.expanduser('~/.cache'),
+                             'sailboat_gym', 'rollouts')
+
+
+def hash_value(h, value):
+    """Feed a (nested) dict/list/tuple of arrays, numbers and strings to the hash `h`, arrays are hashed by value."""
+    if isinstance(value, dict):
+        h.update(b'd%d' % len(value))
+        for key in sorted(value, key=str):
+            hash_value(h, key)
+            hash_value(h, value[key])
+    elif isinstance(value, (list, tuple)):
+        h.update(b'l%d' % len(value))
+        for item in value:
+            hash_value(h, item)
+    elif isinstance(value, (np.ndarray, np.generic)):
+        value = np.ascontiguousarray(value)
+        h.update(f'a{value.dtype.str}{value.shape}'.encode())
+        h.update(value.tobytes())
+    else:
+        h.update(f'{type(value).__name__}:{value!r};'.encode())
+
+
+def rollout_key(env_name: str, image: str, sim_rate: int, seed: int, **inputs) -> str:
+    """Key of a rollout: hash of the env, the simulator image, the simulation rate, the seed and the input sequences.
+
+    `inputs` are the sequences fed to the simulator (e.g. winds=..., waters=..., actions=...)
+    and any other parameter changing the result (e.g. the maximum number of steps).
+    """
+    h = hashlib.sha256()
+    hash_value(h, {'env_name': env_name, 'image': image,
+                   'sim_rate': sim_rate, 'seed': seed, 'inputs': inputs})
+    return h.hexdigest()
+
+
+def get_sim_image(env) -> str:
+    """Identifier of the simulator of an env: the image of its backend, or the endpoints of an already running simulator."""
+    sim = env.unwrapped.sim
+    if sim.endpoints:
+        return ','.join(sim.endpoints)
+    return sim.backend.get_image()
+
+
+class RolloutCache:
+    """Rollout results stored on disk (one pickle file per key), evicted in least recently used order."""
+
+    def __init__(self, cache_dir: str = default_cache_dir, max_size_mb: float = 1024):
+        """
+        Args:
+            cache_dir (str, optional): Directory of the cache, it can be shared by several processes. Defaults to ~/.cache/sailboat_gym/rollouts.
+            max_size_mb (float, optional): Maximum size of the cache (in MB), the least recently used entries are removed above it. Defaults to 1024.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size_mb * 2**20
+        self.lock = threading.Lock()
+        self.nb_hits = 0
+        self.nb_misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self.__get_path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            self.nb_misses += 1
+            return default
+        except (EOFError, pickle.UnpicklingError):
+            self.nb_misses += 1
+            self.__remove(path)  # truncated or corrupted
+            return default
+        try:
+            os.utime(path)  # the modification time is the last access time
+        except OSError:
+            pass  # evicted meanwhile
+        self.nb_hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        # written to a temporary file first, readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.__get_path(key))
+        except BaseException:
+            self.__remove(tmp_path)
+            raise
+        self.evict()
+
+    def get_or_compute(self, key: str, compute_fn: Callable[[], Any]) -> Any:
+        """Return the cached value of `key`, or compute and store it."""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute_fn()
+            self.put(key, value)
+        return value
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in its maximum size."""
+        with self.lock:
+            entries = self.__list_entries()
+            size = sum(entry_size for _, _, entry_size in entries)
+            for _, path, entry_size in sorted(entries):
+                if size <= self.max_size:
+                    break
+                self.__remove(path)
+                size -= entry_size
+
+    def size(self) -> int:
+        """Size of the cache in bytes."""
+        return sum(entry_size for _, _, entry_size in self.__list_entries())
+
+    def clear(self) -> None:
+        for _, path, _ in self.__list_entries():
+            self.__remove(path)
+
+    def __contains__(self, key: str) -> bool:
+        return osp.exists(self.__get_path(key))
+
+    def __len__(self) -> int:
+        return len(self.__list_entries())
+
+    def __get_path(self, key):
+        return osp.join(self.cache_dir, f'{key}.pkl')
+
+    def __list_entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.name.endswith('.pkl'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue  # removed by another process
+            entries.append((stat.st_mtime, entry.path, stat.st_size))
+        return entries
+
+    def __remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def run_open_loop(env, actions: List[Action], seed: int = 0, cache: RolloutCache = None, **key_extra) -> dict:
+    """Reset `env` and play `actions` until the end of the episode, the rollout is read from `cache` if it was already simulated.
+
+    The env is always reset, the key is then built from the wind and water sequences of the env (the default
+    random ones are drawn from the generator seeded by this reset), the actions, the seed and `key_extra`.
+    The reward function, the stop condition and the wrappers of the env are not part of it:
+    pass a `key_extra` (e.g. reward='vmc') to tell them apart.
+
+    Returns:
+        dict: The observations (stacked, the initial one first), the rewards, and whether the episode was terminated or truncated.
+    """
+    unwrapped = env.unwrapped
+    nb_steps = len(actions)
+    initial_obs, _ = env.reset(seed=seed)
+
+    def run():
+        observations, rewards = [initial_obs], []
+        terminated = truncated = False
+        for action in actions:
+            obs, reward, terminated, truncated, _ = env.step(action)
+            observations.append(obs)
+            rewards.append(reward)
+            if terminated or truncated:
+                break
+        return {
+            'obs': {key: np.stack([o[key] for o in observations]) for key in observations[0]},
+            'rewards': np.array(rewards, dtype=np.float64),
+            'terminated': bool(terminated),
+            'truncated': bool(truncated),
+        }
+
+    if cache is None:
+        return run()
+    # after the seeded reset, the wind and water sequences are the ones the rollout is simulated with
+    key = rollout_key(env.spec.id if env.spec else type(unwrapped).__name__,
+                      get_sim_image(env),
+                      unwrapped.NB_STEPS_PER_SECONDS,
+                      seed,
+                      winds=[np.asarray(unwrapped.wind_generator_fn(t)) for t in range(nb_steps + 1)],
+                      waters=[np.asarray(unwrapped.water_generator_fn(t)) for t in range(nb_steps + 1)],
+                      actions=[{k: np.asarray(v) for k, v in action.items()} for action in actions],
+                      max_episode_steps=unwrapped.max_episode_steps,
+                      **key_extra)
+    return cache.get_or_compute(key, run)
@@ -1 +1,3 @@
 from .cv_2d_renderer import CV2DRenderer
+from .raster_renderer import RasterRenderer
+from .deferred_renderer import DeferredRenderer
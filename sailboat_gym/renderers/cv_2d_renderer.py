@@ -66,12 +66,32 @@ class RendererObservation(metaclass=ProfilingMeta):
 
 
 class CV2DRenderer(AbcRender):
-    def __init__(self, size=512, padding=30, vector_scale=10, style={}):
+    def __init__(self, size=512, padding=30, vector_scale=10, style={}, trail=False, trail_every=1, trail_fade=1.):
+        """
+        Args:
+            size (int, optional): Width and height of the frames (in pixels). Defaults to 512.
+            padding (int, optional): Margin around the map (in pixels). Defaults to 30.
+            vector_scale (int, optional): Scale of the velocity, wind and water arrows. Defaults to 10.
+            style (dict, optional): Overrides of the default style (colors, widths, sizes...). Defaults to {}.
+            trail (bool, optional): Draw the path of the boat since the last `setup()`. Each frame only draws the newest segment on a persistent layer, the cost of a frame does not grow with the episode. Defaults to False.
+            trail_every (int, optional): Draw a segment of the trail every `trail_every` frames (decimation). Defaults to 1.
+            trail_fade (float, optional): Fraction of the intensity of the trail kept at each frame, e.g. .99 to fade out the old segments. Defaults to 1 (no fading).
+        """
+        assert trail_every >= 1, 'trail_every must be at least 1'
+        assert 0 < trail_fade <= 1, 'trail_fade must be in (0, 1]'
         self.size = size
         self.padding = padding
         self.vector_scale = vector_scale
         self.map_bounds = None
         self.center = None
+        self.trail = trail
+        self.trail_every = trail_every
+        self.trail_fade = trail_fade
+        self.background = None  # empty frame, copied by each frame
+        self.trail_layer = None  # background with the trail drawn so far
+        self.trail_last_point = None
+        self.trail_nb_frames = 0
+        self.trail_pending_fade = 1.  # fading not applied to the layer yet
 
         self.style = {
             "background": WHITE,
@@ -123,6 +143,10 @@ class CV2DRenderer(AbcRender):
                 "color": rgba(CYAN, .5),
                 "width": 2,
             },
+            "trail": {
+                "color": rgba(BLUE, .6),
+                "width": 1,
+            },
         }
         self.style = deep_update(self.style, style)
 
@@ -287,6 +311,27 @@ class CV2DRenderer(AbcRender):
                         tipLength=.2,
                         line_type=cv2.LINE_AA)
 
+    def _update_trail(self, obs: RendererObservation):
+        if self.trail_fade < 1:
+            # uint8 colors only move towards the background by steps of at least 10%,
+            # smaller steps would be lost to rounding
+            self.trail_pending_fade *= self.trail_fade
+            if self.trail_pending_fade <= .9:
+                cv2.addWeighted(self.trail_layer, self.trail_pending_fade,
+                                self.background, 1 - self.trail_pending_fade,
+                                0, dst=self.trail_layer)
+                self.trail_pending_fade = 1.
+        if self.trail_nb_frames % self.trail_every == 0:
+            if self.trail_last_point is not None:
+                cv2.line(self.trail_layer,
+                         tuple(self.trail_last_point.astype(int)),
+                         tuple(obs.p_boat.astype(int)),
+                         self.style["trail"]["color"],
+                         self.style["trail"]["width"],
+                         lineType=cv2.LINE_AA)
+            self.trail_last_point = obs.p_boat
+        self.trail_nb_frames += 1
+
     def _draw_boat_center(self, img: np.ndarray, obs: RendererObservation):
         cv2.circle(img,
                    tuple(obs.p_boat.astype(int)),
@@ -303,17 +348,26 @@ class CV2DRenderer(AbcRender):
     def setup(self, map_bounds):
         self.map_bounds = map_bounds[:, 0:2]  # ignore z axis
         self.center = (self.map_bounds[0] + self.map_bounds[1]) / 2
+        self.background = self._create_empty_img()
+        self.trail_layer = self.background.copy() if self.trail else None
+        self.trail_last_point = None
+        self.trail_nb_frames = 0
+        self.trail_pending_fade = 1.
 
     def render(self, observation, draw_extra_fct=None):
         assert (self.map_bounds is not None
                 and self.center is not None), "Please call setup() first."
 
-        img = self._create_empty_img()
-
         # prepare observation
         obs = RendererObservation(observation)
         self._transform_obs_to_fit_in_img(obs)
 
+        if self.trail:
+            self._update_trail(obs)
+            img = self.trail_layer.copy()
+        else:
+            img = self.background.copy()
+
         # draw extra stuff
         if draw_extra_fct is not None:
             draw_extra_fct(img, observation)
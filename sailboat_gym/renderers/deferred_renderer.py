@@ -0,0 +1,162 @@
+import threading
+import numpy as np
+from collections import deque
+from concurrent.futures import Future, wait
+from typing import List, Union
+
+from ..types import Observation
+from ..abstracts import AbcRender
+
+
+class DeferredRenderer(AbcRender):
+    """Render in a background thread so that the rollout never waits for drawing.
+
+    `render` enqueues a copy of the observation and returns the most recently
+    completed frame, which lags behind the simulation by the number of pending
+    frames. Only every `every`-th frame is rendered, and at most `max_pending`
+    frames wait for the worker: when the queue is full, the oldest (or the
+    newest, see `drop`) frame is dropped. An exception raised by the wrapped
+    renderer is re-raised by the next `render`, `flush` or `close` call.
+    """
+
+    def __init__(self, renderer: AbcRender, every: int = 1, max_pending: int = 2, drop: str = 'oldest'):
+        """
+        Args:
+            renderer (AbcRender): Renderer used by the background thread (e.g. CV2DRenderer).
+            every (int, optional): Render one frame out of `every` calls, the other calls return the last frame. Defaults to 1.
+            max_pending (int, optional): Maximum number of frames waiting to be rendered. Defaults to 2.
+            drop (str, optional): Frame dropped when the queue is full, 'oldest' (the pending one) or 'newest' (the new one). Defaults to 'oldest'.
+        """
+        assert every >= 1, 'every must be at least 1'
+        assert max_pending >= 1, 'max_pending must be at least 1'
+        assert drop in ('oldest', 'newest'), 'drop must be either oldest or newest'
+        self.renderer = renderer
+        self.every = every
+        self.max_pending = max_pending
+        self.drop = drop
+
+        self.cond = threading.Condition()
+        self.tasks = deque()  # (kind, args, future), setups are never dropped
+        self.nb_pending = 0  # number of frames in the queue
+        self.busy = False
+        self.closed = False
+        self.thread = None
+        self.last_frame = None
+        self.error = None  # last exception of the worker, not raised yet
+
+        self.nb_calls = 0
+        self.nb_rendered = 0
+        self.nb_skipped = 0  # by decimation
+        self.nb_dropped = 0  # because the queue was full
+
+    def get_render_mode(self) -> str:
+        return self.renderer.get_render_mode()
+
+    def get_render_modes(self) -> List[str]:
+        return self.renderer.get_render_modes()
+
+    def setup(self, map_bounds) -> None:
+        self.__submit('setup', (np.array(map_bounds),), Future())
+
+    def render_async(self, observation: Observation, draw_extra_fct=None) -> Union[Future, None]:
+        """Enqueue the observation, returns a future of the frame or None if the frame is skipped by the decimation.
+
+        The future is cancelled if the frame is dropped.
+        """
+        with self.cond:
+            idx = self.nb_calls
+            self.nb_calls += 1
+            if idx % self.every:
+                self.nb_skipped += 1
+                return None
+        obs = {key: np.array(value) for key, value in observation.items()}
+        return self.__submit('render', (obs, draw_extra_fct), Future())
+
+    def render(self, observation: Observation, draw_extra_fct=None) -> np.ndarray:
+        """Enqueue the observation and return the most recently completed frame, only the first frame is waited for."""
+        future = self.render_async(observation, draw_extra_fct)
+        with self.cond:
+            last_frame = self.last_frame
+        if last_frame is None and future is not None:
+            wait([future])
+        with self.cond:
+            self.__raise_error()
+        if last_frame is None and future is not None:
+            return future.result()
+        return last_frame
+
+    def flush(self, timeout: float = None) -> bool:
+        """Wait until all the pending frames are rendered, returns False on timeout."""
+        with self.cond:
+            done = self.cond.wait_for(lambda: not self.tasks and not self.busy,
+                                      timeout)
+            self.__raise_error()
+            return done
+
+    def close(self) -> None:
+        """Render the pending frames and stop the background thread."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.cond:
+            self.__raise_error()
+
+    def __raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def __submit(self, kind, args, future):
+        with self.cond:
+            assert not self.closed, 'The renderer is closed'
+            if kind == 'render' and self.nb_pending >= self.max_pending:
+                self.nb_dropped += 1
+                if self.drop == 'newest':
+                    future.cancel()
+                    return future
+                oldest = next(task for task in self.tasks if task[0] == 'render')
+                self.tasks.remove(oldest)
+                self.nb_pending -= 1
+                oldest[2].cancel()
+            self.tasks.append((kind, args, future))
+            self.nb_pending += kind == 'render'
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.__work, daemon=True)
+                self.thread.start()
+            self.cond.notify_all()
+        return future
+
+    def __work(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.tasks or self.closed)
+                if not self.tasks:
+                    return
+                kind, args, future = self.tasks.popleft()
+                self.nb_pending -= kind == 'render'
+                self.busy = True
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    if kind == 'setup':
+                        result = self.renderer.setup(*args)
+                    else:
+                        result = self.renderer.render(*args)
+                except Exception as e:
+                    with self.cond:
+                        self.error = e
+                    future.set_exception(e)
+                    continue
+                if kind == 'render':
+                    with self.cond:
+                        self.last_frame = result
+                        self.nb_rendered += 1
+                future.set_result(result)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
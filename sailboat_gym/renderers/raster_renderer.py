@@ -0,0 +1,236 @@
+from typing import List
+import numpy as np
+from gymnasium import spaces
+from pydantic.utils import deep_update
+
+from ..types import Observation
+from ..abstracts import AbcRender
+
+GRAY_WEIGHTS = np.array([.299, .587, .114])
+
+
+def rotate_points(points: np.ndarray, angles: np.ndarray):
+    """Rotate points of shape (N, P, 2) by angles of shape (N,)."""
+    cos, sin = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    x, y = points[..., 0], points[..., 1]
+    return np.stack([cos * x - sin * y, sin * x + cos * y], axis=-1)
+
+
+def angles_to_vecs(angles: np.ndarray):
+    return np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+def sample_segments(starts: np.ndarray, ends: np.ndarray):
+    """Sample points every half pixel along segments of shape (N, S, 2), returns (N, S * K, 2)."""
+    length = np.linalg.norm(ends - starts, axis=-1).max(initial=0)
+    t = np.linspace(0, 1, max(2, int(np.ceil(length * 2)) + 1))
+    points = starts[..., None, :] + t[:, None] * (ends - starts)[..., None, :]
+    return points.reshape(starts.shape[0], -1, 2)
+
+
+class RasterRenderer(AbcRender):
+    """Render small images (e.g. 64x64) of a batch of boats at once, to be used as observations.
+
+    Every element (hull, sail, rudder, wind/water arrows and map borders) is
+    sampled as points for all the boats at once, which are then written into a
+    single preallocated (N, H, W, C) uint8 array, without any per-boat drawing
+    call. Sizes of the style are expressed as fractions of the image size.
+    """
+
+    def __init__(self, size=64, channels=3, egocentric=False, view_size=50, padding=None, vector_scale=10, style={}):
+        """
+        Args:
+            size (int, optional): Width and height of the images in pixels. Defaults to 64.
+            channels (int, optional): 3 for RGB images, 1 for grayscale images. Defaults to 3.
+            egocentric (bool, optional): Center the images on the boat with its heading pointing up, otherwise the whole map is rendered. Defaults to False.
+            view_size (float, optional): Width of the area around the boat rendered in egocentric mode (in meters). Defaults to 50.
+            padding (int, optional): Padding around the map in pixels. Defaults to size * 30 / 512, like CV2DRenderer.
+            vector_scale (float, optional): Scale factor of the wind/water arrows. Defaults to 10.
+            style (dict, optional): Overrides of the default style. Defaults to {}.
+        """
+        assert channels in (1, 3), 'Only 1 or 3 channels are supported'
+        self.size = size
+        self.channels = channels
+        self.egocentric = egocentric
+        self.view_size = view_size
+        self.padding = padding if padding is not None else round(size * 30 / 512)
+        self.vector_scale = vector_scale
+        self.map_bounds = None
+        self.scale = None  # pixels per meter
+        self.background = None
+        self.frames = None
+
+        self.style = {
+            "background": (255, 255, 255),
+            "border": {
+                "color": (204, 204, 204),
+            },
+            "boat": {
+                "color": (178, 178, 178),
+                "spike_coef": 2,
+                "size": 1 / 16,
+                "phi": np.deg2rad(40),
+            },
+            "rudder": {
+                "color": (178, 178, 178),
+                "height": 1 / 32,
+            },
+            "sail": {
+                "color": (76, 76, 76),
+                "height": 3 / 32,
+            },
+            "wind": {
+                "color": (127, 127, 255),
+            },
+            "water": {
+                "color": (127, 255, 255),
+            },
+        }
+        self.style = deep_update(self.style, style)
+        self.colors = {name: self._to_channels(value["color"] if isinstance(value, dict) else value)
+                       for name, value in self.style.items()}
+        self.hull_points = self._sample_hull()
+
+    @property
+    def observation_space(self) -> spaces.Box:
+        return spaces.Box(low=0, high=255,
+                          shape=(self.size, self.size, self.channels),
+                          dtype=np.uint8)
+
+    def _to_channels(self, color):
+        color = np.array(color, dtype=np.float64)
+        if self.channels == 1:
+            color = color[:3] @ GRAY_WEIGHTS
+        return np.round(color).astype(np.uint8)
+
+    def _sample_hull(self):
+        """Points covering the hull in the boat frame (heading along x), in pixels."""
+        boat_size = self.style["boat"]["size"] * self.size
+        phi = self.style["boat"]["phi"]
+        spike = self.style["boat"]["spike_coef"]
+        angles = np.array([phi, np.pi - phi, np.pi + phi, -phi])
+        vertices = np.concatenate([angles_to_vecs(angles),
+                                   [[spike, 0]]]) * boat_size  # counterclockwise
+        lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+        xs, ys = np.meshgrid(np.arange(lo[0], hi[0] + .5, .5),
+                             np.arange(lo[1], hi[1] + .5, .5))
+        grid = np.stack([xs.ravel(), ys.ravel()], axis=-1)
+        edges = np.roll(vertices, -1, axis=0) - vertices
+        rel = grid[:, None, :] - vertices[None, :, :]
+        cross = edges[None, :, 0] * rel[..., 1] - edges[None, :, 1] * rel[..., 0]
+        inside = (cross >= -1e-9).all(axis=1)
+        return np.concatenate([grid[inside], vertices])
+
+    def _to_px(self, positions: np.ndarray, boat_positions: np.ndarray, boat_angles: np.ndarray):
+        """Convert world positions of shape (N, P, 2) to pixels."""
+        if not self.egocentric:
+            return (positions - self.map_bounds[0]) * self.scale + self.padding
+        rel = positions - boat_positions[:, None, :]
+        return rotate_points(rel, np.pi / 2 - boat_angles) * self.scale + self.size / 2
+
+    def _arrows(self, starts: np.ndarray, ends: np.ndarray):
+        """Sample points along arrows of shape (N, 2), the head is 20% of the length like cv2.arrowedLine."""
+        back = (starts - ends)[:, None, :] * .2
+        n = len(starts)
+        barbs = ends[:, None, :] + np.concatenate([rotate_points(back, np.full(n, np.pi / 6)),
+                                                   rotate_points(back, np.full(n, -np.pi / 6))], axis=1)
+        return sample_segments(
+            np.concatenate([starts[:, None], ends[:, None], ends[:, None]], axis=1),
+            np.concatenate([ends[:, None], barbs], axis=1))
+
+    def _splat(self, frames: np.ndarray, points: np.ndarray, color: np.ndarray):
+        """Write the points of shape (N, P, 2) (x, y in pixels, y up) into the frames."""
+        n, p = points.shape[:2]
+        cols = np.rint(points[..., 0]).astype(np.intp)
+        rows = self.size - 1 - np.rint(points[..., 1]).astype(np.intp)  # flip vertically
+        valid = (cols >= 0) & (cols < self.size) & (rows >= 0) & (rows < self.size)
+        idx = np.broadcast_to(np.arange(n)[:, None], (n, p))
+        frames[idx[valid], rows[valid], cols[valid]] = color
+
+    def get_render_mode(self) -> str:
+        return 'rgb_array'
+
+    def get_render_modes(self) -> List[str]:
+        return ['rgb_array']
+
+    def setup(self, map_bounds):
+        self.map_bounds = np.asarray(map_bounds, dtype=np.float64)[:, 0:2]  # ignore z axis
+        extent = self.view_size if self.egocentric \
+            else (self.map_bounds[1] - self.map_bounds[0]).max()
+        self.scale = (self.size - 2 * self.padding) / extent
+        self.background = np.empty((self.size, self.size, self.channels),
+                                   dtype=np.uint8)
+        self.background[:] = self.colors["background"]
+        if not self.egocentric:
+            # the borders do not move, draw them once
+            self._draw_borders(self.background[None], np.zeros((1, 2)), np.zeros(1))
+
+    def _draw_borders(self, frames, boat_positions, boat_angles):
+        (x0, y0), (x1, y1) = self.map_bounds
+        corners = np.array([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+        corners = np.broadcast_to(corners, (len(frames), 4, 2))
+        corners = self._to_px(corners, boat_positions, boat_angles)
+        self._splat(frames, sample_segments(corners, np.roll(corners, -1, axis=1)),
+                    self.colors["border"])
+
+    def render_batch(self, observations, out: np.ndarray = None) -> np.ndarray:
+        """Render the stacked observations of N boats (dict of arrays of shape (N, ...), as returned by vector envs).
+
+        The images are written into `out` if provided, otherwise into a buffer owned by the renderer
+        which is overwritten by the next call.
+        """
+        assert self.map_bounds is not None, "Please call setup() first."
+        p_boat = np.asarray(observations["p_boat"], dtype=np.float64)[:, 0:2]
+        theta_boat = np.asarray(observations["theta_boat"], dtype=np.float64)[:, 2]
+        theta_rudder = np.asarray(observations["theta_rudder"], dtype=np.float64)[:, 0]
+        theta_sail = np.asarray(observations["theta_sail"], dtype=np.float64)[:, 0]
+        n = len(p_boat)
+
+        if out is None:
+            if self.frames is None or len(self.frames) != n:
+                self.frames = np.empty((n, self.size, self.size, self.channels),
+                                       dtype=np.uint8)
+            out = self.frames
+        out[:] = self.background
+
+        if self.egocentric:
+            self._draw_borders(out, p_boat, theta_boat)
+            centers = np.full((n, 2), self.size / 2)
+            headings = np.full(n, np.pi / 2)
+            view_rotation = np.pi / 2 - theta_boat
+        else:
+            centers = self._to_px(p_boat[:, None], p_boat, theta_boat)[:, 0]
+            headings = theta_boat
+            view_rotation = np.zeros(n)
+
+        # wind and water arrows start from the center of the image
+        img_centers = np.full((n, 2), self.size / 2)
+        for name in ["wind", "water"]:
+            vectors = np.asarray(observations[name], dtype=np.float64)[:, None, 0:2]
+            vectors = rotate_points(vectors, view_rotation)[:, 0]
+            ends = img_centers + vectors * self.scale * self.vector_scale
+            self._splat(out, self._arrows(img_centers, ends), self.colors[name])
+
+        hull = centers[:, None, :] + \
+            rotate_points(np.broadcast_to(self.hull_points, (n,) + self.hull_points.shape), headings)
+        self._splat(out, hull, self.colors["boat"])
+
+        boat_size = self.style["boat"]["size"] * self.size
+        rudder_starts = centers + angles_to_vecs(np.pi + headings) * \
+            np.cos(self.style["boat"]["phi"]) * boat_size
+        rudder_ends = rudder_starts + angles_to_vecs(np.pi + headings + theta_rudder) * \
+            self.style["rudder"]["height"] * self.size
+        self._splat(out, sample_segments(rudder_starts[:, None], rudder_ends[:, None]),
+                    self.colors["rudder"])
+
+        sail_ends = centers + angles_to_vecs(np.pi + headings + theta_sail) * \
+            self.style["sail"]["height"] * self.size
+        self._splat(out, sample_segments(centers[:, None], sail_ends[:, None]),
+                    self.colors["sail"])
+        return out
+
+    def render(self, observation: Observation, draw_extra_fct=None) -> np.ndarray:
+        assert draw_extra_fct is None, 'draw_extra_fct is not supported by RasterRenderer'
+        batch = {key: np.asarray(value)[None] for key, value in observation.items()}
+        frames = np.empty((1, self.size, self.size, self.channels), dtype=np.uint8)
+        return self.render_batch(batch, out=frames)[0]
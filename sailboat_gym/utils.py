@@ -2,7 +2,6 @@ import time
 import atexit
 import os
 import functools
-import tqdm
 import threading
 
 
@@ -28,6 +27,7 @@ def is_profiling_all():
 
 class DurationProgress:
     def __init__(self, *args, **kwargs):
+        import tqdm  # only needed when launching/stopping containers
         self.pbar = tqdm.tqdm(*args, **kwargs,
                               leave=False,
                               bar_format='{desc}: {n_fmt}s/{total_fmt}s (may exceed estimated time)')
@@ -54,27 +54,31 @@ class DurationProgress:
 
 def profiling(func, prefix=''):
     stats = {'count': 0, 'first_call_time': None, 'duration': 0}
+    lock = threading.Lock()  # the wrapped methods are shared by the instances driven by different threads
 
     def flush():
-        freq = stats['count'] / (time.time() - stats['first_call_time'])
-        mean_duration = stats['duration'] / stats['count']
-        print(f'[{prefix + func.__name__}]\tcount: {stats["count"]}\tfreq: {freq:.2f}/s\tduration: ~{mean_duration / 1e-3:.2f}ms')
+        with lock:
+            count, first_call_time, duration = stats['count'], stats['first_call_time'], stats['duration']
+        freq = count / (time.time() - first_call_time)
+        mean_duration = duration / count
+        print(f'[{prefix + func.__name__}]\tcount: {count}\tfreq: {freq:.2f}/s\tduration: ~{mean_duration / 1e-3:.2f}ms')
 
     def wrapper(*args, **kwargs):
         if not is_profiling():
             return func(*args, **kwargs)
 
-        # register flush function to be called at exit
-        if stats['first_call_time'] is None:
-            stats['first_call_time'] = time.time()
-            atexit.register(flush)
-
-        stats['count'] += 1
         t0 = time.time()
-        res = func(*args, **kwargs)
-        t1 = time.time()
-        stats['duration'] += t1 - t0
-        return res
+        try:
+            return func(*args, **kwargs)
+        finally:
+            t1 = time.time()
+            with lock:
+                # register flush function to be called at exit
+                if stats['first_call_time'] is None:
+                    stats['first_call_time'] = t0
+                    atexit.register(flush)
+                stats['count'] += 1
+                stats['duration'] += t1 - t0
     return wrapper
 
 
@@ -0,0 +1,2 @@
+from .pixel_observation import BatchPixelObservation
+from .observation_history import ObservationHistory, BatchObservationHistory
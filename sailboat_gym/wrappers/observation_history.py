@@ -0,0 +1,165 @@
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv, VectorEnvWrapper
+from gymnasium.vector.utils import batch_space
+
+
+class HistoryBuffer:
+    """Last `k` observations of a dict space, in preallocated ring buffers.
+
+    The flat fields sharing a dtype (e.g. the 20 float32 of an Observation)
+    are stored side by side in a single buffer of shape (*batch_shape, 2k,
+    width), other fields (e.g. images) in their own buffer. Each observation
+    is written twice, at `pos` and `pos + k`, so that the last `k` ones are
+    always the contiguous slots `pos + 1 ... pos + k`: the history is a view,
+    in chronological order, and a step costs the same whatever `k`.
+    """
+
+    def __init__(self, space: spaces.Dict, k: int, batch_shape=()) -> None:
+        assert k > 0, 'k must be positive'
+        self.k = k
+        self.batch_shape = tuple(batch_shape)
+        self.pos = 0  # slot of the next observation
+        self.buffers = []
+        self.fields = {}  # key -> (buffer index, slice of the last axis or None)
+        widths = {}  # dtype -> (buffer index, width)
+        for key, field_space in space.spaces.items():
+            if len(field_space.shape) == 1:
+                idx, width = widths.get(field_space.dtype, (None, 0))
+                if idx is None:
+                    idx = len(self.buffers)
+                    self.buffers.append(None)  # allocated once its width is known
+                widths[field_space.dtype] = (idx, width + field_space.shape[0])
+                self.fields[key] = (idx, slice(width, width + field_space.shape[0]))
+            else:
+                self.fields[key] = (len(self.buffers), None)
+                self.buffers.append(np.zeros((*self.batch_shape, 2 * k, *field_space.shape),
+                                             dtype=field_space.dtype))
+        for dtype, (idx, width) in widths.items():
+            self.buffers[idx] = np.zeros((*self.batch_shape, 2 * k, width), dtype=dtype)
+        self.time_axis = len(self.batch_shape)
+
+    def push(self, obs) -> None:
+        """Append an observation (batched if `batch_shape` is given)."""
+        slot = self.__slot(self.pos)
+        for key, (idx, s) in self.fields.items():
+            self.buffers[idx][slot + ((s,) if s is not None else ())] = obs[key]
+        mirror = self.__slot(self.pos + self.k)
+        for buffer in self.buffers:
+            buffer[mirror] = buffer[slot]
+        self.pos = (self.pos + 1) % self.k
+
+    def fill(self, obs, mask=None) -> None:
+        """Replace the whole history by `obs` (e.g. the first observation of an episode), only for the batch elements of `mask` if given."""
+        rows = (np.flatnonzero(mask),) if mask is not None \
+            else (slice(None),) * self.time_axis
+        for key, (idx, s) in self.fields.items():
+            value = np.asarray(obs[key])[rows]
+            window = rows + (slice(None),) + ((s,) if s is not None else ())
+            self.buffers[idx][window] = np.expand_dims(value, self.time_axis)
+
+    def get(self) -> dict:
+        """Views on the last `k` observations, oldest first, along the axis following the batch axes."""
+        window = self.__slot(slice(self.pos, self.pos + self.k))
+        return {key: self.buffers[idx][window + ((s,) if s is not None else ())]
+                for key, (idx, s) in self.fields.items()}
+
+    def __slot(self, idx):
+        return (slice(None),) * self.time_axis + (idx,)
+
+
+def get_history_space(space: spaces.Dict, k: int) -> spaces.Dict:
+    return spaces.Dict({
+        key: spaces.Box(low=np.repeat(field_space.low[None], k, axis=0),
+                        high=np.repeat(field_space.high[None], k, axis=0),
+                        dtype=field_space.dtype)
+        for key, field_space in space.spaces.items()
+    })
+
+
+class ObservationHistory(gym.ObservationWrapper):
+    """Replace each field of the observations by its last `k` values, of shape (k, *shape), oldest first.
+
+    Unlike gymnasium's FrameStack, the history is not concatenated at every
+    step: the fields are views on a ring buffer (see `HistoryBuffer`). At the
+    start of an episode (on reset, or after a step ending the episode with the
+    `autoreset` option), the history is filled with the first observation.
+    """
+
+    def __init__(self, env: gym.Env, k: int, copy: bool = False):
+        """
+        Args:
+            env (gym.Env): Sailboat environment (or any environment with dict observations of Box spaces).
+            k (int): Number of observations kept.
+            copy (bool, optional): Return a copy of the history, otherwise its arrays are views overwritten by the next steps. Defaults to False.
+        """
+        super().__init__(env)
+        self.k = k
+        self.copy = copy
+        self.history = HistoryBuffer(env.observation_space, k)
+        self.observation_space = get_history_space(env.observation_space, k)
+        self.episode_ended = False
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.history.fill(obs)
+        self.episode_ended = False
+        return self.observation(None), info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        if self.episode_ended:
+            # the observation is the first one of the next episode
+            self.history.fill(obs)
+        else:
+            self.history.push(obs)
+        self.episode_ended = terminated or truncated
+        return self.observation(None), reward, terminated, truncated, info
+
+    def observation(self, _):
+        history = self.history.get()
+        if self.copy:
+            return {key: value.copy() for key, value in history.items()}
+        return history
+
+
+class BatchObservationHistory(VectorEnvWrapper):
+    """Replace each field of the observations of a vector env by its last `k` values, of shape (num_envs, k, *shape), oldest first.
+
+    The history of the environments reset by the vector env (their episode
+    ended at this step) is filled with their first observation.
+    """
+
+    def __init__(self, env: VectorEnv, k: int, copy: bool = False):
+        """
+        Args:
+            env (VectorEnv): Vector env of sailboat environments, e.g. SailboatLSAVectorEnv or RemoteVectorEnv.
+            k (int): Number of observations kept.
+            copy (bool, optional): Return a copy of the history, otherwise its arrays are views overwritten by the next steps. Defaults to False.
+        """
+        super().__init__(env)
+        self.k = k
+        self.copy = copy
+        self.history = HistoryBuffer(env.single_observation_space, k, (env.num_envs,))
+        self.single_observation_space = get_history_space(env.single_observation_space, k)
+        self.observation_space = batch_space(self.single_observation_space, env.num_envs)
+
+    def reset_wait(self, **kwargs):
+        obs, info = self.env.reset_wait(**kwargs)
+        self.history.fill(obs)
+        return self.__get_obs(), info
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, info = self.env.step_wait()
+        self.history.push(obs)
+        dones = np.logical_or(terminated, truncated)
+        if dones.any():
+            self.history.fill(obs, dones)
+        return self.__get_obs(), rewards, terminated, truncated, info
+
+    def __get_obs(self):
+        history = self.history.get()
+        if self.copy:
+            return {key: value.copy() for key, value in history.items()}
+        return history
@@ -0,0 +1,41 @@
+from gymnasium import spaces
+from gymnasium.vector import VectorEnv, VectorEnvWrapper
+from gymnasium.vector.utils import batch_space
+
+
+class BatchPixelObservation(VectorEnvWrapper):
+    """Add images of the boats of a vector env to the observations under the 'pixels' key.
+
+    The images of all the boats are rendered at once in the main process with
+    `renderer.render_batch` (e.g. RasterRenderer), instead of once per boat in
+    every sub-environment like the `pixel_obs` option of the environment.
+    """
+
+    def __init__(self, env: VectorEnv, renderer, copy: bool = True):
+        """
+        Args:
+            env (VectorEnv): Vector env of sailboat environments.
+            renderer (RasterRenderer): Renderer providing `render_batch` and `observation_space`.
+            copy (bool, optional): Return a copy of the images, otherwise they are overwritten by the next step. Defaults to True.
+        """
+        super().__init__(env)
+        self.renderer = renderer
+        self.copy = copy
+        self.single_observation_space = spaces.Dict({**env.single_observation_space.spaces,
+                                                     'pixels': renderer.observation_space})
+        self.observation_space = batch_space(self.single_observation_space,
+                                             env.num_envs)
+
+    def reset_wait(self, **kwargs):
+        obs, info = self.env.reset_wait(**kwargs)
+        # all the environments share the same map
+        self.renderer.setup(info['map_bounds'][0])
+        return self.__add_pixels(obs), info
+
+    def step_wait(self):
+        obs, rewards, terminated, truncated, info = self.env.step_wait()
+        return self.__add_pixels(obs), rewards, terminated, truncated, info
+
+    def __add_pixels(self, obs):
+        pixels = self.renderer.render_batch(obs)
+        return {**obs, 'pixels': pixels.copy() if self.copy else pixels}
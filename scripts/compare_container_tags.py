@@ -0,0 +1,195 @@
+"""Compare the accuracy and the speed of the simulator images (container tags).
+
+The same scenarios are simulated with each container tag (physics step size
+and engine, see `CONTAINER_TAGS`), and compared with the reference tag (the
+finest physics, first tag by default):
+
+- speed: environment steps per second (time spent in `env.step`),
+- trajectory deviation: distance between the positions of the boat along
+  open-loop trajectories (sail and rudder maneuvers under a constant wind),
+- polar deviation: error on the best VMC of each wind angle (best over the
+  sail angles of a coarse grid), and VMC lost by using the best sail angles of
+  the tag instead of the ones of the reference.
+
+With --stand-in, the stand-in simulator is run instead of the docker images,
+integrating each step with the physics step size of the tag.
+
+Usage:
+    python3 scripts/compare_container_tags.py --tags=mss1-ode,mss2-ode,mss4-ode,mss4-bullet
+    python3 scripts/compare_container_tags.py --stand-in
+"""
+import sys
+sys.path.append('..')  # noqa
+sys.path.append('.')  # noqa
+
+import json
+import time
+import os.path as osp
+import click
+import numpy as np
+import gymnasium as gym
+
+import sailboat_gym
+from sailboat_gym import SubprocessBackend, CONTAINER_TAGS, env_by_name
+from sailboat_gym.envs.sailboat_lsa.lsa_backends import parse_container_tag
+
+root_dir = osp.dirname(osp.dirname(osp.abspath(sailboat_gym.__file__)))
+
+STAND_IN_COMMAND = [sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in',
+                    '--bind={endpoint}']
+
+TRAJECTORY_WIND_ANGLES = [0, 45, 90, 135]  # degrees
+POLAR_SAIL_STEP = 15  # degrees
+
+
+class ConstantWind:
+    """Wind of the current scenario, shared by the steps of the episode."""
+
+    def __init__(self, velocity):
+        self.velocity = velocity
+        self.theta = 0
+
+    def __call__(self, _):
+        theta = np.deg2rad(self.theta)
+        return np.array([np.cos(theta), np.sin(theta)]) * self.velocity
+
+
+def still_water(_):
+    return np.zeros(2)
+
+
+def create_env(env_name, tag, wind, stand_in=False):
+    kwargs = {}
+    if stand_in:
+        max_step_size, _ = parse_container_tag(tag)
+        kwargs['sim_backend'] = SubprocessBackend(
+            STAND_IN_COMMAND + [f'--max-step-size={max_step_size}'], cwd=root_dir)
+    else:
+        kwargs['container_tag'] = tag
+    return gym.make(env_name,
+                    wind_generator_fn=wind,
+                    water_generator_fn=still_water,
+                    name=f'compare-{tag}',
+                    **kwargs)
+
+
+def get_ctrl(theta_rudder, theta_sail):
+    return {'theta_rudder': np.array(np.deg2rad(theta_rudder)),
+            'theta_sail': np.array(np.deg2rad(theta_sail))}
+
+
+def get_maneuvers(nb_steps):
+    """Open-loop action sequences: the sail and the rudder sweep back and forth."""
+    t = np.arange(nb_steps)
+    return [
+        [get_ctrl(20 * np.sin(2 * np.pi * i / nb_steps), 30) for i in t],
+        [get_ctrl(10, 60 * np.sin(4 * np.pi * i / nb_steps)) for i in t],
+    ]
+
+
+def get_vmc(obs):
+    return obs['dt_p_boat'][0]  # velocity along the heading of the boat
+
+
+def run_episode(env, actions):
+    """Return the observations after each action and the time spent stepping the simulator."""
+    env.reset(seed=0)
+    observations, step_time = [], 0
+    for action in actions:
+        t0 = time.perf_counter()
+        obs, *_ = env.step(action)
+        step_time += time.perf_counter() - t0
+        observations.append(obs)
+    return observations, step_time
+
+
+def run_scenarios(env, wind, nb_steps):
+    """Simulate the trajectories and the polar, returns the results and the speed of the simulator."""
+    results = {'trajectories': [], 'polar': {}}
+    total_steps, total_time = 0, 0
+    for theta_wind in TRAJECTORY_WIND_ANGLES:
+        wind.theta = theta_wind
+        for actions in get_maneuvers(nb_steps):
+            observations, step_time = run_episode(env, actions)
+            results['trajectories'].append(np.array([obs['p_boat'][:2] for obs in observations]))
+            total_steps, total_time = total_steps + len(actions), total_time + step_time
+    for theta_wind in range(0, 181, 30):
+        wind.theta = theta_wind
+        for theta_sail in range(-90, 91, POLAR_SAIL_STEP):
+            observations, step_time = run_episode(env, [get_ctrl(0, theta_sail)] * nb_steps)
+            results['polar'][theta_wind, theta_sail] = max(get_vmc(obs) for obs in observations)
+            total_steps, total_time = total_steps + nb_steps, total_time + step_time
+    results['steps_per_s'] = total_steps / total_time
+    return results
+
+
+def best_sails(polar):
+    """Best VMC and best sail angle (the smallest one on ties) of each wind angle."""
+    best = {}
+    for (theta_wind, theta_sail), vmc in sorted(polar.items(), key=lambda item: abs(item[0][1])):
+        if theta_wind not in best or vmc > best[theta_wind][0]:
+            best[theta_wind] = (vmc, theta_sail)
+    return best
+
+
+def compare(reference, candidate):
+    distances = np.concatenate([np.linalg.norm(traj - ref_traj, axis=-1)
+                                for traj, ref_traj in zip(candidate['trajectories'], reference['trajectories'])])
+    final_distances = [np.linalg.norm(traj[-1] - ref_traj[-1])
+                       for traj, ref_traj in zip(candidate['trajectories'], reference['trajectories'])]
+    ref_best, cand_best = best_sails(reference['polar']), best_sails(candidate['polar'])
+    vmc_errors = np.array([abs(cand_best[t][0] - ref_best[t][0]) for t in ref_best])
+    # VMC lost (according to the reference) when sailing with the best sail of the candidate
+    regrets = np.array([ref_best[t][0] - reference['polar'][t, cand_best[t][1]] for t in ref_best])
+    return {
+        'steps_per_s': candidate['steps_per_s'],
+        'speedup': candidate['steps_per_s'] / reference['steps_per_s'],
+        'trajectory_rmse': float(np.sqrt(np.mean(distances**2))),
+        'trajectory_final_error_max': float(np.max(final_distances)),
+        'polar_vmc_error_max': float(vmc_errors.max()),
+        'polar_vmc_error_mean': float(vmc_errors.mean()),
+        'best_sail_regret_max': float(regrets.max()),
+    }
+
+
+def print_report(report, reference_tag):
+    print(f'\nCompared with {reference_tag} (trajectory errors in m, polar errors in m/s):')
+    print(f'{"tag":<14}{"steps/s":>10}{"speed-up":>10}{"traj rmse":>11}{"traj final":>12}'
+          f'{"vmc max":>10}{"vmc mean":>10}{"regret":>10}')
+    for tag, r in report.items():
+        print(f'{tag:<14}{r["steps_per_s"]:>10.0f}{r["speedup"]:>9.2f}x{r["trajectory_rmse"]:>11.4f}'
+              f'{r["trajectory_final_error_max"]:>12.4f}{r["polar_vmc_error_max"]:>10.4f}'
+              f'{r["polar_vmc_error_mean"]:>10.4f}{r["best_sail_regret_max"]:>10.4f}')
+
+
+@click.command()
+@click.option('--env-name', default=list(env_by_name.keys())[0], help='Env name', type=click.Choice(list(env_by_name.keys()), case_sensitive=False))
+@click.option('--tags', default='mss1-ode,mss2-ode,mss4-ode', help=f'Comma-separated container tags to compare, among: {", ".join(CONTAINER_TAGS)}', type=str)
+@click.option('--reference', default=None, help='Container tag the others are compared with, defaults to the first one', type=str)
+@click.option('--wind-velocity', default=1, help='Wind velocity (m/s)', type=float)
+@click.option('--duration', default=10, help='Simulated seconds per scenario', type=int)
+@click.option('--stand-in', is_flag=True, help='Run the stand-in simulator with the physics step size of each tag instead of the docker images')
+@click.option('--json-output', default=None, help='Write the report to this JSON file', type=str)
+def main(env_name, tags, reference, wind_velocity, duration, stand_in, json_output):
+    tags = tags.split(',')
+    reference = reference or tags[0]
+    tags = [reference] + [tag for tag in tags if tag != reference]
+
+    results = {}
+    for tag in tags:
+        wind = ConstantWind(wind_velocity)
+        env = create_env(env_name, tag, wind, stand_in)
+        print(f'Simulating the scenarios with {tag}...', flush=True)
+        results[tag] = run_scenarios(env, wind, duration * env.unwrapped.NB_STEPS_PER_SECONDS)
+        env.close()
+        env.unwrapped.sim.stop()
+
+    report = {tag: compare(results[reference], results[tag]) for tag in tags}
+    print_report(report, reference)
+    if json_output:
+        with open(json_output, 'w') as f:
+            json.dump({'reference': reference, 'results': report}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,41 +3,53 @@ sys.path.append('..')  # noqa
 sys.path.append('.')  # noqa
 
 import tqdm
+import contextlib
 import pickle
 import click
 import threading
+import queue
 import os
 import os.path as osp
 import numpy as np
 import gymnasium as gym
-from collections import defaultdict
+from collections import defaultdict, deque
 from gymnasium.wrappers.time_limit import TimeLimit
 from gymnasium.wrappers.record_video import RecordVideo
 
 from sailboat_gym import CV2DRenderer, env_by_name
+from sailboat_gym.envs.sailboat_lsa.lsa_backends import CONTAINER_TAGS, DEFAULT_CONTAINER_TAG
+from sailboat_gym.helpers.get_best_sail import dict_to_df, extract_best_sail, extract_vmc
+from sailboat_gym.helpers.evaluate import ScenarioWind
+from sailboat_gym.helpers.rollout_cache import RolloutCache, rollout_key, get_sim_image, default_cache_dir
 
 current_dir = osp.dirname(osp.abspath(__file__))
 pkl_dir = osp.join(current_dir, '..', 'pkl')
 
+MAX_DURATION = 10  # seconds simulated per cell
+SAIL_MIN, SAIL_MAX = -90, 90
+SAIL_RESOLUTION = 5  # degrees, resolution of the brute-force grid
+COARSE_SAIL_STEP = 15  # degrees, first grid of the adaptive search
 
-global_theta_wind = 0
-global_wind_velocity = None
 
+def still_water(_):
+    # no random current, each cell is a deterministic function of its inputs
+    return np.zeros(2)
 
-def generate_wind(_):
-    theta_wind_rad = np.deg2rad(global_theta_wind)
-    return np.array([np.cos(theta_wind_rad), np.sin(theta_wind_rad)])*global_wind_velocity
 
-
-def create_env(env_name, i):
+def create_env(env_name, i, wind_velocity, sim_endpoint=None, container_tag=DEFAULT_CONTAINER_TAG):
+    """Each env has its own wind (nothing is shared between the threads driving the envs), its angle is set per cell."""
     assert env_name in env_by_name.keys(), f'Unknown env name: {env_name}'
+    wind = ScenarioWind()
+    wind.wind_velocity = wind_velocity
     env = gym.make(env_name,
                    renderer=CV2DRenderer(),
-                   wind_generator_fn=generate_wind,
-                   container_tag='mss1',
+                   wind_generator_fn=wind,
+                   water_generator_fn=still_water,
                    name=f'{i}',
-                   keep_sim_alive=False)
-    env = TimeLimit(env, max_episode_steps=env.NB_STEPS_PER_SECONDS*10) # 10 seconds
+                   keep_sim_alive=False,
+                   sim_endpoint=sim_endpoint,
+                   container_tag=container_tag)
+    env = TimeLimit(env, max_episode_steps=env.unwrapped.NB_STEPS_PER_SECONDS*MAX_DURATION)
     # env = RecordVideo(env, video_folder='./output/videos/')
     return env
 
@@ -56,73 +68,249 @@ def deep_convert_to_dict(d):
     return d
 
 
-def save_bounds(env_name: str, bounds):
-    bounds = deep_convert_to_dict(bounds)
-    if not osp.exists(pkl_dir):
-        os.makedirs(pkl_dir, exist_ok=True)
-    file_path = osp.join(
+def create_bounds():
+    return defaultdict(
+        lambda: defaultdict(lambda: defaultdict(lambda: (np.inf, -np.inf))))
+
+
+def get_bounds_path(env_name, wind_velocity, suffix=''):
+    return osp.join(
         pkl_dir,
-        f'{env_name}_bounds_v_wind_{global_wind_velocity}.pkl')
+        f'{env_name}_bounds_v_wind_{wind_velocity}{suffix}.pkl')
+
+
+def save_bounds(bounds, file_path):
+    bounds = deep_convert_to_dict(bounds)
+    os.makedirs(osp.dirname(file_path), exist_ok=True)
     with open(file_path, 'wb') as f:
         pickle.dump(bounds, f)
     print(f'Saved bounds to file: {file_path}')
 
 
-def run_simulation(env, bounds, theta_wind, theta_sail):
-    global global_theta_wind
-    global_theta_wind = theta_wind
+class SteadyStateDetector:
+    """Detect that the boat reached a steady state: `dt_p_boat` varied by less than `tol` (m/s) over the last `window` steps."""
+
+    def __init__(self, window, tol=2e-3):
+        self.tol = tol
+        self.values = deque(maxlen=window)
+
+    def update(self, obs):
+        self.values.append(obs['dt_p_boat'])
+        if len(self.values) < self.values.maxlen:
+            return False
+        return np.ptp(np.array(self.values), axis=0).max() < self.tol
 
-    def ctrl(_):
-        return {'theta_rudder': np.array(0), 'theta_sail': np.array(np.deg2rad(theta_sail))}
+
+def get_ctrl(theta_sail):
+    return {'theta_rudder': np.array(0), 'theta_sail': np.array(np.deg2rad(theta_sail))}
+
+
+def simulate_cell(env, theta_sail, steady_state_tol=None):
+    """Simulate a (wind, sail) cell, returns its bounds and the number of simulated steps."""
+    freq = env.unwrapped.NB_STEPS_PER_SECONDS
+    detector = SteadyStateDetector(freq, steady_state_tol) \
+        if steady_state_tol else None
+    cell_bounds = defaultdict(lambda: (np.inf, -np.inf))
 
     obs, info = env.reset(seed=0)
+    nb_steps = 0
     while True:
-        obs, reward, terminated, truncated, info = env.step(ctrl(obs))
+        obs, reward, terminated, truncated, info = env.step(get_ctrl(theta_sail))
+        nb_steps += 1
 
         vmc = get_vmc(obs)
-        v_min, v_max = bounds[theta_wind][theta_sail]['vmc']
-        bounds[theta_wind][theta_sail]['vmc'] = (
-            min(v_min, vmc), max(v_max, vmc))
+        v_min, v_max = cell_bounds['vmc']
+        cell_bounds['vmc'] = (min(v_min, vmc), max(v_max, vmc))
 
         for k, v in obs.items():
             if k in ['p_boat']:
                 for d in range(v.shape[0]):
-                    v_min, v_max = bounds[theta_wind][theta_sail][f'{k}_{d}']
-                    bounds[theta_wind][theta_sail][f'{k}_{d}'] = (
-                        min(v_min, v[d]), max(v_max, v[d]))
+                    v_min, v_max = cell_bounds[f'{k}_{d}']
+                    cell_bounds[f'{k}_{d}'] = (min(v_min, v[d]), max(v_max, v[d]))
             else:
                 v = np.linalg.norm(v)
-                v_min, v_max = bounds[theta_wind][theta_sail][k]
-                bounds[theta_wind][theta_sail][k] = (
-                    min(v_min, v), max(v_max, v))
+                v_min, v_max = cell_bounds[k]
+                cell_bounds[k] = (min(v_min, v), max(v_max, v))
 
         if terminated or truncated:
             break
+        if detector and detector.update(obs):
+            break
     env.close()
+    return dict(cell_bounds), nb_steps
+
+
+def get_cell_key(env, theta_sail, steady_state_tol):
+    """Key of a cell in the rollout cache, the wind, water and sail are constant during the episode."""
+    unwrapped = env.unwrapped
+    return rollout_key(env.spec.id,
+                       get_sim_image(env),
+                       unwrapped.NB_STEPS_PER_SECONDS,
+                       seed=0,
+                       wind=unwrapped.wind_generator_fn(0),
+                       water=unwrapped.water_generator_fn(0),
+                       action=get_ctrl(theta_sail),
+                       max_duration=MAX_DURATION,
+                       steady_state_tol=steady_state_tol)
+
+
+def run_simulation(env, bounds, theta_wind, theta_sail, steady_state_tol=None, cache=None, lock=None):
+    """Simulate a (wind, sail) cell (or read it from the cache) and update its bounds (under `lock`, shared by the threads), returns the number of simulated seconds."""
+    env.unwrapped.wind_generator_fn.theta_wind = theta_wind
+
+    key = get_cell_key(env, theta_sail, steady_state_tol) if cache is not None else None
+    cached = cache.get(key) if cache is not None else None
+    if cached:
+        cell_bounds, nb_steps = cached
+        simulated_steps = 0
+    else:
+        cell_bounds, nb_steps = simulate_cell(env, theta_sail, steady_state_tol)
+        simulated_steps = nb_steps
+        if cache is not None:
+            cache.put(key, (cell_bounds, nb_steps))
+
+    with lock or contextlib.nullcontext():
+        for k, (c_min, c_max) in cell_bounds.items():
+            v_min, v_max = bounds[theta_wind][theta_sail][k]
+            bounds[theta_wind][theta_sail][k] = (min(v_min, c_min), max(v_max, c_max))
+    return simulated_steps / env.unwrapped.NB_STEPS_PER_SECONDS
+
+
+def run_cells(envs, bounds, theta_wind, sails, steady_state_tol, cache=None):
+    """Simulate the sail angles on the available envs in parallel, returns the number of simulated seconds."""
+    cells = queue.Queue()
+    for theta_sail in sails:
+        cells.put(theta_sail)
+    durations = []
+    lock = threading.Lock()  # the defaultdicts of the bounds are created on first access
+
+    def worker(env):
+        while True:
+            try:
+                theta_sail = cells.get_nowait()
+            except queue.Empty:
+                return
+            durations.append(run_simulation(
+                env, bounds, theta_wind, theta_sail, steady_state_tol, cache, lock))
+
+    threads = [threading.Thread(target=worker, args=(env,)) for env in envs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(durations)
+
+
+def extract_grid(envs, bounds, theta_wind, cache=None):
+    """Brute force: simulate every sail angle of the grid."""
+    sails = list(range(SAIL_MIN, SAIL_MAX+1, SAIL_RESOLUTION))
+    return run_cells(envs, bounds, theta_wind, sails, None, cache)
+
+
+def extract_adaptive(envs, bounds, theta_wind, steady_state_tol, cache=None):
+    """Coarse to fine search of the best sail angle, each refinement halves the step around the best VMC found so far."""
+    def best_vmc(theta_sail):
+        return bounds[theta_wind][theta_sail]['vmc'][1]
+
+    step = COARSE_SAIL_STEP
+    sails = list(range(SAIL_MIN, SAIL_MAX+1, step))
+    sim_seconds = 0
+    while True:
+        todo = [s for s in sails if s not in bounds[theta_wind]]
+        sim_seconds += run_cells(envs, bounds, theta_wind,
+                                 todo, steady_state_tol, cache)
+        if step == SAIL_RESOLUTION:
+            return sim_seconds
+        # ties are broken towards the smallest sail angle, like extract_best_sail
+        best = max(sorted(bounds[theta_wind], key=abs), key=best_vmc)
+        radius, step = step, max(SAIL_RESOLUTION,
+                                 round(step / 2 / SAIL_RESOLUTION) * SAIL_RESOLUTION)
+        sails = [s for s in range(best - radius, best + radius + 1, step)
+                 if SAIL_MIN <= s <= SAIL_MAX]
+
+
+def compare_bounds(reference, candidate):
+    """Compare the polars (VMC and best sail by wind angle) as computed by the polar loaders.
+
+    The regret is the VMC lost (according to the reference) by using the best sail of the candidate,
+    unlike the best sail angles themselves it is not affected by ties (e.g. -90° and 90° running downwind).
+    """
+    ref_df, cand_df = dict_to_df(reference), dict_to_df(candidate)
+    ref_vmc, cand_vmc = extract_vmc(ref_df), extract_vmc(cand_df)
+    cand_sail = dict(zip(*extract_best_sail(cand_df)))
+    thetas = sorted(set(ref_vmc.index) & set(cand_vmc.index))
+    vmc_errors = np.array([abs(ref_vmc[t] - cand_vmc[t]) for t in thetas])
+    regrets = np.array([ref_vmc[t] - max(0, reference[t][cand_sail[t]]['vmc'][1])
+                        for t in thetas])
+    return {
+        'nb_wind_angles': len(thetas),
+        'nb_cells': (len(ref_df), len(cand_df)),
+        'max_vmc': ref_vmc.max(),
+        'vmc_max_abs_error': vmc_errors.max(),
+        'vmc_mean_abs_error': vmc_errors.mean(),
+        'regret_max': regrets.max(),
+        'regret_mean': regrets.mean(),
+    }
+
+
+def print_report(report, sim_seconds, reference_sim_seconds):
+    ref_cells, cand_cells = report['nb_cells']
+    print(f'\nAdaptive polar vs reference ({report["nb_wind_angles"]} wind angles):')
+    print(f'  simulated cells:      {cand_cells} vs {ref_cells}')
+    print(f'  simulated time:       {sim_seconds:.0f}s vs {reference_sim_seconds:.0f}s '
+          f'({sim_seconds / reference_sim_seconds:.1%})')
+    print(f'  VMC error:            max {report["vmc_max_abs_error"]:.4f} m/s, '
+          f'mean {report["vmc_mean_abs_error"]:.4f} m/s '
+          f'(best VMC of the polar: {report["max_vmc"]:.4f} m/s)')
+    print(f'  best sail regret:     max {report["regret_max"]:.4f} m/s, '
+          f'mean {report["regret_mean"]:.4f} m/s')
 
 
 @click.command()
 @click.option('--env-name', default=list(env_by_name.keys())[0], help='Env name', type=click.Choice(list(env_by_name.keys()), case_sensitive=False))
 @click.option('--wind-velocity', default=1, help='Wind velocity', type=int)
-def extract_sim_stats(env_name, wind_velocity):
-    global global_wind_velocity
-    global_wind_velocity = int(wind_velocity)
+@click.option('--mode', default='grid', help='grid: simulate every 5° sail angle for 10s, adaptive: refine the sail angle around the best VMC and stop at steady state', type=click.Choice(['grid', 'adaptive']))
+@click.option('--nb-envs', default=5, help='Number of simulations run in parallel', type=int)
+@click.option('--steady-state-tol', default=2e-3, help='Adaptive mode: stop a simulation when dt_p_boat varied by less than this (m/s) over the last second', type=float)
+@click.option('--compare-with', default=None, help='Adaptive mode: bounds file to compare the result with (e.g. a grid extraction)', type=str)
+@click.option('--sim-endpoint', default=None, help='Address(es) of running simulators, docker containers are launched otherwise', type=str)
+@click.option('--container-tag', default=DEFAULT_CONTAINER_TAG, help='Physics step size and engine of the simulator image', type=click.Choice(CONTAINER_TAGS))
+@click.option('--output', default=None, help='Output file, defaults to the pkl directory', type=str)
+@click.option('--cache-dir', default=default_cache_dir, help='Directory of the rollout cache, the cells already simulated with the same parameters are read from it', type=str)
+@click.option('--cache-size-mb', default=1024, help='Maximum size of the rollout cache (MB)', type=float)
+@click.option('--no-cache', is_flag=True, help='Simulate every cell, without reading or writing the rollout cache')
+def extract_sim_stats(env_name, wind_velocity, mode, nb_envs, steady_state_tol, compare_with, sim_endpoint, container_tag, output, cache_dir, cache_size_mb, no_cache):
+    wind_velocity = int(wind_velocity)
+    suffix = f'_{container_tag}' if container_tag != DEFAULT_CONTAINER_TAG else ''
+    output = output or get_bounds_path(env_name, wind_velocity, suffix)
+    cache = None if no_cache else RolloutCache(cache_dir, cache_size_mb)
 
-    envs = [create_env(env_name, i) for i in range(5)]
+    envs = [create_env(env_name, i, wind_velocity, sim_endpoint, container_tag) for i in range(nb_envs)]
 
-    bounds_by_wind_by_sail_by_var = defaultdict(
-        lambda: defaultdict(lambda: defaultdict(lambda: (np.inf, -np.inf))))
+    bounds_by_wind_by_sail_by_var = create_bounds()
 
+    sim_seconds = 0
     for theta_wind in tqdm.trange(0, 360, 5, desc='wind angle'):
-        for theta_sail in tqdm.trange(-90, 90+1, 5, desc='sail angle', leave=False):
-            threads = [
-                threading.Thread(target=run_simulation,
-                                 args=(env, bounds_by_wind_by_sail_by_var, theta_wind, theta_sail)) for env in envs]
-            for t in threads:
-                t.start()
-            for t in threads:
-                t.join()
-        save_bounds(env_name, bounds_by_wind_by_sail_by_var)
+        if mode == 'grid':
+            sim_seconds += extract_grid(envs, bounds_by_wind_by_sail_by_var,
+                                        theta_wind, cache)
+        else:
+            sim_seconds += extract_adaptive(envs, bounds_by_wind_by_sail_by_var,
+                                            theta_wind, steady_state_tol, cache)
+        save_bounds(bounds_by_wind_by_sail_by_var, output)
+    print(f'Simulated {sim_seconds:.0f}s ({mode} mode)')
+    if cache is not None:
+        print(f'Rollout cache: {cache.nb_hits} cells read, {cache.nb_misses} cells simulated')
+
+    if compare_with:
+        with open(compare_with, 'rb') as f:
+            reference = pickle.load(f)
+        report = compare_bounds(reference,
+                                deep_convert_to_dict(bounds_by_wind_by_sail_by_var))
+        # cost of simulating every cell of the reference once
+        reference_sim_seconds = sum(len(sails) for sails in reference.values()) \
+            * MAX_DURATION
+        print_report(report, sim_seconds, reference_sim_seconds)
 
 
 if __name__ == '__main__':
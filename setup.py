@@ -64,6 +64,9 @@ setup(
         "Bug Report": "https://github.com/lucasmrdt/sailboat-gym/issues",
     },
     packages=find_packages(),
+    entry_points={
+        'console_scripts': ['sailboat_gym=sailboat_gym.cli:main'],
+    },
     include_package_data=True,
     install_requires=[
         'gymnasium==0.28.1',
@@ -1,15 +1,91 @@
+import docker
 from sailboat_gym import env_by_name, is_debugging
 
 from .check_env import check_env_implementation
+from .check_import_time import check_import_time
+from .check_teardown import check_teardown, check_teardown_at_exit
+from .check_placement import check_placement
+from .check_snapshot import check_snapshot_restore
+from .check_autoreset import check_autoreset
+from .check_endpoints import check_remote_endpoints, check_timeouts
+from .check_wire_format import check_wire_format
+from .check_pixel_obs import check_pixel_obs
+from .check_deferred_rendering import check_deferred_rendering
+from .check_multi_boat import check_multi_boat
+from .check_real_time_factor import check_real_time_factor
+from .check_subprocess_backend import check_subprocess_backend
+from .check_rollout_cache import check_rollout_cache
+from .check_step_log import check_step_log
+from .check_env_server import check_env_server
+from .check_container_tags import check_container_tags
+from .check_observation_history import check_observation_history
+from .check_trail import check_trail
+from .check_relabel import check_relabel
+from .check_evaluate import check_evaluate
+from .check_monitor import check_monitor
+from .check_thread_safety import check_thread_safety
+
+stand_in_checks = [
+    check_snapshot_restore,
+    check_autoreset,
+    check_remote_endpoints,
+    check_timeouts,
+    check_wire_format,
+    check_pixel_obs,
+    check_deferred_rendering,
+    check_multi_boat,
+    check_real_time_factor,
+    check_subprocess_backend,
+    check_rollout_cache,
+    check_step_log,
+    check_env_server,
+    check_container_tags,
+    check_observation_history,
+    check_trail,
+    check_relabel,
+    check_evaluate,
+    check_monitor,
+    check_thread_safety,
+]
+
+
+def is_docker_available():
+    try:
+        docker.from_env().ping()
+    except Exception:
+        return False
+    return True
 
 
 def check_all():
     try:
+        print('-- Checking import time --')
+        check_import_time()
+        print('\tOK\n')
+
+        print('-- Checking teardown --')
+        check_teardown()
+        check_teardown_at_exit()
+        print('\tOK\n')
+
+        print('-- Checking placement --')
+        check_placement()
+        print('\tOK\n')
+
+        print('-- Checking against the stand-in simulator --')
+        for check in stand_in_checks:
+            print(f'\tChecking [{check.__name__}]...')
+            check()
+            print(f'\t[{check.__name__}] OK\n')
+
         print('-- Checking all environments --')
-        for name, env in env_by_name.items():
-            print(f'\tChecking [{name}]...')
-            check_env_implementation(env)
-            print(f'\t[{name}] OK\n')
+        if not is_docker_available():
+            print('\tSkipped, Docker is not available\n')
+        else:
+            for name, env in env_by_name.items():
+                print(f'\tChecking [{name}]...')
+                check_env_implementation(env)
+                print(f'\t[{name}] OK\n')
     except Exception as e:
         if is_debugging():
             raise e
@@ -0,0 +1,20 @@
+import numpy as np
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_autoreset():
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint, autoreset=True, max_episode_steps=5)
+        env.reset(seed=0)
+        for t in range(5):
+            obs, reward, terminated, truncated, info = env.step(sail_ctrl(t))
+        assert truncated, 'episode must be truncated after max_episode_steps'
+        assert env.sim.pending_reset, 'next episode must be requested on truncation'
+        assert np.any(obs['p_boat'] != 0), 'the terminal observation must be returned'
+
+        obs, reward, terminated, truncated, info = env.step(sail_ctrl(5))
+        assert not terminated and not truncated
+        assert np.all(obs['p_boat'] == 0), 'the initial observation must be returned'
+        assert 'reset_wait_time' in info and 'map_bounds' in info
+        assert env.step_idx == 0
+        env.close()
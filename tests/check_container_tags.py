@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import numpy as np
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv, DockerBackend
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInSimulation
+from sailboat_gym.envs.sailboat_lsa.lsa_backends import get_image_name, parse_container_tag
+
+
+def check_container_tags():
+    assert get_image_name('mss4-bullet') == 'lucasmrdt/sailboat-sim-lsa-gym:mss4-bullet'
+    assert get_image_name('mss2') == 'lucasmrdt/sailboat-sim-lsa-gym:mss2-ode'
+    assert get_image_name('me/my-sim:latest') == 'me/my-sim:latest'
+    assert parse_container_tag('mss4-dart') == (0.004, 'dart')
+    try:
+        get_image_name('mss3-ode')
+    except ValueError as e:
+        assert 'mss1-ode' in str(e), 'the available tags must be listed'
+    else:
+        raise AssertionError('an unknown tag must be refused')
+    assert DockerBackend().get_image() == DockerBackend.DOCKER_IMAGE_NAME
+    assert DockerBackend(container_tag='mss2-simbody').get_image().endswith(':mss2-simbody')
+
+    # the stand-in integrates the steps with the physics step size of the tag
+    action = {'theta_rudder': .2, 'theta_sail': .5,
+              'wind': {'x': 0., 'y': 1.}, 'water': {'x': 0., 'y': 0.}}
+    positions = {}
+    for max_step_size in [None, .1, .004, .001]:
+        sim = StandInSimulation(max_step_size)
+        sim.reset(action['wind'], action['water'], SailboatLSAEnv.NB_STEPS_PER_SECONDS)
+        for _ in range(50):
+            obs, *_ = sim.step(action)
+        positions[max_step_size] = np.array([obs['p_boat']['x'], obs['p_boat']['y']])
+    assert np.allclose(positions[None], positions[.1]), 'a step longer than the env step must not change the result'
+    coarse_error = np.linalg.norm(positions[.1] - positions[.001])
+    assert 0 < np.linalg.norm(positions[.004] - positions[.001]) < coarse_error
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_output = os.path.join(tmp_dir, 'report.json')
+        root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+        subprocess.run([sys.executable, 'scripts/compare_container_tags.py', '--stand-in',
+                        '--tags=mss4-ode,mss1-ode', '--reference=mss1-ode', '--duration=1',
+                        f'--json-output={json_output}'],
+                       cwd=root_dir, check=True, stdout=subprocess.DEVNULL)
+        with open(json_output) as f:
+            report = json.load(f)
+    assert report['reference'] == 'mss1-ode' and list(report['results']) == ['mss1-ode', 'mss4-ode']
+    assert report['results']['mss1-ode']['trajectory_rmse'] == 0
+    assert report['results']['mss4-ode']['trajectory_rmse'] > 0
+    assert report['results']['mss4-ode']['steps_per_s'] > 0
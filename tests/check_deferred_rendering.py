@@ -0,0 +1,51 @@
+import time
+import numpy as np
+from sailboat_gym import RasterRenderer, DeferredRenderer
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+class SlowRenderer(RasterRenderer):
+    def render(self, observation, draw_extra_fct=None):
+        time.sleep(.02)
+        return super().render(observation)
+
+
+def check_deferred_rendering():
+    renderer = DeferredRenderer(SlowRenderer(size=32), every=2, max_pending=1)
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint, renderer=renderer)
+        env.reset(seed=0)
+        first = env.render()  # the first frame is waited for
+        assert first.shape == (32, 32, 3)
+        for t in range(40):
+            env.step(sail_ctrl(t))
+            frame = env.render()
+        assert frame is not None
+        renderer.flush()
+        assert renderer.nb_skipped == 20, 'only every other frame is rendered'
+        assert renderer.nb_rendered + renderer.nb_dropped == 21
+        # a blocking render would have drained the queue before each new frame
+        assert renderer.nb_dropped > 0, 'rendering must not block the rollout, the bounded queue must drop frames'
+        renderer.close()
+        env.close()
+
+    # the exceptions of the worker are raised by the next call, not lost in the futures
+    class FailingRenderer(RasterRenderer):
+        def render(self, observation, draw_extra_fct=None):
+            raise ValueError('cannot draw')
+    obs = {'p_boat': np.zeros(3)}
+    for call in ['render', 'flush', 'close']:
+        renderer = DeferredRenderer(FailingRenderer(size=32))
+        renderer.render_async(obs)
+        try:
+            if call == 'render':
+                renderer.render(obs)
+            elif call == 'flush':
+                renderer.flush()
+            else:
+                renderer.close()
+        except ValueError as e:
+            assert 'cannot draw' in str(e)
+        else:
+            raise AssertionError(f'{call} must raise the exception of the worker')
+        renderer.close()
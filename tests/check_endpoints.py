@@ -0,0 +1,68 @@
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+from .stand_in import make_env, sail_ctrl
+
+
+def check_remote_endpoints():
+    servers = [StandInServer() for _ in range(3)]
+    endpoints = [server.start().replace('tcp://', '') for server in servers]
+    try:
+        envs = [make_env(endpoints, name=f'{i}') for i in range(6)]
+        for env in envs:
+            env.reset(seed=0)
+        loads = [len(server.sessions) for server in servers]
+        assert loads == [2, 2, 2], f'envs must be spread across endpoints, got {loads}'
+
+        # kill the endpoint used by the first env
+        for env in envs:
+            env.sim.timeout = .5
+        env = envs[0]
+        dead_endpoint = env.sim.endpoint
+        dead_server = next(s for s in servers if s.endpoint == dead_endpoint)
+        dead_server.stop()
+        *_, truncated, info = env.step(sail_ctrl(0))
+        assert truncated and info['sim_failure'], \
+            'a dead endpoint must truncate the episode'
+        env.reset(seed=0)
+        assert env.sim.endpoint != dead_endpoint, 'the env must fail over'
+        env.step(sail_ctrl(0))
+
+        for env in envs:
+            if env.sim.endpoint != dead_endpoint:
+                env.close()
+    finally:
+        for server in servers:
+            if server.running:
+                server.stop()
+
+
+def check_timeouts():
+    server = StandInServer()
+    endpoint = server.start()
+    try:
+        env = make_env(endpoint, sim_timeout=.2, sim_retries=1)
+
+        # a lost reset reply is transparently retried
+        server.drop_replies = 1
+        env.reset(seed=0)
+        assert env.sim.nb_timeouts == 1 and env.sim.nb_restarts == 0
+
+        # a lost step reply truncates the episode
+        server.drop_replies = 1
+        *_, truncated, info = env.step(sail_ctrl(0))
+        assert truncated and info['sim_failure']
+        assert env.sim.nb_timeouts == 2
+
+        # consecutive timeouts restart the simulator
+        server.drop_replies = 1
+        env.reset(seed=0)
+        assert env.sim.nb_timeouts == 3 and env.sim.nb_restarts == 1
+        obs, *_, truncated, info = env.step(sail_ctrl(0))
+        assert not truncated and 'sim_failure' not in info
+
+        # the only endpoint is used again, it is not put aside for the other envs
+        other = make_env(endpoint)
+        other.reset(seed=0)
+        other.close()
+        env.close()
+    finally:
+        server.stop()
@@ -0,0 +1,137 @@
+import os
+import sys
+import subprocess
+import threading
+import numpy as np
+import gymnasium as gym
+import sailboat_gym
+from sailboat_gym import RemoteVectorEnv, EnvServer
+from .stand_in import stand_in_server, make_env, constant_wind, still_water, sail_ctrl, forward_reward
+
+
+def remote_task(i):
+    """Task of the environments of the env server: the reward and the wind are computed server-side."""
+    return {'reward_fn': forward_reward,
+            'wind_generator_fn': constant_wind,
+            'water_generator_fn': still_water}
+
+
+def check_env_server():
+    with stand_in_server() as sim_endpoint:
+        server = EnvServer(lambda i: make_env(sim_endpoint, name=f'served-{i}', max_episode_steps=5, **remote_task(i)),
+                           num_envs=4, bind='tcp://127.0.0.1:0')
+        endpoint = server.start()
+        try:
+            local = make_env(sim_endpoint, **remote_task(0))
+            obs, _ = local.reset(seed=0)
+            expected = []
+            for t in range(4):
+                obs, reward, *_ = local.step(sail_ctrl(t))
+                expected.append((obs['p_boat'], reward))
+            local.close()
+
+            def run_client(name, results):
+                env = RemoteVectorEnv(endpoint, num_envs=2, name=name)
+                obs, _ = env.reset(seed=0)
+                assert obs['p_boat'].shape == (2, 3)
+                for t in range(5):
+                    action = {key: np.stack([value, value]) for key, value in sail_ctrl(t).items()}
+                    obs, rewards, terminated, truncated, infos = env.step(action)
+                    results.append((obs, rewards, truncated, infos))
+                env.close()
+
+            # two clients share the pool, their requests are batched together
+            results = {'a': [], 'b': []}
+            threads = [threading.Thread(target=run_client, args=(name, r))
+                       for name, r in results.items()]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for r in results.values():
+                assert len(r) == 5
+                for (obs, rewards, _, _), (p_boat, reward) in zip(r, expected):
+                    assert np.allclose(obs['p_boat'], p_boat, atol=1e-6), 'the remote envs must match a local env'
+                    assert np.allclose(rewards, reward), 'the reward must be computed by the server'
+                # the episodes are truncated after 5 steps and reset by the server
+                *_, truncated, infos = r[-1]
+                assert truncated.all() and infos['_final_observation'].all()
+                assert not np.allclose(infos['final_observation'][0]['p_boat'], r[-1][0]['p_boat'][0])
+            stats = server.get_stats()
+            assert stats['nb_free_envs'] == 4 and stats['max_queue_depth'] >= 1
+
+            # the pool is bounded, a session is refused when not enough envs are free
+            env = RemoteVectorEnv(endpoint, num_envs=3, name='big')
+            stats = env.get_server_stats()
+            assert stats['nb_free_envs'] == 1 and stats['clients'][0]['name'] == 'big'
+            try:
+                RemoteVectorEnv(endpoint, num_envs=2)
+            except RuntimeError as e:
+                assert 'Not enough free environments' in str(e)
+            else:
+                raise AssertionError('the pool must not be oversubscribed')
+            env.reset(seed=0)
+            for t in range(3):
+                env.step({key: np.stack([value] * 3) for key, value in sail_ctrl(t).items()})
+            assert env.get_server_stats()['clients'][0]['nb_env_steps'] == 9
+            env.close()
+        finally:
+            server.stop()
+
+        # a slow server times out the request, the connection is recreated and the env can be reset
+        class HandleInfo(gym.Wrapper):
+            def reset(self, seed=None, options=None):
+                obs, info = self.env.reset(seed=seed, options=options)
+                if seed is not None and seed >= 100:
+                    info['handle'] = object()  # can not be sent over the network
+                return obs, info
+
+        server = EnvServer(lambda i: HandleInfo(make_env(sim_endpoint, name=f'slow-{i}', real_time_factor=.2, **remote_task(i))),
+                           num_envs=1, bind='tcp://127.0.0.1:0')
+        endpoint = server.start()
+        try:
+            env = RemoteVectorEnv(endpoint, num_envs=1, timeout=.1)
+            env.timeout = 30
+            env.reset(seed=0)
+            env.timeout = .1
+            try:
+                env.step({key: np.stack([value]) for key, value in sail_ctrl(0).items()})
+            except TimeoutError:
+                pass
+            else:
+                raise AssertionError('the step must time out')
+            assert not env.pending
+            env.timeout = 30
+            obs, _ = env.reset(seed=0)
+            assert obs['p_boat'].shape == (1, 3)
+
+            # an info that can not be encoded is reported with its key, instead of being corrupted
+            try:
+                env.reset(seed=100)
+            except RuntimeError as e:
+                assert "'handle'" in str(e) and 'TypeError' in str(e), e
+            else:
+                raise AssertionError('an info that can not be encoded must be refused')
+            obs, _ = env.reset(seed=0)
+            assert obs['p_boat'].shape == (1, 3)
+            env.close()
+        finally:
+            server.stop()
+
+        # the same server, launched by the command line
+        root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+        proc = subprocess.Popen([sys.executable, '-m', 'sailboat_gym', 'serve', '--num-envs=2',
+                                 '--bind=tcp://127.0.0.1:0', f'--sim-endpoint={sim_endpoint}',
+                                 '--task=tests.check_env_server:remote_task', '--report-interval=0'],
+                                cwd=root_dir, stdout=subprocess.PIPE, text=True)
+        try:
+            line = proc.stdout.readline()
+            assert line.startswith('Serving 2 SailboatLSAEnv-v0 on '), line
+            env = RemoteVectorEnv(line.split()[-1], num_envs=2, timeout=30)
+            env.reset(seed=0)
+            _, rewards, *_ = env.step({key: np.stack([value, value]) for key, value in sail_ctrl(0).items()})
+            assert np.allclose(rewards, expected[0][1])
+            env.close()
+        finally:
+            proc.terminate()
+            proc.wait()
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import subprocess
+import tempfile
+import numpy as np
+import sailboat_gym
+from sailboat_gym.helpers.evaluate import evaluate, get_scenario_grid, run_episode, ScenarioWind, load_results, summarize, format_summary
+from .stand_in import stand_in_server, make_env, still_water
+
+
+def evaluation_policy(obs):
+    """Keep the heading along the x axis with the sail at 60°."""
+    return {'theta_rudder': np.array(-obs['theta_boat'][2]),
+            'theta_sail': np.array(np.deg2rad(60))}
+
+
+def failing_policy(obs):
+    raise ValueError('policy failure')
+
+
+def check_evaluate():
+    scenarios = get_scenario_grid([0, 60, 120, 180], [1, 2])
+    assert len(scenarios) == 8
+    with stand_in_server() as endpoint, tempfile.TemporaryDirectory() as tmp_dir:
+        output = os.path.join(tmp_dir, 'results.jsonl')
+        results = evaluate(evaluation_policy, scenarios, num_sims=3, duration=3,
+                           output=output, sim_endpoint=endpoint)
+        episodes = results['episodes']
+        assert [(e['theta_wind'], e['wind_velocity']) for e in episodes] == \
+            [(s['theta_wind'], s['wind_velocity']) for s in scenarios]
+        assert all(e['nb_steps'] == 30 and e['sim_time'] == 3 for e in episodes)
+
+        # every environment of the pool ran episodes
+        throughput = results['throughput']
+        assert len(throughput['sims']) == 3
+        assert all(sim['nb_episodes'] > 0 for sim in throughput['sims'])
+        assert sum(sim['nb_episodes'] for sim in throughput['sims']) == 8
+        assert throughput['steps_per_s'] > 0 and throughput['episodes_per_s'] > 0
+
+        # the episodes are streamed to the results file, and match a serial run
+        streamed = load_results(output)
+        assert sorted(map(json.dumps, streamed)) == sorted(map(json.dumps, episodes))
+        wind = ScenarioWind()
+        env = make_env(endpoint, wind_generator_fn=wind, water_generator_fn=still_water)
+        serial = run_episode(env, wind, evaluation_policy, scenarios[5], 30)
+        env.close()
+        assert np.isclose(serial['dmg'], episodes[5]['dmg']) and np.isclose(serial['vmc_mean'], episodes[5]['vmc_mean'])
+        downwind, upwind = episodes[4], episodes[7]  # wind from the stern vs from the bow
+        assert downwind['dmg'] > upwind['dmg']
+
+        summary = summarize(episodes)
+        assert len(summary) == 8 and all(row['nb_episodes'] == 1 for row in summary)
+        assert 'vmc mean' in format_summary(summary)
+
+        try:
+            evaluate(failing_policy, scenarios, num_sims=2, duration=1, sim_endpoint=endpoint)
+            assert False, 'the errors of the policy must be raised'
+        except ValueError:
+            pass
+
+        root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'sailboat_gym', 'evaluate',
+             '--policy=tests.check_evaluate:evaluation_policy', f'--sim-endpoint={endpoint}',
+             '--theta-winds=0,90', '--wind-velocities=1', '--duration=1', '--num-sims=2'],
+            cwd=root_dir, text=True)
+        assert '2 episodes in' in output and 'steps/s' in output
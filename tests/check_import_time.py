@@ -0,0 +1,37 @@
+import re
+import subprocess
+import sys
+
+# `import gymnasium` is required to register the environments, everything
+# else must stay lazy (measured on top of gymnasium)
+IMPORT_TIME_BUDGET = 0.05  # s
+HEAVY_MODULES = ['docker', 'zmq', 'msgpack', 'cv2', 'tqdm',
+                 'pydantic', 'pandas', 'matplotlib', 'click']
+
+
+def measure_import_time(module='sailboat_gym', preloaded='gymnasium'):
+    """Return the import time of `module` (in seconds) and the list of modules it imports, using `python -X importtime`."""
+    res = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import {preloaded}; import {module}'],
+        capture_output=True, text=True, check=True)
+    lines = re.findall(r'import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)',
+                       res.stderr)
+    # only keep what is imported after the preloaded module
+    top_level = [i for i, (*_, indent, name) in enumerate(lines)
+                 if name == preloaded and len(indent) == 1]
+    lines = lines[top_level[0] + 1:] if top_level else lines
+    imported = [name for *_, name in lines]
+    duration = sum(int(cumulative) for _, cumulative, indent, _ in lines
+                   if len(indent) == 1) * 1e-6
+    return duration, imported
+
+
+def check_import_time():
+    duration, imported = measure_import_time()
+    heavy = [name for name in imported
+             if name.split('.')[0] in HEAVY_MODULES]
+    assert not heavy, \
+        f'`import sailboat_gym` must not import heavy dependencies, got: {heavy}'
+    assert duration < IMPORT_TIME_BUDGET, \
+        f'`import sailboat_gym` took {duration * 1e3:.1f}ms (budget: {IMPORT_TIME_BUDGET * 1e3:.0f}ms)'
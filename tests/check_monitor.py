@@ -0,0 +1,78 @@
+import os
+import sys
+import subprocess
+import time
+import tempfile
+import numpy as np
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv, SubprocessBackend
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+from sailboat_gym.envs.sailboat_lsa.lsa_monitor import SimMonitor, STATES, read_monitors, get_status, format_top
+from .stand_in import make_env, sail_ctrl
+
+
+def check_monitor():
+    root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+    server = StandInServer()
+    endpoint = server.start()
+    with tempfile.TemporaryDirectory() as monitor_dir:
+        try:
+            monitor = SimMonitor(monitor_dir, nb_slots=4, interval=0, resource_interval=0)
+            env = make_env(endpoint, name='monitored', sim_timeout=.2)
+            assert monitor.register(env.sim) == 0
+            env.reset(seed=0)
+            monitor.publish()
+            for t in range(20):
+                env.step(sail_ctrl(t))
+            monitor.publish()
+            (pid, rec), = read_monitors(monitor_dir)
+            assert pid == os.getpid() and rec['name'] == b'monitored'
+            assert rec['nb_steps'] == 20 and rec['nb_resets'] == 1 and rec['steps_per_s'] > 0
+            assert 0 < rec['last_step_latency'] < .2 and get_status(rec, time.time()) == 'running'
+            assert np.isnan(rec['cpu_percent']), 'the resources of a remote simulator are unknown'
+
+            # the lost steps are counted as timeouts and errors
+            server.drop_replies = 1
+            *_, truncated, info = env.step(sail_ctrl(0))
+            assert truncated and info['sim_failure']
+            monitor.publish()
+            (_, rec), = read_monitors(monitor_dir)
+            assert rec['nb_timeouts'] >= 1 and rec['nb_errors'] == 1
+            assert get_status(rec, time.time() + 60) == 'idle'
+
+            # a launched simulator is paused when inactive, its resources are published
+            backend = SubprocessBackend([sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in',
+                                         '--bind={endpoint}'], cwd=root_dir)
+            launched = SailboatLSAEnv(sim_backend=backend, name='launched', step_log=False)
+            assert monitor.register(launched.sim) == 1
+            launched.reset(seed=0)
+            launched.step(sail_ctrl(0))
+            time.sleep(1.5)
+            monitor.publish()
+            rows = {rec['name']: rec for _, rec in read_monitors(monitor_dir)}
+            assert rows[b'launched']['paused'] and get_status(rows[b'launched'], time.time()) == 'paused'
+            assert rows[b'launched']['memory_mb'] > 0 and not np.isnan(rows[b'launched']['cpu_percent'])
+            table = format_top(read_monitors(monitor_dir))
+            assert 'monitored' in table and 'paused' in table
+
+            output = subprocess.check_output(
+                [sys.executable, '-m', 'sailboat_gym', 'top', '--once', f'--dir={monitor_dir}'],
+                cwd=root_dir, text=True)
+            assert '2 simulators' in output and 'launched' in output
+
+            launched.close()
+            launched.sim.stop()
+            monitor.publish()
+            rows = {rec['name']: rec for _, rec in read_monitors(monitor_dir)}
+            assert STATES[rows[b'launched']['state']] == 'stopped'
+            env.close()
+
+            # the files of the dead processes are removed
+            dead_path = os.path.join(monitor_dir, 'sims-999999999.npy')
+            np.save(dead_path, np.zeros(1, dtype=rec.dtype))
+            read_monitors(monitor_dir)
+            assert not os.path.exists(dead_path)
+            monitor.close()
+            assert not os.listdir(monitor_dir)
+        finally:
+            server.stop()
@@ -0,0 +1,61 @@
+import numpy as np
+from sailboat_gym import SailboatLSAVectorEnv
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+from .stand_in import stand_in_server, make_env, constant_wind, still_water, sail_ctrl
+
+
+def check_multi_boat():
+    nb_envs = 5
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint, water_generator_fn=still_water)
+        env.reset(seed=0)
+        expected = [env.step(sail_ctrl(t))[0] for t in range(5)]
+        env.close()
+
+        for wire_format in ['msgpack', 'binary']:
+            envs = SailboatLSAVectorEnv(nb_envs,
+                                        boats_per_sim=2,
+                                        sim_endpoint=endpoint,
+                                        wind_generator_fn=constant_wind,
+                                        water_generator_fn=still_water,
+                                        max_episode_steps=5,
+                                        sim_wire_format=wire_format)
+            assert envs.boats[3] == (1, 1), 'env 3 must be the second boat of the second simulator'
+            obs, _ = envs.reset(seed=0)
+            assert obs in envs.observation_space
+            for t in range(5):
+                action = {k: np.full((nb_envs, 1), v, dtype=np.float32)
+                          for k, v in sail_ctrl(t).items()}
+                obs, rewards, terminated, truncated, info = envs.step(action)
+                if t < 4:
+                    # the boats do not interact, they all follow the single boat trajectory
+                    assert all(np.allclose(obs[k][i], expected[t][k])
+                               for k in obs for i in range(nb_envs))
+            assert truncated.all(), 'episodes must be truncated after max_episode_steps'
+            assert np.allclose(info['final_observation'][4]['p_boat'], expected[4]['p_boat'])
+            assert np.all(obs['p_boat'] == 0), 'the boats must be reset'
+            envs.close()
+
+    # an error of a simulator is raised once the replies of the others are read, the env can still be used
+    servers = [StandInServer() for _ in range(2)]
+    endpoints = [server.start() for server in servers]
+    try:
+        envs = SailboatLSAVectorEnv(4, boats_per_sim=2, sim_endpoint=endpoints, step_log=False)
+        assert {sim.endpoint for sim in envs.sims} == set(endpoints), 'the simulators must be spread over the endpoints'
+        envs.reset(seed=0)
+        action = {k: np.full((4, 1), v, dtype=np.float32) for k, v in sail_ctrl(0).items()}
+        failing = next(server for server in servers if server.endpoint == envs.sims[0].endpoint)
+        failing.sessions.clear()  # the first simulator replies with an error
+        try:
+            envs.step(action)
+            assert False, 'the error of the simulator must be raised'
+        except RuntimeError:
+            pass
+        assert not any(sim.pending_step for sim in envs.sims)
+        envs.reset(seed=0)
+        obs, *_ = envs.step(action)
+        assert obs in envs.observation_space
+        envs.close()
+    finally:
+        for server in servers:
+            server.stop()
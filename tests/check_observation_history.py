@@ -0,0 +1,42 @@
+import numpy as np
+from sailboat_gym import SailboatLSAVectorEnv, ObservationHistory, BatchObservationHistory
+from .stand_in import stand_in_server, make_env, constant_wind, sail_ctrl
+
+
+def check_observation_history():
+    k = 4
+    with stand_in_server() as endpoint:
+        env = ObservationHistory(make_env(endpoint, autoreset=True, max_episode_steps=3), k)
+        obs, _ = env.reset(seed=0)
+        assert obs['p_boat'].shape == (k, 3) and obs in env.observation_space
+        history, episode_ended = [env.unwrapped.obs] * k, False
+        for t in range(8):
+            obs, _, terminated, truncated, _ = env.step(sail_ctrl(t))
+            # the autoreset returns the first observation of the next episode after the last step
+            history = history[1:] + [env.unwrapped.obs] if not episode_ended else [env.unwrapped.obs] * k
+            episode_ended = terminated or truncated
+            assert all(np.array_equal(obs[key], np.stack([o[key] for o in history])) for key in obs)
+        assert np.shares_memory(obs['p_boat'], env.history.buffers[0]), 'the history must be a view'
+        env.close()
+
+        nb_envs = 3
+        envs = BatchObservationHistory(SailboatLSAVectorEnv(nb_envs,
+                                                            boats_per_sim=3,
+                                                            sim_endpoint=endpoint,
+                                                            wind_generator_fn=constant_wind,
+                                                            max_episode_steps=3), k, copy=True)
+        obs, _ = envs.reset(seed=0)
+        assert obs['wind'].shape == (nb_envs, k, 2) and obs in envs.observation_space
+        history = [obs['p_boat'][:, -1]] * k
+        for t in range(5):
+            action = {key: np.full((nb_envs, 1), value, dtype=np.float32)
+                      for key, value in sail_ctrl(t).items()}
+            obs, _, _, truncated, info = envs.step(action)
+            last = obs['p_boat'][:, -1]
+            history = history[1:] + [last] if not truncated.any() else [last] * k
+            assert np.array_equal(obs['p_boat'], np.stack(history, axis=1))
+            if truncated.any():
+                assert np.all(obs['p_boat'] == 0), 'the history of the reset boats must only hold their first observation'
+                assert not np.allclose(info['final_observation'][0]['p_boat'], 0)
+        assert not np.shares_memory(obs['p_boat'], envs.history.buffers[0])
+        envs.close()
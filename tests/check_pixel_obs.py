@@ -0,0 +1,27 @@
+import numpy as np
+import gymnasium as gym
+from sailboat_gym import RasterRenderer, BatchPixelObservation
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_pixel_obs():
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint, pixel_obs=RasterRenderer(size=32, channels=1))
+        obs, _ = env.reset(seed=0)
+        for t in range(5):
+            obs, *_ = env.step(sail_ctrl(t))
+        assert obs in env.observation_space, 'pixels must match the observation space'
+        assert (obs['pixels'] != obs['pixels'][0, 0]).any(), 'the boat must be drawn'
+        env.close()
+
+        envs = BatchPixelObservation(gym.vector.SyncVectorEnv([lambda: make_env(endpoint)] * 3),
+                                     RasterRenderer(size=32))
+        obs, _ = envs.reset(seed=0)
+        obs, *_ = envs.step(envs.action_space.sample())
+        assert obs['pixels'].shape == (3, 32, 32, 3)
+        assert obs in envs.observation_space
+        # the batch matches the images rendered one by one
+        renderer = envs.renderer
+        single = renderer.render({k: v[1] for k, v in obs.items() if k != 'pixels'})
+        assert np.array_equal(obs['pixels'][1], single)
+        envs.close()
@@ -0,0 +1,35 @@
+from collections import Counter
+from sailboat_gym.envs.sailboat_lsa.lsa_placement import allocate_cpus, parse_cpulist, format_cpulist
+
+
+def check_placement():
+    assert parse_cpulist('0-3,8, 10-11') == [0, 1, 2, 3, 8, 10, 11]
+    assert format_cpulist([3, 1, 2]) == '1,2,3'
+
+    nodes = {0: list(range(0, 8)), 1: list(range(8, 16))}
+    reserved = parse_cpulist('0-1')
+    used = Counter()
+    placements = []
+    for _ in range(6):
+        cpus, mems = allocate_cpus(2, used, reserved=reserved, nodes=nodes)
+        assert len(mems) == 1 and set(cpus) <= set(nodes[mems[0]]), \
+            'a container must stay on a single NUMA node when it fits'
+        used.update(cpus)
+        placements.append(mems[0])
+    assert not used.keys() & set(reserved), 'reserved cores must not be used'
+    assert placements.count(0) == placements.count(1), 'containers must be spread across nodes'
+    assert max(used.values()) == 1, 'cores must not be shared while free cores remain'
+
+    # existing containers are taken into account
+    cpus, mems = allocate_cpus(2, Counter({cpu: 1 for cpu in nodes[1]}), nodes=nodes)
+    assert mems == [0]
+
+    # a container larger than a node spans several nodes
+    cpus, mems = allocate_cpus(10, Counter(), nodes=nodes)
+    assert len(cpus) == 10 and mems == [0, 1]
+    try:
+        allocate_cpus(15, Counter(), reserved=reserved, nodes=nodes)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('allocating more cores than available must fail')
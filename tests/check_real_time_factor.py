@@ -0,0 +1,47 @@
+import threading
+import numpy as np
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_real_time_factor():
+    with stand_in_server() as endpoint:
+        # 10 steps of 0.1s at 2x real time
+        env = make_env(endpoint, real_time_factor=2)
+        fast_env = make_env(endpoint, name='fast')
+        env.reset(seed=0)
+        fast_env.reset(seed=0)
+        fast_infos = []
+
+        def run_fast():
+            for t in range(100):
+                *_, info = fast_env.step(sail_ctrl(t))
+            fast_infos.append(info)
+        thread = threading.Thread(target=run_fast)
+        thread.start()
+        for t in range(10):
+            *_, info = env.step(sail_ctrl(t))
+        thread.join()
+        # the simulated time is the clock of the simulator
+        assert np.isclose(info['sim_time'], 1.)
+        assert np.isclose(fast_infos[0]['sim_time'], 10.)
+        assert info['wall_time'] >= .45, \
+            f'the simulation must not run faster than twice the real time ({info["wall_time"]:.2f}s)'
+        assert fast_infos[0]['sim_time'] / fast_infos[0]['wall_time'] > 2, 'other clients must not be paced'
+        env.close()
+        fast_env.close()
+
+        # the binary replies do not carry the clock, it is counted from the steps
+        binary_env = make_env(endpoint, sim_wire_format='binary', name='binary')
+        binary_env.reset(seed=0)
+        for t in range(3):
+            *_, info = binary_env.step(sail_ctrl(t))
+        assert np.isclose(info['sim_time'], .3)
+        binary_env.close()
+
+    for real_time_factor in [0, -1]:
+        try:
+            make_env(endpoint, real_time_factor=real_time_factor)
+            rejected = False
+        except AssertionError:
+            rejected = True
+        assert rejected, f'real_time_factor={real_time_factor} must be rejected'
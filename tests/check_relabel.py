@@ -0,0 +1,71 @@
+import os
+import sys
+import subprocess
+import tempfile
+import numpy as np
+import sailboat_gym
+from sailboat_gym.envs.sailboat_lsa.lsa_step_log import StepLog
+from sailboat_gym.helpers.rollout_cache import run_open_loop
+from sailboat_gym.helpers.relabel import save_transitions, load_transitions, rollout_to_transitions, step_log_to_transitions, PerTransition, relabel
+from .stand_in import stand_in_server, make_env, still_water, sail_ctrl, forward_reward
+
+
+def forward_rewards(obs, actions, next_obs):
+    """Vectorized `forward_reward`."""
+    return (next_obs['p_boat'][:, 0] - obs['p_boat'][:, 0]).astype(np.float64)
+
+
+def far_from_start(obs, actions, next_obs):
+    return np.linalg.norm(next_obs['p_boat'][:, :2], axis=-1) > .2
+
+
+def check_relabel():
+    actions = [sail_ctrl(t) for t in range(40)]
+    log = StepLog(size=1000)
+    with stand_in_server() as endpoint, tempfile.TemporaryDirectory() as path:
+        env = make_env(endpoint, water_generator_fn=still_water, reward_fn=forward_reward,
+                       max_episode_steps=30, step_log=log)
+        rollout = run_open_loop(env, actions)
+        env.close()
+        transitions = rollout_to_transitions(rollout, actions)
+        assert save_transitions(path, **transitions) == 30
+        data = load_transitions(path)
+        assert data['action']['theta_sail'].shape == (30, 1) and data['truncated'][-1]
+        assert np.array_equal(data['next_obs']['p_boat'][:-1], data['obs']['p_boat'][1:])
+
+        # the recorded rewards are found again, in chunks spread over processes or in this process
+        assert relabel(path, rewards={'forward': forward_rewards},
+                       terminations={'far': far_from_start},
+                       chunk_size=7, num_workers=2) == ['reward.forward', 'terminated.far']
+        assert relabel(path, rewards={'per_transition': PerTransition(forward_reward)},
+                       chunk_size=7, num_workers=0) == ['reward.per_transition']
+        data = load_transitions(path)
+        assert np.allclose(data['reward.forward'], rollout['rewards'])
+        assert np.allclose(data['reward.per_transition'], rollout['rewards'])
+        far = np.linalg.norm(rollout['obs']['p_boat'][1:, :2], axis=-1) > .2
+        assert np.array_equal(data['terminated.far'], far)
+        assert 0 < far.sum() < 30, 'the threshold must split the trajectory'
+
+        # a failed relabeling leaves the columns untouched
+        try:
+            relabel(path, rewards={'forward': lambda obs, *_: np.zeros(2)}, num_workers=0)
+            assert False, 'a reward of the wrong shape must be refused'
+        except ValueError:
+            pass
+        assert np.allclose(load_transitions(path)['reward.forward'], rollout['rewards'])
+        assert not [f for f in os.listdir(path) if f.endswith('.tmp')]
+
+        # the transitions of the step log are the ones of the rollout
+        logged = step_log_to_transitions(log.get_records())
+        assert np.allclose(logged['rewards'], rollout['rewards'])
+        assert np.allclose(logged['obs']['p_boat'], transitions['obs']['p_boat'])
+        assert np.allclose(logged['actions']['theta_rudder'], transitions['actions']['theta_rudder'])
+        assert np.array_equal(logged['truncated'], transitions['truncated'])
+
+        root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'sailboat_gym', 'relabel', path,
+             '--reward=cli=tests.check_relabel:forward_rewards', '--workers=1', '--chunk-size=8'],
+            cwd=root_dir, text=True)
+        assert 'Wrote reward.cli' in output
+        assert np.allclose(np.load(os.path.join(path, 'reward.cli.npy')), rollout['rewards'])
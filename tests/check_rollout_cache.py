@@ -0,0 +1,65 @@
+import os
+import tempfile
+import numpy as np
+import gymnasium as gym
+from sailboat_gym.helpers.rollout_cache import RolloutCache, rollout_key, run_open_loop
+from .stand_in import stand_in_server, constant_wind, still_water, sail_ctrl
+
+
+def check_rollout_cache():
+    actions = [sail_ctrl(t) for t in range(20)]
+    with stand_in_server() as endpoint, tempfile.TemporaryDirectory() as cache_dir:
+        env = gym.make('SailboatLSAEnv-v0',
+                       sim_endpoint=endpoint,
+                       wind_generator_fn=constant_wind,
+                       water_generator_fn=still_water)
+        cache = RolloutCache(cache_dir)
+        rollout = run_open_loop(env, actions, cache=cache)
+        assert cache.nb_misses == 1 and len(cache) == 1
+        assert rollout['obs']['p_boat'].shape[0] == len(actions) + 1
+        assert env.unwrapped.step_idx == len(actions)
+
+        # the same rollout is read from the disk, without stepping the simulator
+        cached = run_open_loop(env, actions, cache=cache)
+        assert cache.nb_hits == 1 and env.unwrapped.step_idx == 0
+        assert np.array_equal(rollout['obs']['p_boat'], cached['obs']['p_boat'])
+
+        # another action sequence, seed or simulator is another rollout
+        run_open_loop(env, actions[:-1], cache=cache)
+        run_open_loop(env, actions, seed=1, cache=cache)
+        run_open_loop(env, actions, cache=cache, reward='other')
+        assert cache.nb_misses == 4 and len(cache) == 4
+
+        # the default random wind and water are drawn from the seeded env: new envs hit the cache, with the uncached result
+        def run_default(use_cache):
+            default_env = gym.make('SailboatLSAEnv-v0', sim_endpoint=endpoint, step_log=False)
+            try:
+                return run_open_loop(default_env, actions, seed=3, cache=cache if use_cache else None)
+            finally:
+                default_env.close()
+        expected = run_default(False)
+        run_default(True)
+        nb_hits = cache.nb_hits
+        cached = run_default(True)
+        assert cache.nb_hits == nb_hits + 1, 'the default wind must be drawn after the seeded reset'
+        assert np.array_equal(expected['obs']['p_boat'], cached['obs']['p_boat'])
+        assert rollout_key('SailboatLSAEnv-v0', 'image:a', 10, 0, actions=actions) \
+            != rollout_key('SailboatLSAEnv-v0', 'image:b', 10, 0, actions=actions)
+
+        # the least recently used rollouts are evicted first
+        entry_size = cache.size() / len(cache)
+        paths = sorted(os.listdir(cache_dir))
+        for i, path in enumerate(paths):
+            os.utime(os.path.join(cache_dir, path), (i, i))
+        oldest = paths[0]
+        cache.max_size = 3.5 * entry_size
+        cache.evict()
+        assert len(cache) == 3 and oldest[:-len('.pkl')] not in cache
+
+        # a corrupted entry is simulated again
+        path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        with open(path, 'wb') as f:
+            f.write(b'\x80')
+        assert cache.get(os.path.basename(path)[:-len('.pkl')]) is None
+        assert not os.path.exists(path)
+        env.close()
@@ -0,0 +1,32 @@
+import numpy as np
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_snapshot_restore():
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint, max_snapshots=2)
+        env.reset(seed=0)
+        for t in range(10):
+            env.step(sail_ctrl(t))
+
+        handle = env.snapshot()
+        branches = []
+        for _ in range(3):
+            obs = env.restore(handle)
+            assert env.step_idx == 10, 'restore must rewind the step index'
+            for t in range(10, 20):
+                obs, *_ = env.step(sail_ctrl(t))
+            branches.append(obs['p_boat'])
+        assert all(np.allclose(branches[0], b) for b in branches), \
+            'continuations from the same snapshot must be identical'
+
+        # the cache is bounded, the least recently used snapshot is evicted
+        env.snapshot()
+        env.snapshot()
+        try:
+            env.restore(handle)
+        except KeyError:
+            pass
+        else:
+            raise AssertionError('evicted snapshot must not be restorable')
+        env.close()
@@ -0,0 +1,81 @@
+import os
+import sys
+import subprocess
+import tempfile
+import threading
+import signal
+import numpy as np
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+from sailboat_gym.envs.sailboat_lsa.lsa_step_log import StepLog, EVENT_STEP, decode_obs, load_dump
+from .stand_in import make_env, constant_wind, sail_ctrl
+
+
+def check_step_log():
+    server = StandInServer()
+    endpoint = server.start()
+    try:
+        env = SailboatLSAEnv(sim_endpoint=endpoint, step_log=False)
+        assert env.step_log is None
+        env.reset(seed=0)
+        env.step(sail_ctrl(0))
+        env.close()
+
+        # the shared log does not take over the process-wide hooks unless asked to
+        hooks = (sys.excepthook, threading.excepthook, signal.getsignal(signal.SIGUSR1))
+        env = SailboatLSAEnv(sim_endpoint=endpoint, step_log=True)
+        assert (sys.excepthook, threading.excepthook, signal.getsignal(signal.SIGUSR1)) == hooks
+        env.close()
+        with tempfile.TemporaryDirectory() as dump_dir:
+            script = ('import threading\n'
+                      'from sailboat_gym.envs.sailboat_lsa.lsa_step_log import get_step_log\n'
+                      'log = get_step_log(True)\n'
+                      'log.record(log.register("env"), 0, 0)\n'
+                      'threading.Thread(target=lambda: 1 / 0).start()\n')
+            res = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, timeout=30,
+                                 env={**os.environ, 'SAILBOAT_STEP_LOG_HANDLERS': '1', 'SAILBOAT_STEP_LOG_DIR': dump_dir})
+            assert 'ZeroDivisionError' in res.stderr and len(os.listdir(dump_dir)) == 1, res.stderr
+
+        with tempfile.TemporaryDirectory() as dump_dir:
+            log = StepLog(size=8, dump_dir=dump_dir)
+            env = make_env(endpoint, name='logged', sim_timeout=.2, step_log=log)
+            env.reset(seed=0)
+            for t in range(10):
+                obs, reward, *_ = env.step(sail_ctrl(t))
+
+            # only the last records are kept, oldest first
+            records = log.get_records()
+            assert len(records) == 8 and log.nb_records == 12
+            assert list(records['step']) == list(range(3, 11))
+            last = records[-1]
+            assert last['event'] == EVENT_STEP and last['reward'] == reward
+            assert np.allclose(last['wind'], constant_wind(0))
+            assert np.isclose(last['action'][0], sail_ctrl(9)['theta_rudder'])
+            assert all(np.allclose(value, obs[key]) for key, value in decode_obs(last).items())
+
+            # a simulator failure dumps the log, pretty-printed by the CLI
+            server.drop_replies = 1
+            *_, truncated, info = env.step(sail_ctrl(10))
+            assert truncated and info['sim_failure']
+            dumps = os.listdir(dump_dir)
+            assert len(dumps) == 1, 'the log must be dumped on simulator failure'
+            records, names = load_dump(os.path.join(dump_dir, dumps[0]))
+            assert names == ['logged'] and records[-1]['sim_failure']
+            root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+            output = subprocess.check_output(
+                [sys.executable, '-m', 'sailboat_gym', 'log',
+                 os.path.join(dump_dir, dumps[0]), '--last=2'],
+                cwd=root_dir, text=True)
+            assert '[logged] step 10' in output and 'Simulator failure' in output
+            assert '[logged] step 8' not in output
+
+            # the dumps on failure are rate limited
+            server.drop_replies = 1
+            env.reset(seed=0)
+            env.step(sail_ctrl(0))
+            assert len(os.listdir(dump_dir)) == 1
+            env.close()
+
+    finally:
+        server.stop()
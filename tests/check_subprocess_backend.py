@@ -0,0 +1,42 @@
+import os
+import sys
+import sailboat_gym
+from sailboat_gym import SailboatLSAEnv, SubprocessBackend
+from .stand_in import constant_wind, sail_ctrl
+
+
+def check_subprocess_backend():
+    root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+    backend = SubprocessBackend([sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in',
+                                 '--bind={endpoint}'], cwd=root_dir)
+    env = SailboatLSAEnv(sim_backend=backend,
+                         wind_generator_fn=constant_wind,
+                         name='subprocess',
+                         sim_timeout=.5)
+    assert env.sim.endpoint.startswith('ipc://')
+    env.reset(seed=0)
+    for t in range(5):
+        env.step(sail_ctrl(t))
+
+    # a dead simulator is relaunched
+    proc = env.sim.backend.proc
+    proc.kill()
+    *_, truncated, info = env.step(sail_ctrl(0))
+    assert truncated and info['sim_failure']
+    env.reset(seed=0)
+    assert env.sim.nb_restarts == 1 and env.sim.backend.proc is not proc
+    env.step(sail_ctrl(0))
+
+    proc, ipc_path = env.sim.backend.proc, env.sim.endpoint[len('ipc://'):]
+    env.close()
+    env.sim.stop()
+    assert proc.poll() is not None, 'the simulator must be killed'
+    assert not os.path.exists(ipc_path), 'the ipc socket must be removed'
+
+    failing = SubprocessBackend([sys.executable, '-c', 'print("no simulator here")'])
+    try:
+        SailboatLSAEnv(sim_backend=failing)
+    except RuntimeError as e:
+        assert 'no simulator here' in str(e), 'the output of the simulator must be reported'
+    else:
+        raise AssertionError('a simulator exiting before being ready must fail')
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+import time
+import sailboat_gym
+from sailboat_gym.envs.sailboat_lsa.lsa_teardown import TeardownManager
+
+
+class FakeSim:
+    def __init__(self, name, duration=.5, error=None):
+        self.name = name
+        self.duration = duration
+        self.error = error
+        self.stopped = False
+
+    def stop(self):
+        time.sleep(self.duration)
+        if self.error:
+            raise self.error
+        self.stopped = True
+
+
+def check_teardown():
+    manager = TeardownManager()
+    sims = [FakeSim(f'{i}') for i in range(16)]
+    sims.append(FakeSim('broken', error=RuntimeError('container is gone')))
+    for sim in sims:
+        manager.register(sim)
+
+    t0 = time.time()
+    manager.stop_async(sims[0])
+    assert time.time() - t0 < .1, 'stop_async must not block'
+
+    failures = manager.close_all(timeout=5)
+    assert time.time() - t0 < 2, 'simulations must be stopped concurrently'
+    assert all(sim.stopped for sim in sims[:-1])
+    assert [name for name, _ in failures] == ['broken']
+    assert manager.close_all() == [], 'failures must be reported once'
+
+
+# envs still alive at exit: one on a remote endpoint, one on a launched (registered) simulator
+EXIT_SCRIPT = """
+import sys
+from sailboat_gym import SailboatLSAEnv, SubprocessBackend
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+server = StandInServer()
+env = SailboatLSAEnv(sim_endpoint=server.start(), step_log=False)
+env.reset(seed=0)
+env.close()
+backend = SubprocessBackend([sys.executable, '-m', 'sailboat_gym.envs.sailboat_lsa.lsa_stand_in', '--bind={endpoint}'])
+launched = SailboatLSAEnv(sim_backend=backend, name='launched', step_log=False)
+launched.reset(seed=0)
+print('script end', flush=True)
+"""
+
+SIGTERM_SCRIPT = """
+import os, signal, time
+signal.signal(signal.SIGTERM, signal.SIG_IGN)
+from sailboat_gym.envs.sailboat_lsa.lsa_teardown import TeardownManager
+class Sim:
+    name = 'sim'
+    def stop(self):
+        print('stopped', flush=True)
+TeardownManager().register(Sim())
+os.kill(os.getpid(), signal.SIGTERM)
+time.sleep(.1)
+print('still running', flush=True)
+"""
+
+
+def check_teardown_at_exit():
+    root_dir = os.path.dirname(os.path.dirname(sailboat_gym.__file__))
+    # the envs garbage collected during the interpreter shutdown must not hang the process
+    res = subprocess.run([sys.executable, '-c', EXIT_SCRIPT], cwd=root_dir,
+                         capture_output=True, text=True, timeout=10)
+    assert res.returncode == 0 and 'script end' in res.stdout, res.stderr
+
+    # the simulations are stopped on SIGTERM, which is still ignored if it was before
+    res = subprocess.run([sys.executable, '-c', SIGTERM_SCRIPT], cwd=root_dir,
+                         capture_output=True, text=True, timeout=10)
+    assert res.returncode == 0 and res.stdout.split() == ['stopped', 'still', 'running'], res
@@ -0,0 +1,59 @@
+import time
+import threading
+import numpy as np
+from sailboat_gym import SailboatLSAEnv
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_thread_safety():
+    with stand_in_server() as endpoint:
+        # each env draws its default wind and current from its own generator, seeded by reset
+        global_state = np.random.get_state()[1].copy()
+        seeded = [SailboatLSAEnv(sim_endpoint=endpoint, name=f'seeded-{i}', step_log=False) for i in range(2)]
+        for env in seeded:
+            env.reset(seed=3)
+        assert np.array_equal(seeded[0].wind_generator_fn(0), seeded[1].wind_generator_fn(0))
+        assert np.array_equal(seeded[0].water_generator_fn(0), seeded[1].water_generator_fn(0))
+        assert np.array_equal(np.random.get_state()[1], global_state), 'the global numpy state must be left untouched'
+        for env in seeded:
+            env.close()
+
+        def rollout(env, seed, nb_steps, positions=None):
+            env.reset(seed=seed)
+            for t in range(nb_steps):
+                obs, *_ = env.step(sail_ctrl(t))
+                if positions is not None:
+                    positions.append(obs['p_boat'].copy())
+
+        def run_threads(nb_threads, nb_steps=40):
+            """Steps/s of `nb_threads` envs stepped concurrently, each by its own thread."""
+            envs = [make_env(endpoint, name=f'thread-{nb_threads}-{i}', real_time_factor=10)
+                    for i in range(nb_threads)]
+            trajectories = [[] for _ in envs]
+            threads = [threading.Thread(target=rollout, args=(env, i, nb_steps, trajectory))
+                       for i, (env, trajectory) in enumerate(zip(envs, trajectories))]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            throughput = nb_threads * nb_steps / (time.perf_counter() - t0)
+            assert all(len(trajectory) == nb_steps for trajectory in trajectories)
+
+            # the concurrent rollouts are the serial ones: nothing is shared between the envs
+            for i, env in enumerate(envs):
+                positions = []
+                rollout(env, i, 5, positions)
+                assert np.allclose(positions, trajectories[i][:5])
+                env.close()
+            return throughput
+
+        # the simulator answers a step every 10ms (10 steps of 0.1s per second at 10x real time),
+        # the threads overlap this latency. Only a loose speed-up is asserted, retried on a loaded
+        # machine, the scaling itself is measured by the benchmarks (threads.*)
+        for _ in range(3):
+            throughputs = {nb_threads: run_threads(nb_threads) for nb_threads in [1, 4]}
+            if throughputs[4] > 1.3 * throughputs[1]:
+                break
+        assert throughputs[4] > 1.3 * throughputs[1], \
+            f'the threads must overlap the latency of the simulator ({throughputs})'
@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+from sailboat_gym import CV2DRenderer
+from .stand_in import stand_in_server, make_env, sail_ctrl
+
+
+def check_trail():
+    with stand_in_server() as endpoint:
+        env = make_env(endpoint)
+        obs, _ = env.reset(seed=0)
+        observations = [obs]
+        for t in range(60):
+            obs, *_ = env.step({'theta_rudder': np.array([.3]), 'theta_sail': sail_ctrl(t)['theta_sail']})
+            observations.append(obs)
+        env.close()
+    map_bounds = np.array([[-2, -2, 0], [2, 2, 1]])  # the boat sails about 1m
+
+    renderer = CV2DRenderer(size=128, trail=True, trail_every=2)
+    renderer.setup(map_bounds)
+    reference = CV2DRenderer(size=128)
+    reference.setup(map_bounds)
+    points = []
+
+    def draw_full_trail(img, _):
+        # the former way: redraw the whole path at every frame
+        for start, end in zip(points[:-1], points[1:]):
+            cv2.line(img, tuple(start.astype(int)), tuple(end.astype(int)),
+                     reference.style['trail']['color'], reference.style['trail']['width'],
+                     lineType=cv2.LINE_AA)
+
+    for i, obs in enumerate(observations):
+        frame = renderer.render(obs)
+        if i % 2 == 0:
+            points.append(reference._translate_and_scale_to_fit_in_map(obs['p_boat'][:2]))
+        assert np.array_equal(frame, reference.render(obs, draw_full_trail)), \
+            'drawing the newest segment must give the same frame as redrawing the whole trail'
+    assert not np.array_equal(frame, reference.render(obs)), 'the trail must be drawn'
+
+    renderer.setup(map_bounds)
+    assert np.array_equal(renderer.render(obs), reference.render(obs)), 'setup must clear the trail'
+
+    # the boat stops at its last point, far from the old segments
+    trails = []
+    for fade in [1., .8]:
+        fading = CV2DRenderer(size=128, trail=True, trail_fade=fade)
+        fading.setup(map_bounds)
+        for obs in observations + [observations[-1]] * 40:
+            fading.render(obs)
+        x, y = fading._translate_and_scale_to_fit_in_map(obs['p_boat'][:2]).astype(int)
+        trail = np.abs(fading.trail_layer.astype(int) - fading.background)
+        trail[y - 3:y + 4, x - 3:x + 4] = 0
+        trails.append(trail)
+    assert trails[0].max() > 50 and trails[1].max() <= 6, 'the old segments must fade out'
@@ -0,0 +1,19 @@
+import numpy as np
+from .stand_in import stand_in_server, make_env, still_water, sail_ctrl
+
+
+def check_wire_format():
+    with stand_in_server() as endpoint:
+        trajectories = []
+        for wire_format in ['msgpack', 'binary']:
+            env = make_env(endpoint, water_generator_fn=still_water, sim_wire_format=wire_format)
+            assert env.sim.use_binary == (wire_format == 'binary')
+            env.reset(seed=0)
+            for t in range(20):
+                obs, *_ = env.step(sail_ctrl(t))
+            assert all(obs[k].shape == v.shape and obs[k].dtype == v.dtype
+                       for k, v in env.observation_space.sample().items())
+            trajectories.append(obs)
+            env.close()
+        assert all(np.allclose(trajectories[0][k], trajectories[1][k])
+                   for k in trajectories[0]), 'both formats must agree'
@@ -0,0 +1,36 @@
+"""Stand-in simulator fixtures shared by the checks."""
+import numpy as np
+from contextlib import contextmanager
+from sailboat_gym import SailboatLSAEnv
+from sailboat_gym.envs.sailboat_lsa.lsa_stand_in import StandInServer
+
+
+@contextmanager
+def stand_in_server():
+    server = StandInServer()
+    try:
+        yield server.start()
+    finally:
+        server.stop()
+
+
+def constant_wind(_):
+    return np.array([0., 1.])
+
+
+def still_water(_):
+    return np.array([0., 0.])
+
+
+def sail_ctrl(step_idx):
+    return {'theta_rudder': np.array(np.sin(step_idx / 10) / 4),
+            'theta_sail': np.array(np.deg2rad(60))}
+
+
+def make_env(endpoint, wind_generator_fn=constant_wind, step_log=False, **kwargs) -> SailboatLSAEnv:
+    """Env stepping the stand-in simulator at `endpoint`, with a constant wind and without step log by default."""
+    return SailboatLSAEnv(sim_endpoint=endpoint, wind_generator_fn=wind_generator_fn, step_log=step_log, **kwargs)
+
+
+def forward_reward(obs, action, next_obs):
+    return float(next_obs['p_boat'][0] - obs['p_boat'][0])